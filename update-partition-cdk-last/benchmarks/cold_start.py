@@ -0,0 +1,129 @@
+"""
+Cold start harness for the update partition module lambda handlers.
+
+Every sample imports a handler in a fresh interpreter, the way a new lambda
+container does, and records:
+
+import_ms : time to import the handler module (the lambda init phase without
+            any client preloading)
+init_ms   : time to create the clients listed in PRELOAD_AWS_CLIENTS, only
+            measured when botocore is installed
+modules   : number of modules loaded by the import, and whether boto3 or
+            botocore were pulled in
+
+Usage:
+
+    python benchmarks/cold_start.py
+    python benchmarks/cold_start.py --repeat 20 --handler update-partition
+    python benchmarks/cold_start.py --budget-ms 150 --json
+
+With --budget-ms the exit code is 1 when the median import time of any handler
+exceeds the budget, so the harness can gate changes in CI.
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+LAMBDA_DIR = os.path.join(PROJECT_DIR, 'lambda')
+
+HANDLERS = {
+    'update-partition': 'glue,sns',
+    'dead-letter': 'sns',
+}
+
+# Executed in a fresh interpreter for every sample.
+CHILD = """
+import importlib.util, json, sys, time
+before = set(sys.modules)
+path, name = sys.argv[1], sys.argv[2]
+start = time.perf_counter()
+spec = importlib.util.spec_from_file_location(name.replace('-', '_'), path)
+module = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(module)
+imported = time.perf_counter()
+result = {
+    'import_ms': (imported - start) * 1000,
+    'modules': len(set(sys.modules) - before),
+    'boto3': 'boto3' in sys.modules,
+    'botocore': 'botocore' in sys.modules,
+    'init_ms': None,
+}
+try:
+    import botocore
+except ImportError:
+    pass
+else:
+    import aws_clients
+    start = time.perf_counter()
+    aws_clients.preload(sys.argv[3])
+    result['init_ms'] = (time.perf_counter() - start) * 1000
+print(json.dumps(result))
+"""
+
+
+def sample(handler: str, services: str) -> dict:
+    env = dict(
+        os.environ,
+        PYTHONPATH=os.pathsep.join([os.path.join(LAMBDA_DIR, 'common', 'python'), os.path.join(LAMBDA_DIR, handler)]),
+        AWS_REGION=os.environ.get('AWS_REGION', 'eu-west-2'),
+        AWS_DEFAULT_REGION=os.environ.get('AWS_DEFAULT_REGION', 'eu-west-2'),
+        PRELOAD_AWS_CLIENTS='',
+    )
+    output = subprocess.run(
+        [sys.executable, '-c', CHILD, os.path.join(LAMBDA_DIR, handler, f'{handler}.py'), handler, services],
+        check=True, capture_output=True, text=True, env=env, cwd=os.path.join(LAMBDA_DIR, handler)
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def measure(handler: str, repeat: int) -> dict:
+    # The first run compiles the byte code, as the deployment package would ship it.
+    sample(handler, HANDLERS[handler])
+    samples = [sample(handler, HANDLERS[handler]) for _ in range(repeat)]
+    import_ms = [s['import_ms'] for s in samples]
+    init_ms = [s['init_ms'] for s in samples if s['init_ms'] is not None]
+    return {
+        'handler': handler,
+        'import_ms_median': statistics.median(import_ms),
+        'import_ms_max': max(import_ms),
+        'init_ms_median': statistics.median(init_ms) if init_ms else None,
+        'modules': samples[-1]['modules'],
+        'boto3_imported': samples[-1]['boto3'],
+        'botocore_imported': samples[-1]['botocore'],
+    }
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--handler', choices=sorted(HANDLERS), action='append')
+    parser.add_argument('--repeat', type=int, default=10)
+    parser.add_argument('--budget-ms', type=float)
+    parser.add_argument('--json', action='store_true')
+    args = parser.parse_args(argv)
+
+    results = [measure(handler, args.repeat) for handler in args.handler or sorted(HANDLERS)]
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+    else:
+        print(f"{'handler':<18}{'import ms':>11}{'max ms':>9}{'init ms':>9}{'modules':>9}  boto3  botocore")
+        for r in results:
+            init_ms = f"{r['init_ms_median']:9.1f}" if r['init_ms_median'] is not None else f"{'n/a':>9}"
+            print(f"{r['handler']:<18}{r['import_ms_median']:11.1f}{r['import_ms_max']:9.1f}{init_ms}{r['modules']:9d}"
+                  f"  {str(r['boto3_imported']):<6} {r['botocore_imported']}")
+
+    if args.budget_ms is not None:
+        over = [r['handler'] for r in results if r['import_ms_median'] > args.budget_ms]
+        if over:
+            print(f"Import time budget of {args.budget_ms} ms exceeded by: {', '.join(over)}", file=sys.stderr)
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
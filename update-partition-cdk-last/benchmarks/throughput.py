@@ -0,0 +1,226 @@
+"""
+Throughput benchmark for the update partition lambda handler.
+
+The handler is driven in process with synthetic DIH notifications (SQS records
+carrying the SNS envelope) against the in-process Glue and SNS fakes of the
+unit tests, optionally with an added latency per API call, so any change to
+the hot path can be measured without AWS access.
+
+Every scenario loads the handler fresh (cold caches), splits the messages into
+invocations of --batch-size records and reports:
+
+msgs_per_sec : messages processed per second of handler time
+p50_ms/p99_ms: per record latency, from the start of the invocation until the
+               record is resolved (its success notification is queued), failed
+               records count at the end of the invocation
+alloc_kb     : peak memory allocated during an invocation, from a separate
+               tracemalloc pass so it does not skew the timings
+glue_calls   : Glue requests made for the whole run
+sns_calls    : SNS requests made for the whole run
+
+The scenarios are the product of the batch sizes, table counts and duplicate
+ratios.  A duplicate is a message for a partition already notified earlier in
+the run (a redelivery or a DIH re-publish).
+
+Usage:
+
+    python benchmarks/throughput.py
+    python benchmarks/throughput.py --batch-size 10 --batch-size 100 --tables 1 --tables 20 --duplicates 0 --duplicates 0.5
+    python benchmarks/throughput.py --latency-ms 20 --concurrency 4 --json
+"""
+
+import argparse
+import datetime
+import importlib.util
+import itertools
+import json
+import os
+import random
+import statistics
+import sys
+import time
+import tracemalloc
+
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+LAMBDA_DIR = os.path.join(PROJECT_DIR, 'lambda')
+
+for path in (PROJECT_DIR, os.path.join(LAMBDA_DIR, 'update-partition'), os.path.join(LAMBDA_DIR, 'common', 'python')):
+    if path not in sys.path:
+        sys.path.insert(0, path)
+
+REGION = 'eu-west-2'
+DATABASE_NAME = 'BENCH_DB'
+
+
+class Latency:
+    """Client proxy that sleeps for a fixed latency before every API call."""
+
+    def __init__(self, client, latency_ms: float):
+        self.client = client
+        self.latency = latency_ms / 1000
+
+    def __getattr__(self, name):
+        attribute = getattr(self.client, name)
+        if not callable(attribute) or not self.latency:
+            return attribute
+
+        def call(*args, **kwargs):
+            time.sleep(self.latency)
+            return attribute(*args, **kwargs)
+        return call
+
+
+def synthetic_messages(count: int, tables: int, duplicates: float, seed: int = 0) -> list:
+    """Build the SQS records for a run, a fraction of them repeating a partition
+    already notified earlier in the run."""
+    from tests.fakes import dih_record
+
+    rng = random.Random(seed)
+    first_day = datetime.date(2000, 1, 1)
+    notified = []
+    records = []
+    for n in range(count):
+        if notified and rng.random() < duplicates:
+            feed, partition_value = rng.choice(notified)
+        else:
+            feed = f'{DATABASE_NAME}#TABLE_{len(notified) % tables}'
+            partition_value = (first_day + datetime.timedelta(days=len(notified) // tables)).isoformat()
+            notified.append((feed, partition_value))
+        records.append(dih_record(feed, partition_value, message_id=f'msg-{n}', region=REGION))
+    return records
+
+
+def load_handler(tables: int, latency_ms: float, concurrency: int, glue_rate: float = 1e9):
+    """Register fresh fakes and load a fresh copy of the handler module."""
+    import aws_clients
+    from tests.fakes import FakeGlue, FakeSns
+
+    glue, sns = FakeGlue(), FakeSns()
+    for n in range(tables):
+        glue.add_table(DATABASE_NAME, f'TABLE_{n}', location='s3://bucket/prefix')
+
+    aws_clients.reset()
+    aws_clients.register_client('glue', Latency(glue, latency_ms))
+    aws_clients.register_client('sns', Latency(sns, latency_ms), REGION)
+
+    environ = dict(os.environ)
+    os.environ.update(MAX_TABLE_CONCURRENCY=str(concurrency), PRELOAD_AWS_CLIENTS='',
+                      GLUE_MAX_REQUESTS_PER_SECOND=str(glue_rate))
+    try:
+        path = os.path.join(LAMBDA_DIR, 'update-partition', 'update-partition.py')
+        spec = importlib.util.spec_from_file_location('update_partition', path)
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+    finally:
+        os.environ.clear()
+        os.environ.update(environ)
+    return module, glue, sns
+
+
+def invoke(module, batch: list) -> list:
+    """Run one invocation and return the latency of each record in seconds."""
+    resolved = []
+    queue = module.notifier.queue
+
+    def timed_queue(*args, **kwargs):
+        resolved.append(time.perf_counter())
+        return queue(*args, **kwargs)
+
+    module.notifier.queue = timed_queue
+    try:
+        start = time.perf_counter()
+        response = module.handler({'Records': batch}, None)
+        end = time.perf_counter()
+    finally:
+        module.notifier.queue = queue
+
+    latencies = [at - start for at in resolved]
+    latencies.extend(end - start for _ in response['batchItemFailures'])
+    return latencies
+
+
+def percentile(values: list, fraction: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))]
+
+
+def run(messages: int, batch_size: int, tables: int, duplicates: float, latency_ms: float = 0,
+        concurrency: int = 1, allocations: bool = True, glue_rate: float = 1e9) -> dict:
+    records = synthetic_messages(messages, tables, duplicates)
+    batches = [records[start:start + batch_size] for start in range(0, len(records), batch_size)]
+
+    module, glue, sns = load_handler(tables, latency_ms, concurrency, glue_rate)
+    latencies = []
+    elapsed = 0.0
+    for batch in batches:
+        start = time.perf_counter()
+        latencies.extend(invoke(module, batch))
+        elapsed += time.perf_counter() - start
+
+    result = {
+        'batch_size': batch_size,
+        'tables': tables,
+        'duplicates': duplicates,
+        'messages': messages,
+        'msgs_per_sec': messages / elapsed if elapsed else float('inf'),
+        'p50_ms': percentile(latencies, 0.50) * 1000,
+        'p99_ms': percentile(latencies, 0.99) * 1000,
+        'alloc_kb': None,
+        'glue_calls': len(glue.calls),
+        'sns_calls': len(sns.calls),
+    }
+
+    if allocations:
+        module, glue, sns = load_handler(tables, 0, concurrency, glue_rate)
+        peaks = []
+        tracemalloc.start()
+        try:
+            for batch in batches:
+                tracemalloc.clear_traces()
+                baseline = tracemalloc.get_traced_memory()[0]
+                tracemalloc.reset_peak()
+                module.handler({'Records': batch}, None)
+                peaks.append(tracemalloc.get_traced_memory()[1] - baseline)
+        finally:
+            tracemalloc.stop()
+        result['alloc_kb'] = statistics.median(peaks) / 1024
+
+    return result
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--messages', type=int, default=2000, help='messages per scenario')
+    parser.add_argument('--batch-size', type=int, action='append', help='records per invocation (10, 100)')
+    parser.add_argument('--tables', type=int, action='append', help='distinct tables in the run (1, 10)')
+    parser.add_argument('--duplicates', type=float, action='append', help='fraction of duplicate messages (0, 0.5)')
+    parser.add_argument('--latency-ms', type=float, default=0, help='latency added to every Glue and SNS call')
+    parser.add_argument('--concurrency', type=int, default=1, help='MAX_TABLE_CONCURRENCY of the handler')
+    parser.add_argument('--glue-rate', type=float, default=1e9,
+                        help='GLUE_MAX_REQUESTS_PER_SECOND of the handler, unlimited by default')
+    parser.add_argument('--no-allocations', action='store_true', help='skip the tracemalloc pass')
+    parser.add_argument('--json', action='store_true')
+    args = parser.parse_args(argv)
+
+    results = [
+        run(args.messages, batch_size, tables, duplicates, args.latency_ms, args.concurrency, not args.no_allocations,
+            args.glue_rate)
+        for batch_size, tables, duplicates in itertools.product(
+            args.batch_size or [10, 100], args.tables or [1, 10], args.duplicates or [0, 0.5]
+        )
+    ]
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+    else:
+        print(f"{'batch':>6}{'tables':>7}{'dups':>6}{'msgs/s':>10}{'p50 ms':>9}{'p99 ms':>9}{'alloc kb':>10}"
+              f"{'glue':>7}{'sns':>6}")
+        for r in results:
+            alloc_kb = f"{r['alloc_kb']:10.1f}" if r['alloc_kb'] is not None else f"{'n/a':>10}"
+            print(f"{r['batch_size']:6d}{r['tables']:7d}{r['duplicates']:6.2f}{r['msgs_per_sec']:10.0f}"
+                  f"{r['p50_ms']:9.2f}{r['p99_ms']:9.2f}{alloc_kb}{r['glue_calls']:7d}{r['sns_calls']:6d}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,35 @@
+"""
+Message group and deduplication ids for the FIFO deployment of the module.
+
+When the stack is deployed with FIFO queues (cdk deploy -c fifo=true) the DIH
+notifications reach the queue through a FIFO topic, grouped by feed so each
+table is processed in order while different tables are processed in parallel,
+and deduplicated by feed and partition values so a re-published notification
+is dropped by SQS before it costs an invocation.  Publishers to the FIFO topic
+(and the lambdas, for their own notifications) derive the ids with:
+
+    message_group_id(notification)
+    deduplication_id(notification)
+"""
+
+import hashlib
+import json
+
+# SQS and SNS accept at most 128 characters for both ids.
+MAX_ID_LENGTH = 128
+
+
+def message_group_id(notification: dict) -> str:
+    """The feed of the notification, which keeps the notifications of a table in order."""
+    return str(notification.get('feed') or 'no-feed')[:MAX_ID_LENGTH]
+
+
+def deduplication_id(notification: dict, *extra) -> str:
+    """Digest of the feed and partition values of the notification (and of any
+    extra values, e.g. the notify_type of an outcome notification)."""
+    key = json.dumps([notification.get('feed'), notification.get('partition_value_list')] + list(extra))
+    return hashlib.sha256(key.encode()).hexdigest()
+
+
+def is_fifo(arn: str) -> bool:
+    return bool(arn) and arn.endswith('.fifo')
@@ -0,0 +1,149 @@
+"""
+Shared SNS notifier for the update partition module lambda functions.
+
+The notifier keeps one SNS client per region for the life of the container
+and queues the DIH notifications produced during an invocation.  flush() sends
+them with publish_batch in groups of up to 10 entries; any entry reported as
+failed inside a batch (or every entry of a batch whose call failed outright)
+is retried individually with publish.
+
+A notification can be queued with a key of the caller's choosing, flush()
+returns the keys of the notifications it could not send.
+
+Notifications queued for a FIFO topic carry the message group (the feed) and
+deduplication (feed, partition values and notify_type) ids of fifo.py.
+
+Usage:
+
+    notifier = SnsNotifier()
+    notifier.queue(SNS_TOPIC_ARN, 'DIH Glue Catalog Partition Refresh message', body, region)
+    ...
+    unsent = notifier.flush()
+"""
+
+import json
+import threading
+
+import aws_clients
+from fifo import deduplication_id, is_fifo, message_group_id
+from structured_log import StructuredLogger
+
+log = StructuredLogger()
+
+# SNS accepts at most 10 entries and 256 KB of payload per PublishBatch request.
+PUBLISH_BATCH_LIMIT = 10
+PUBLISH_BATCH_MAX_BYTES = 256 * 1024
+
+
+def sns_client(region: str):
+    """Return the SNS client for the region from the shared client registry."""
+    return aws_clients.get_client('sns', region)
+
+
+def message_attributes(message: dict) -> dict:
+    """Build the DIH required message attributes from the message body."""
+    message_attrib = {}
+    for key in message.keys():
+        if isinstance(message.get(key), list):
+            string_value = ','.join(message.get(key))
+        else:
+            string_value = message.get(key)
+        message_attrib[key] = { 'DataType': 'String','StringValue': json.dumps(string_value)}
+    return message_attrib
+
+
+class SnsNotifier:
+    """Queue DIH notifications during an invocation and publish them in batches."""
+
+    def __init__(self, client_factory=sns_client):
+        self._client_factory = client_factory
+        self._pending = {}
+        self._lock = threading.Lock()
+
+    def queue(self, topic_arn: str, subject: str, message: dict, region: str, key=None):
+        """Queue a notification, reported by key when it cannot be sent.  The
+        message is serialized straight away, so the caller is free to reuse the
+        dict afterwards."""
+        entry = {
+            'Subject': subject,
+            'Message': json.dumps(message),
+            'MessageAttributes': message_attributes(message)
+        }
+        if is_fifo(topic_arn):
+            entry['MessageGroupId'] = message_group_id(message)
+            entry['MessageDeduplicationId'] = deduplication_id(message, message.get('notify_type'))
+        with self._lock:
+            self._pending.setdefault((region, topic_arn), []).append((key, entry))
+
+    def pending(self) -> int:
+        with self._lock:
+            return sum(len(entries) for entries in self._pending.values())
+
+    def flush(self) -> list:
+        """Publish every queued notification and return the keys of those that
+        could not be sent."""
+        with self._lock:
+            pending, self._pending = self._pending, {}
+
+        failed = []
+        for (region, topic_arn), entries in pending.items():
+            try:
+                client = self._client_factory(region)
+            except Exception as e:
+                log.error('Publish to SNS Failed.', exc=e, region=region, entries=len(entries))
+                failed.extend(key for key, entry in entries)
+                continue
+            for batch in self._batches(entries):
+                for key, entry in self._publish_batch(client, topic_arn, batch):
+                    if not self._publish(client, topic_arn, entry):
+                        failed.append(key)
+        return failed
+
+    @staticmethod
+    def _batches(entries: list):
+        batch, size = [], 0
+        for key, entry in entries:
+            entry_size = len(entry['Message']) + len(json.dumps(entry['MessageAttributes']))
+            if batch and (len(batch) >= PUBLISH_BATCH_LIMIT or size + entry_size > PUBLISH_BATCH_MAX_BYTES):
+                yield batch
+                batch, size = [], 0
+            batch.append((key, entry))
+            size += entry_size
+        if batch:
+            yield batch
+
+    @staticmethod
+    def _publish_batch(client, topic_arn: str, batch: list) -> list:
+        """Send one publish_batch request and return the (key, entry) pairs that failed."""
+        request_entries = [dict(entry, Id=str(index)) for index, (key, entry) in enumerate(batch)]
+        try:
+            log.payload('Publish batch to SNS.', lambda: request_entries, topic_arn=topic_arn, entries=len(request_entries))
+            response = client.publish_batch(
+                TopicArn=topic_arn,
+                PublishBatchRequestEntries=request_entries
+            )
+        except Exception as e:
+            log.warning('Publish batch to SNS Failed, retrying entries individually.', topic_arn=topic_arn, error=repr(e))
+            return batch
+
+        failed_ids = {failure.get('Id') for failure in response.get('Failed', [])}
+        if failed_ids:
+            log.warning('Entries failed in the SNS publish batch, retrying individually.', topic_arn=topic_arn,
+                        failed=len(failed_ids), codes=lambda: sorted({f.get('Code') for f in response.get('Failed', [])}))
+        return [batch[int(entry_id)] for entry_id in sorted(failed_ids, key=int)]
+
+    @staticmethod
+    def _publish(client, topic_arn: str, entry: dict) -> bool:
+        fifo_ids = {key: entry[key] for key in ('MessageGroupId', 'MessageDeduplicationId') if key in entry}
+        try:
+            client.publish(
+                TargetArn=topic_arn,
+                Subject=entry['Subject'],
+                Message=entry['Message'],
+                MessageAttributes=entry['MessageAttributes'],
+                **fifo_ids
+            )
+            return True
+        except Exception as e:
+            log.error('Publish to SNS Failed.', exc=e, topic_arn=topic_arn, payload=entry['Message'])
+            return False
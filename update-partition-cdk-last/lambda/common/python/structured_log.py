@@ -0,0 +1,89 @@
+"""
+Structured, level gated logging for the lambda handlers.
+
+Every log line is a single json object with a message and a few small fields,
+e.g. {"level": "INFO", "message": "Partitions registered", "table": "x", "created": 12}.
+Nothing is serialized unless the level is enabled, and fields given as
+callables are only evaluated when the line is actually emitted, so large
+structures (events, partition inputs with the whole column list, API
+responses) cost nothing when they are not logged.
+
+Full payloads are attached with payload(): they are emitted when DEBUG is
+enabled, for a sampled fraction of the calls, or always through error().
+
+LOG_LEVEL       : level of the handler logger (INFO)
+LOG_SAMPLE_RATE : fraction of payload() calls that include the payload at
+                  INFO level, between 0 and 1 (0)
+"""
+
+import json
+import logging
+import os
+import random
+
+
+class _Line:
+    """Log message that is only rendered when a handler formats it."""
+
+    __slots__ = ('level', 'message', 'fields')
+
+    def __init__(self, level: str, message: str, fields: dict):
+        self.level = level
+        self.message = message
+        self.fields = fields
+
+    def __str__(self):
+        line = {'level': self.level, 'message': self.message}
+        for key, value in self.fields.items():
+            line[key] = value() if callable(value) else value
+        return json.dumps(line, default=str)
+
+
+class StructuredLogger:
+
+    def __init__(self, name: str = None, level: str = None, sample_rate: float = None):
+        self.logger = logging.getLogger(name)
+        self.logger.setLevel((level or os.environ.get('LOG_LEVEL', 'INFO')).upper())
+        self.sample_rate = float(os.environ.get('LOG_SAMPLE_RATE', '0') if sample_rate is None else sample_rate)
+
+    def enabled(self, level: int) -> bool:
+        return self.logger.isEnabledFor(level)
+
+    def sampled(self) -> bool:
+        """True when a payload should be included: DEBUG is on or the sample hit."""
+        return self.enabled(logging.DEBUG) or (self.sample_rate > 0 and random.random() < self.sample_rate)
+
+    def log(self, level: int, message: str, **fields):
+        if self.logger.isEnabledFor(level):
+            self.logger.log(level, _Line(logging.getLevelName(level), message, fields))
+
+    def debug(self, message: str, **fields):
+        self.log(logging.DEBUG, message, **fields)
+
+    def info(self, message: str, **fields):
+        self.log(logging.INFO, message, **fields)
+
+    def warning(self, message: str, **fields):
+        self.log(logging.WARNING, message, **fields)
+
+    def error(self, message: str, exc: Exception = None, payload=None, **fields):
+        """Log an error, always with the payload and the exception traceback."""
+        if exc is not None:
+            fields['error'] = repr(exc)
+            fields['traceback'] = lambda: _format_traceback(exc)
+        if payload is not None:
+            fields['payload'] = payload
+        self.log(logging.ERROR, message, **fields)
+
+    def payload(self, message: str, payload, level: int = logging.INFO, **fields):
+        """Log the message and fields, with the (lazy) payload only when sampled."""
+        if self.logger.isEnabledFor(level):
+            if self.sampled():
+                fields['payload'] = payload
+            self.log(level, message, **fields)
+
+
+def _format_traceback(exc: Exception) -> str:
+    import traceback
+
+    return ''.join(traceback.format_exception(type(exc), exc, exc.__traceback__))
@@ -1,53 +1,37 @@
-import boto3
 import os
-import logging
 import json
-import traceback
 
-log = logging.getLogger()
-log.setLevel('INFO')
+import aws_clients
+from sns_notifier import SnsNotifier
+from structured_log import StructuredLogger
 
-SNS_TOPIC_ARN = os.environ.get('SNS_TOPIC_ARN')
-
-def sns_publish(topic_arn: str, subject: str, message: str, region: str):
-    """Function to publish SNS message with the DIH required attributes."""
-    try:
-        log.info(f"Publishing to SNS {json.dumps({ 'topic_arn': topic_arn, 'subject': subject, 'message': message, 'region': region})}")
+log = StructuredLogger()
 
-        sns_client= boto3.client('sns', region_name=region)
-        
-        message_attrib = {}
-        for key in message.keys():
-            if isinstance(message.get(key), list):
-                string_value = ','.join(message.get(key))
-            else:
-                string_value = message.get(key)
-            message_attrib[key] = { 'DataType': 'String','StringValue': json.dumps(string_value)}
+SNS_TOPIC_ARN = os.environ.get('SNS_TOPIC_ARN')
 
-        sns_client.publish(
-            TargetArn=topic_arn,
-            Subject=subject,
-            Message=json.dumps(message),
-            MessageAttributes=message_attrib
-        )
+notifier = SnsNotifier()
 
-    except Exception as e:
-        log.info('Publish to SNS Failed.')
-        log.error(e)
-        log.error(traceback.format_exc())
+aws_clients.preload()
 
 def handler(event, context):
-    log.info(event)
-    for record in event.get('Records'):
-        try:                    
-            region = record.get('awsRegion')
-            log.info(region)
-            body = json.loads(record.get('body')) 
-
-            sns_body = body
-            sns_body['notify_type'] = 'dih_glue_add_ptn_failure'
-            sns_publish(SNS_TOPIC_ARN, 'DIH Glue Catalog Partition Refresh message', sns_body, region )
-            
-        except Exception as e:
-            log.error(e)
-            log.error(traceback.format_exc())
\ No newline at end of file
+    log.payload('Received event.', lambda: event, records=len(event.get('Records')))
+    try:
+        for record in event.get('Records'):
+            try:                    
+                region = record.get('awsRegion')
+                body = json.loads(record.get('body'))
+                # Notifications delivered through the topic subscription are
+                # wrapped in the SNS envelope.
+                if body.get('Type') == 'Notification':
+                    body = json.loads(body.get('Message'))
+
+                sns_body = body
+                sns_body['notify_type'] = 'dih_glue_add_ptn_failure'
+                notifier.queue(SNS_TOPIC_ARN, 'DIH Glue Catalog Partition Refresh message', sns_body, region )
+                log.info('Failure notification queued.', message_id=record.get('messageId'), region=region)
+                
+            except Exception as e:
+                log.error('Unable to queue failure notification.', exc=e, message_id=record.get('messageId'),
+                          payload=lambda: record.get('body'))
+    finally:
+        notifier.flush()
@@ -0,0 +1,223 @@
+"""
+Backfill / reconcile the partitions of a DIH feed table from a storage listing.
+
+After an outage, or when a feed with years of history is onboarded, the
+partitions present in storage can be registered in bulk instead of pushing one
+DIH message per partition through the lambda.  The command:
+
+1. lists the objects under the source prefix (S3, or a local directory that
+   stands in for it when testing),
+2. parses the key=value path segments against the partition keys of the table,
+3. fetches the partitions already in the catalog with paginated get_partitions,
+4. registers the missing partitions with batch_create_partition, several
+   chunks of 100 in parallel.
+
+Progress is written to a checkpoint file after every chunk, a rerun with the
+same checkpoint skips the partitions that were already registered.
+
+    cd lambda/update-partition
+    PYTHONPATH=../common/python python backfill.py --database NYK_SDW_2 --table WH_SOURCE_SYSTEM_DIM \\
+        --checkpoint wh_source_system_dim.json --dry-run
+
+The source defaults to the table location.  When the source is a local
+directory, the partition locations are built from --location-prefix (by default
+the table location) and the path of the partition relative to the source.
+"""
+
+import json
+import logging
+import os
+import threading
+
+from partition_template import PartitionTemplate
+
+log = logging.getLogger()
+
+# Glue accepts at most 100 partitions per BatchCreatePartition request.
+BATCH_CREATE_PARTITION_LIMIT = 100
+
+
+class Checkpoint:
+    """Set of partition values already registered, persisted as a json file."""
+
+    def __init__(self, path: str = None):
+        self.path = path
+        self.done = set()
+        self._lock = threading.Lock()
+        if path and os.path.exists(path):
+            with open(path) as fp:
+                self.done = {tuple(values) for values in json.load(fp).get('registered', [])}
+
+    def __contains__(self, values) -> bool:
+        return tuple(values) in self.done
+
+    def add(self, values_list: list):
+        with self._lock:
+            self.done.update(tuple(values) for values in values_list)
+            if self.path:
+                temp_path = f'{self.path}.tmp'
+                with open(temp_path, 'w') as fp:
+                    json.dump({'registered': sorted(self.done)}, fp)
+                os.replace(temp_path, self.path)
+
+
+def split_s3_uri(uri: str) -> tuple:
+    bucket, _, prefix = uri[len('s3://'):].partition('/')
+    return bucket, prefix
+
+
+def list_keys(source: str, s3_client=None):
+    """Yield the object keys under the source, relative to the source."""
+    if source.startswith('s3://'):
+        bucket, prefix = split_s3_uri(source.rstrip('/') + '/')
+        paginator = s3_client.get_paginator('list_objects_v2')
+        for page in paginator.paginate(Bucket=bucket, Prefix=prefix):
+            for obj in page.get('Contents', []):
+                yield obj['Key'][len(prefix):]
+    else:
+        for root, dirs, files in os.walk(source):
+            dirs.sort()
+            for name in sorted(files):
+                yield os.path.relpath(os.path.join(root, name), source).replace(os.sep, '/')
+
+
+def partitions_from_keys(keys, partition_keys: list) -> dict:
+    """Map the partition values found in the key=value segments of the keys to
+    the relative path of the partition."""
+    names = [partition_key['Name'] for partition_key in partition_keys]
+    partitions = {}
+    for key in keys:
+        segments = key.split('/')[:-1]
+        found = {}
+        depth = 0
+        for index, segment in enumerate(segments):
+            name, sep, value = segment.partition('=')
+            if sep and name in names and name not in found:
+                found[name] = value
+                depth = index + 1
+        if len(found) == len(names):
+            partitions.setdefault(tuple(found[name] for name in names), '/'.join(segments[:depth]))
+    return partitions
+
+
+def existing_partition_values(glue_client, database_name: str, table_name: str) -> set:
+    """Return the partition values already registered, using paginated get_partitions."""
+    existing = set()
+    kwargs = {'DatabaseName': database_name, 'TableName': table_name, 'ExcludeColumnSchema': True}
+    while True:
+        response = glue_client.get_partitions(**kwargs)
+        existing.update(tuple(partition['Values']) for partition in response.get('Partitions', []))
+        if not response.get('NextToken'):
+            return existing
+        kwargs['NextToken'] = response['NextToken']
+
+
+def create_chunk(glue_client, database_name: str, table_name: str, template: PartitionTemplate, chunk: list) -> dict:
+    """Register one chunk of (values, location) and count the outcome."""
+    partition_input_list = template.partition_inputs(chunk)
+
+    response = glue_client.batch_create_partition(
+        DatabaseName=database_name,
+        TableName=table_name,
+        PartitionInputList=partition_input_list
+    )
+    errors = {tuple(error['PartitionValues']): error.get('ErrorDetail', {}) for error in response.get('Errors', [])}
+    result = {'created': [], 'already_exists': [], 'failed': []}
+    for values, location in chunk:
+        error = errors.get(tuple(values))
+        if error is None:
+            result['created'].append(values)
+        elif error.get('ErrorCode') == 'AlreadyExistsException':
+            result['already_exists'].append(values)
+        else:
+            log.error(f"Partition {list(values)} failed. {error.get('ErrorCode')}: {error.get('ErrorMessage')}")
+            result['failed'].append(values)
+    return result
+
+
+def backfill(glue_client, database_name: str, table_name: str, source: str = None, location_prefix: str = None,
+             checkpoint: Checkpoint = None, workers: int = 4, dry_run: bool = False, s3_client=None) -> dict:
+    """Register the partitions found under the source that are missing from the
+    catalog and return a summary of the run."""
+    checkpoint = checkpoint or Checkpoint()
+    table = glue_client.get_table(DatabaseName=database_name, Name=table_name)['Table']
+    storage_descriptor = table['StorageDescriptor']
+
+    source = source or storage_descriptor['Location']
+    if location_prefix is None:
+        location_prefix = source if source.startswith('s3://') else storage_descriptor['Location']
+    location_prefix = location_prefix.rstrip('/')
+
+    listed = partitions_from_keys(list_keys(source, s3_client), table.get('PartitionKeys', []))
+    existing = existing_partition_values(glue_client, database_name, table_name)
+    missing = [
+        (values, f'{location_prefix}/{path}')
+        for values, path in sorted(listed.items())
+        if values not in existing and values not in checkpoint
+    ]
+
+    summary = {
+        'listed': len(listed),
+        'existing': len(existing),
+        'checkpointed': len([values for values in listed if values not in existing and values in checkpoint]),
+        'missing': len(missing),
+        'created': 0,
+        'already_exists': 0,
+        'failed': [],
+    }
+    if dry_run or not missing:
+        return summary
+
+    from concurrent.futures import ThreadPoolExecutor, as_completed
+
+    template = PartitionTemplate(storage_descriptor)
+    chunks = [missing[start:start + BATCH_CREATE_PARTITION_LIMIT] for start in range(0, len(missing), BATCH_CREATE_PARTITION_LIMIT)]
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+        futures = {
+            executor.submit(create_chunk, glue_client, database_name, table_name, template, chunk): chunk
+            for chunk in chunks
+        }
+        for future in as_completed(futures):
+            try:
+                result = future.result()
+            except Exception as e:
+                log.error(f'Batch create partition failed. {e}')
+                summary['failed'].extend(list(values) for values, location in futures[future])
+                continue
+            checkpoint.add(result['created'] + result['already_exists'])
+            summary['created'] += len(result['created'])
+            summary['already_exists'] += len(result['already_exists'])
+            summary['failed'].extend(list(values) for values in result['failed'])
+
+    return summary
+
+
+def main(argv=None):
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Register the partitions of a DIH feed table found in storage.')
+    parser.add_argument('--database', required=True)
+    parser.add_argument('--table', required=True)
+    parser.add_argument('--source', help='s3://bucket/prefix or a local directory, defaults to the table location')
+    parser.add_argument('--location-prefix', help='location the partition paths are relative to')
+    parser.add_argument('--checkpoint', help='json file recording the registered partitions, used to resume')
+    parser.add_argument('--workers', type=int, default=4, help='batch_create_partition calls in flight')
+    parser.add_argument('--dry-run', action='store_true', help='report the missing partitions without registering them')
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level='INFO')
+
+    import aws_clients
+
+    summary = backfill(
+        aws_clients.get_client('glue'), args.database, args.table,
+        source=args.source, location_prefix=args.location_prefix, checkpoint=Checkpoint(args.checkpoint),
+        workers=args.workers, dry_run=args.dry_run,
+        s3_client=aws_clients.get_client('s3') if (args.source or 's3://').startswith('s3://') else None
+    )
+    print(json.dumps(summary, indent=2))
+    return 1 if summary['failed'] else 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
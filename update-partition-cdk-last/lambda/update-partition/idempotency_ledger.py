@@ -0,0 +1,159 @@
+"""
+Idempotency ledger for the notifications handled by the update partition lambda.
+
+SQS delivers at least once and DIH re-publishes, so the same notification may
+reach the lambda several times, and every copy used to end in another success
+notification that made the downstream consumers repeat their work.  The ledger
+remembers, for a while, the notifications whose outcome has been published.
+
+Each notification is claimed before it is processed with a conditional write
+that only succeeds when the key is absent or its entry has expired:
+
+claimed      the notification is processed, then completed (the entry is kept
+             for ttl_seconds) once its outcome is published, or released
+             (deleted) when it is returned to the queue
+completed    a duplicate, acknowledged without any Glue or SNS call
+in_progress  another invocation holds the claim, the record is returned to the
+             queue and retried once that invocation is done or its lease_seconds
+             have passed
+
+The entries are stored by a backend with put_if_absent / put / delete:
+
+DynamoDbBackend  a DynamoDB table keyed by "pk", with the time to live of the
+                 table on "expires_at" (production)
+SqliteBackend    a sqlite database, in memory by default (tests, local runs)
+MemoryBackend    a dict (tests)
+"""
+
+import threading
+import time
+
+CLAIMED = 'claimed'
+COMPLETED = 'completed'
+IN_PROGRESS = 'in_progress'
+
+
+def error_code(e: Exception) -> str:
+    """Return the AWS error code of a botocore exception, or the exception name."""
+    response = getattr(e, 'response', None) or {}
+    return response.get('Error', {}).get('Code') or type(e).__name__
+
+
+class MemoryBackend:
+    """Entries kept in a dict, for the tests."""
+
+    def __init__(self):
+        self.entries = {}
+        self._lock = threading.Lock()
+
+    def put_if_absent(self, key: str, status: str, expires_at: float, now: float) -> str:
+        """Store the entry unless a live one exists, return the status of the live entry or None."""
+        with self._lock:
+            entry = self.entries.get(key)
+            if entry is not None and entry[1] >= now:
+                return entry[0]
+            self.entries[key] = (status, expires_at)
+            return None
+
+    def put(self, key: str, status: str, expires_at: float):
+        with self._lock:
+            self.entries[key] = (status, expires_at)
+
+    def delete(self, key: str):
+        with self._lock:
+            self.entries.pop(key, None)
+
+
+class SqliteBackend:
+    """Entries kept in a sqlite database, in memory unless a path is given."""
+
+    def __init__(self, path: str = ':memory:'):
+        # Imported here, the lambda only loads sqlite3 for local runs.
+        import sqlite3
+
+        self._connection = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._connection.execute(
+            'CREATE TABLE IF NOT EXISTS ledger (pk TEXT PRIMARY KEY, status TEXT NOT NULL, expires_at REAL NOT NULL)'
+        )
+        self._lock = threading.Lock()
+
+    def put_if_absent(self, key: str, status: str, expires_at: float, now: float) -> str:
+        with self._lock:
+            cursor = self._connection.cursor()
+            cursor.execute('BEGIN IMMEDIATE')
+            try:
+                row = cursor.execute('SELECT status, expires_at FROM ledger WHERE pk = ?', (key,)).fetchone()
+                if row is not None and row[1] >= now:
+                    return row[0]
+                cursor.execute('INSERT OR REPLACE INTO ledger (pk, status, expires_at) VALUES (?, ?, ?)',
+                               (key, status, expires_at))
+                return None
+            finally:
+                cursor.execute('COMMIT')
+
+    def put(self, key: str, status: str, expires_at: float):
+        with self._lock:
+            self._connection.execute('INSERT OR REPLACE INTO ledger (pk, status, expires_at) VALUES (?, ?, ?)',
+                                     (key, status, expires_at))
+
+    def delete(self, key: str):
+        with self._lock:
+            self._connection.execute('DELETE FROM ledger WHERE pk = ?', (key,))
+
+
+class DynamoDbBackend:
+    """Entries kept in a DynamoDB table with a "pk" string key and the time to
+    live on the "expires_at" number attribute.  Expired entries may linger until
+    DynamoDB removes them, so the condition compares expires_at as well."""
+
+    def __init__(self, table_name: str, client_factory):
+        self.table_name = table_name
+        self.client_factory = client_factory
+
+    @staticmethod
+    def _item(key: str, status: str, expires_at: float) -> dict:
+        return {'pk': {'S': key}, 'status': {'S': status}, 'expires_at': {'N': str(int(expires_at))}}
+
+    def put_if_absent(self, key: str, status: str, expires_at: float, now: float) -> str:
+        client = self.client_factory()
+        try:
+            client.put_item(
+                TableName=self.table_name,
+                Item=self._item(key, status, expires_at),
+                ConditionExpression='attribute_not_exists(pk) OR expires_at < :now',
+                ExpressionAttributeValues={':now': {'N': str(int(now))}}
+            )
+            return None
+        except Exception as e:
+            if error_code(e) != 'ConditionalCheckFailedException':
+                raise
+        item = client.get_item(TableName=self.table_name, Key={'pk': {'S': key}}, ConsistentRead=True).get('Item')
+        # An entry deleted in between was released by its holder, which is
+        # returning the record to the queue: wait for that copy.
+        return item['status']['S'] if item else IN_PROGRESS
+
+    def put(self, key: str, status: str, expires_at: float):
+        self.client_factory().put_item(TableName=self.table_name, Item=self._item(key, status, expires_at))
+
+    def delete(self, key: str):
+        self.client_factory().delete_item(TableName=self.table_name, Key={'pk': {'S': key}})
+
+
+class IdempotencyLedger:
+    """Claims, completes and releases notification keys in a backend."""
+
+    def __init__(self, backend, ttl_seconds: float = 86400, lease_seconds: float = 150):
+        self.backend = backend
+        self.ttl_seconds = ttl_seconds
+        self.lease_seconds = lease_seconds
+
+    def claim(self, key: str) -> str:
+        """Claim the key, return CLAIMED, or the status of the live entry holding it."""
+        now = time.time()
+        return self.backend.put_if_absent(key, IN_PROGRESS, now + self.lease_seconds, now) or CLAIMED
+
+    def complete(self, key: str):
+        self.backend.put(key, COMPLETED, time.time() + self.ttl_seconds)
+
+    def release(self, key: str):
+        self.backend.delete(key)
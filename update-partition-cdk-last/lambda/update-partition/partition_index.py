@@ -0,0 +1,72 @@
+"""
+Index of partitions recently registered by the update partition lambda.
+
+SNS redeliveries, DIH re-publishes and the at least once delivery of SQS mean
+the same partition notification often arrives more than once.  The index keeps
+the (database, table, partition values) keys that are known to exist in the
+catalog across warm invocations, so a duplicate can be acknowledged without a
+Glue call.  The index is bounded (least recently used keys are evicted first)
+and entries expire after a ttl, so a partition dropped from the catalog is
+eventually registered again.
+
+An entry may carry the fingerprint of the location and storage descriptor the
+partition was registered with.  contains() with a fingerprint only matches an
+entry with the same fingerprint, so the upsert mode of the lambda still looks
+at a partition that is notified with a new location.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+
+
+class PartitionIndex:
+    """Bounded, expiring set of (database, table, partition values) keys."""
+
+    def __init__(self, ttl_seconds: float = 900, max_entries: int = 100000):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {'hits': 0, 'misses': 0, 'evicted': 0}
+
+    @staticmethod
+    def key(database_name: str, table_name: str, values) -> tuple:
+        return (database_name, table_name, tuple(values))
+
+    def contains(self, database_name: str, table_name: str, values, fingerprint=None) -> bool:
+        key = self.key(database_name, table_name, values)
+        with self._lock:
+            added, added_fingerprint = self._entries.get(key, (None, None))
+            if added is not None and time.monotonic() - added < self.ttl_seconds:
+                if fingerprint is not None and fingerprint != added_fingerprint:
+                    self._stats['misses'] += 1
+                    return False
+                self._entries.move_to_end(key)
+                self._stats['hits'] += 1
+                return True
+            if added is not None:
+                del self._entries[key]
+            self._stats['misses'] += 1
+            return False
+
+    def add(self, database_name: str, table_name: str, values, fingerprint=None):
+        key = self.key(database_name, table_name, values)
+        with self._lock:
+            self._entries[key] = (time.monotonic(), fingerprint)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self._stats['evicted'] += 1
+
+    def discard(self, database_name: str, table_name: str, values):
+        with self._lock:
+            self._entries.pop(self.key(database_name, table_name, values), None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return dict(self._stats, size=len(self._entries))
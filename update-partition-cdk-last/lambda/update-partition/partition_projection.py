@@ -0,0 +1,136 @@
+"""
+Partition projection support for the update partition lambda.
+
+Most DIH feeds are partitioned by a business date (dw_bus_dt) with the
+partition_prefix laid out as <table location>/<key>=<value>.  For these feeds
+Athena can compute the partitions from the table properties (partition
+projection), so registering every partition in the catalog is pure overhead
+and only grows the number of catalog partitions.
+
+A table is switched to projection once, with the properties derived from its
+existing StorageDescriptor and PartitionKeys:
+
+    cd lambda/update-partition
+    PYTHONPATH=../common/python python partition_projection.py --database NYK_SDW_2 --table WH_SOURCE_SYSTEM_DIM --dry-run
+    PYTHONPATH=../common/python python partition_projection.py --database NYK_SDW_2 --table WH_SOURCE_SYSTEM_DIM
+
+Afterwards the lambda acknowledges notifications for the table without any
+catalog write, as long as the partition_prefix matches the location the
+projection template computes for the partition values.  Notifications that do
+not match are flagged, the data would not be visible through the projection.
+
+Date keys (type date, or a name ending in _dt / _date) are projected as date
+ranges, every other key as an injected value that queries must supply.
+"""
+
+import json
+import re
+
+# Fields of a Glue 'Table' structure that update_table accepts in TableInput.
+TABLE_INPUT_FIELDS = (
+    'Name', 'Description', 'Owner', 'LastAccessTime', 'LastAnalyzedTime', 'Retention',
+    'StorageDescriptor', 'PartitionKeys', 'ViewOriginalText', 'ViewExpandedText',
+    'TableType', 'Parameters', 'TargetTable'
+)
+
+DATE_FORMAT = 'yyyy-MM-dd'
+DATE_RANGE = 'NOW-10YEARS,NOW+1DAYS'
+
+
+class ProjectionMismatch(Exception):
+    """The notification does not match the projection template of the table."""
+
+
+def is_projected(table: dict) -> bool:
+    return (table.get('Parameters') or {}).get('projection.enabled', '').lower() == 'true'
+
+
+def is_date_key(partition_key: dict) -> bool:
+    name = partition_key['Name'].lower()
+    return partition_key.get('Type', '').lower() == 'date' or name.endswith('_dt') or name.endswith('_date')
+
+
+def projection_parameters(table: dict, date_range: str = DATE_RANGE, date_format: str = DATE_FORMAT) -> dict:
+    """Derive the partition projection table properties for a Glue table."""
+    partition_keys = table.get('PartitionKeys') or []
+    if not partition_keys:
+        raise ValueError(f"Table {table.get('Name')} has no partition keys.")
+
+    location = table['StorageDescriptor']['Location'].rstrip('/')
+    parameters = {'projection.enabled': 'true'}
+    for partition_key in partition_keys:
+        name = partition_key['Name']
+        if is_date_key(partition_key):
+            parameters.update({
+                f'projection.{name}.type': 'date',
+                f'projection.{name}.format': date_format,
+                f'projection.{name}.range': date_range,
+                f'projection.{name}.interval': '1',
+                f'projection.{name}.interval.unit': 'DAYS',
+            })
+        else:
+            parameters[f'projection.{name}.type'] = 'injected'
+    parameters['storage.location.template'] = location + ''.join(
+        f"/{partition_key['Name']}=${{{partition_key['Name']}}}" for partition_key in partition_keys
+    )
+    return parameters
+
+
+def expected_location(table: dict, values: list) -> str:
+    """Return the location the projection template gives for the partition values."""
+    partition_keys = table.get('PartitionKeys') or []
+    values = values or []
+    if len(values) != len(partition_keys):
+        raise ProjectionMismatch(f'Expected {len(partition_keys)} partition values, got {len(values)}.')
+
+    template = table['Parameters'].get('storage.location.template')
+    if template is None:
+        template = table['StorageDescriptor']['Location'].rstrip('/') + ''.join(
+            f"/{partition_key['Name']}=${{{partition_key['Name']}}}" for partition_key in partition_keys
+        )
+    substitutions = {partition_key['Name']: value for partition_key, value in zip(partition_keys, values)}
+    return re.sub(r'\$\{([^}]+)\}', lambda match: substitutions.get(match.group(1), match.group(0)), template)
+
+
+def check_location(table: dict, values: list, location: str):
+    """Raise ProjectionMismatch unless the location matches the projection template."""
+    expected = expected_location(table, values)
+    if (location or '').rstrip('/') != expected.rstrip('/'):
+        raise ProjectionMismatch(f'Location {location} does not match the projection template, expected {expected}.')
+
+
+def enable_projection(glue_client, database_name: str, table_name: str, date_range: str = DATE_RANGE,
+                      date_format: str = DATE_FORMAT, dry_run: bool = False) -> dict:
+    """Add the projection properties to the table and return them."""
+    table = glue_client.get_table(DatabaseName=database_name, Name=table_name)['Table']
+    parameters = projection_parameters(table, date_range, date_format)
+
+    if not dry_run:
+        table_input = {field: table[field] for field in TABLE_INPUT_FIELDS if field in table}
+        table_input['Parameters'] = dict(table.get('Parameters') or {}, **parameters)
+        glue_client.update_table(DatabaseName=database_name, TableInput=table_input)
+    return parameters
+
+
+def main(argv=None):
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Enable Glue/Athena partition projection on a DIH feed table.')
+    parser.add_argument('--database', required=True)
+    parser.add_argument('--table', required=True)
+    parser.add_argument('--date-range', default=DATE_RANGE)
+    parser.add_argument('--date-format', default=DATE_FORMAT)
+    parser.add_argument('--dry-run', action='store_true', help='print the properties without updating the table')
+    args = parser.parse_args(argv)
+
+    import aws_clients
+
+    parameters = enable_projection(
+        aws_clients.get_client('glue'), args.database, args.table,
+        date_range=args.date_range, date_format=args.date_format, dry_run=args.dry_run
+    )
+    print(json.dumps(parameters, indent=2))
+
+
+if __name__ == '__main__':
+    main()
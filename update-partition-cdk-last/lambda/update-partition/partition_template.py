@@ -0,0 +1,55 @@
+"""
+Partition inputs built from a table's storage descriptor without copying it.
+
+A partition inherits the storage descriptor of its table with only the
+Location changed.  Deep copying the descriptor for every partition (columns,
+SerDe info and parameters of tables with hundreds of columns) used to dominate
+the CPU time of the update partition lambda.  A PartitionTemplate is built once
+per table and shares the table's Columns, SerdeInfo, Parameters and the other
+attributes between all the partition inputs it builds, only the top level of
+the descriptor (a dict of a dozen keys) is new for every partition.
+
+The shared parts must be treated as read only: the partition inputs are meant
+to be handed to the Glue client, which only serializes them.
+"""
+
+import hashlib
+import json
+
+# Storage descriptor attributes a partition inherits from its table, compared
+# (with the location) by the upsert mode of the lambda.
+FINGERPRINT_KEYS = ('Columns', 'InputFormat', 'OutputFormat', 'Compressed', 'NumberOfBuckets', 'SerdeInfo',
+                    'BucketColumns', 'SortColumns', 'Parameters', 'SkewedInfo', 'StoredAsSubDirectories')
+
+
+def descriptor_digest(storage_descriptor: dict) -> str:
+    """Digest of the storage descriptor attributes a partition inherits from its table."""
+    compared = {key: storage_descriptor[key] for key in FINGERPRINT_KEYS if storage_descriptor.get(key) not in (None, [], {})}
+    return hashlib.sha1(json.dumps(compared, sort_keys=True, default=str).encode()).hexdigest()
+
+
+class PartitionTemplate:
+    """Builds the PartitionInput of the partitions of one table."""
+
+    def __init__(self, storage_descriptor: dict):
+        self._shared = {key: value for key, value in storage_descriptor.items() if key != 'Location'}
+        self._digest = None
+
+    @property
+    def digest(self) -> str:
+        """descriptor_digest() of the table storage descriptor, computed once."""
+        if self._digest is None:
+            self._digest = descriptor_digest(self._shared)
+        return self._digest
+
+    def storage_descriptor(self, location: str) -> dict:
+        storage_descriptor = dict(self._shared)
+        storage_descriptor['Location'] = location
+        return storage_descriptor
+
+    def partition_input(self, values, location: str) -> dict:
+        return {'Values': list(values), 'StorageDescriptor': self.storage_descriptor(location)}
+
+    def partition_inputs(self, partitions) -> list:
+        """Build the PartitionInputList of batch_create_partition from (values, location) pairs."""
+        return [self.partition_input(values, location) for values, location in partitions]
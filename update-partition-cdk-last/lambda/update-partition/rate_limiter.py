@@ -0,0 +1,117 @@
+"""
+Client side, throttling aware rate limiter for the Glue calls of the lambda.
+
+When many containers scale out on a backlog the Glue APIs throttle, and the
+only backoff used to be the SQS redelivery of the whole batch.  The limiter is
+a token bucket shared by the worker threads of a container: every Glue call
+takes a token, a ThrottlingException halves the rate (down to min_rate) and
+every successful call adds a little back (up to max_rate), so each container
+settles on the rate Glue sustains.  A throttled call is retried inside the
+invocation after the bucket has slowed down, only a call throttled on every
+attempt is raised to the handler.
+
+The limiter is the only retry layer for throttling: the Glue client of the
+lambda is built without botocore retries (GLUE_CLIENT_RETRY_MODE standard,
+GLUE_CLIENT_MAX_ATTEMPTS 1), otherwise every attempt of the limiter would be
+retried again by botocore's adaptive mode with a rate limiter of its own.
+"""
+
+import threading
+import time
+
+THROTTLING_ERROR_CODES = (
+    'ThrottlingException', 'Throttling', 'TooManyRequestsException', 'RequestLimitExceeded',
+    'ProvisionedThroughputExceededException'
+)
+
+
+def error_code(e: Exception) -> str:
+    """Return the AWS error code of a botocore exception, or the exception name."""
+    response = getattr(e, 'response', None) or {}
+    return response.get('Error', {}).get('Code') or type(e).__name__
+
+
+class AdaptiveRateLimiter:
+    """Token bucket with an additive increase, multiplicative decrease rate."""
+
+    def __init__(self, max_rate: float = 20, min_rate: float = 1, burst: float = None, increase: float = 0.5,
+                 attempts: int = 4, max_backoff_seconds: float = 5):
+        self.max_rate = max_rate
+        self.min_rate = min(min_rate, max_rate)
+        self.rate = max_rate
+        self.burst = burst or max_rate
+        self.increase = increase
+        self.attempts = attempts
+        self.max_backoff_seconds = max_backoff_seconds
+        self._tokens = self.burst
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+        self._stats = {'calls': 0, 'throttled': 0, 'waited_ms': 0}
+
+    def acquire(self):
+        """Take a token, waiting for the bucket to refill when it is empty."""
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            self._tokens -= 1
+            wait = -self._tokens / self.rate if self._tokens < 0 else 0
+            self._stats['calls'] += 1
+            self._stats['waited_ms'] += int(wait * 1000)
+        if wait:
+            time.sleep(wait)
+
+    def throttled(self):
+        with self._lock:
+            self.rate = max(self.min_rate, self.rate / 2)
+            self._tokens = min(self._tokens, 0)
+            self._stats['throttled'] += 1
+
+    def succeeded(self):
+        with self._lock:
+            self.rate = min(self.max_rate, self.rate + self.increase)
+
+    def call(self, function, *args, **kwargs):
+        """Call the function within the rate, retrying it while it is throttled."""
+        for attempt in range(1, self.attempts + 1):
+            self.acquire()
+            try:
+                result = function(*args, **kwargs)
+            except Exception as e:
+                if error_code(e) not in THROTTLING_ERROR_CODES:
+                    raise
+                self.throttled()
+                if attempt == self.attempts:
+                    raise
+                time.sleep(min(self.max_backoff_seconds, 2 ** (attempt - 1) / self.rate))
+            else:
+                self.succeeded()
+                return result
+
+    def client(self, client):
+        """Wrap a client so that every API call goes through the limiter."""
+        return _LimitedClient(client, self)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return dict(self._stats, rate=round(self.rate, 2))
+
+
+class _LimitedClient:
+    """Takes a token for the API operations of the client, the helpers
+    (get_paginator, can_paginate, meta, ...) are passed through."""
+
+    def __init__(self, client, limiter: AdaptiveRateLimiter):
+        self._client = client
+        self._limiter = limiter
+        self._operations = client.meta.method_to_api_mapping
+
+    def __getattr__(self, name):
+        attribute = getattr(self._client, name)
+        if name not in self._operations:
+            return attribute
+        limiter = self._limiter
+
+        def call(*args, **kwargs):
+            return limiter.call(attribute, *args, **kwargs)
+        return call
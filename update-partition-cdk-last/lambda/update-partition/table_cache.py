@@ -0,0 +1,89 @@
+"""
+Warm container cache of Glue table definitions for the update partition lambda.
+
+The same few hundred feeds arrive over and over, so the result of get_table is
+kept at module scope and reused across invocations of a warm container.  The
+cache is bounded (least recently used entries are evicted first) and every
+entry is revalidated against Glue once it is older than the ttl.  On
+revalidation the table's VersionId and UpdateTime are compared with the cached
+copy and the entry is only replaced when either has changed.  Entries can also
+be dropped explicitly, e.g. when create_partition fails with a schema related
+error.
+
+The counters in stats() show how many get_table calls the cache has saved.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+
+
+class TableDescriptorCache:
+    """LRU/TTL cache of Glue 'Table' structures keyed by (database, table)."""
+
+    def __init__(self, glue_client_factory, ttl_seconds: float = 300, max_entries: int = 512):
+        self._glue_client_factory = glue_client_factory
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {
+            'hits': 0,
+            'misses': 0,
+            'revalidated': 0,
+            'changed': 0,
+            'invalidated': 0,
+            'evicted': 0,
+        }
+
+    def get_table(self, database_name: str, table_name: str) -> dict:
+        """Return the Glue 'Table' structure, calling get_table only when needed."""
+        key = (database_name, table_name)
+        now = time.monotonic()
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and now - entry['fetched'] < self.ttl_seconds:
+                self._entries.move_to_end(key)
+                self._stats['hits'] += 1
+                return entry['table']
+
+        table = self._glue_client_factory().get_table(
+            DatabaseName=database_name,
+            Name=table_name
+        )['Table']
+
+        with self._lock:
+            if entry is None:
+                self._stats['misses'] += 1
+            elif self._version(entry['table']) == self._version(table):
+                self._stats['revalidated'] += 1
+                table = entry['table']
+            else:
+                self._stats['changed'] += 1
+
+            self._entries[key] = {'table': table, 'fetched': now}
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self._stats['evicted'] += 1
+
+        return table
+
+    def invalidate(self, database_name: str, table_name: str):
+        """Drop the cached definition so the next lookup reads it from Glue."""
+        with self._lock:
+            if self._entries.pop((database_name, table_name), None) is not None:
+                self._stats['invalidated'] += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return dict(self._stats, size=len(self._entries))
+
+    @staticmethod
+    def _version(table: dict):
+        return (table.get('VersionId'), table.get('UpdateTime'))
@@ -22,7 +22,8 @@ In this example, the value for "feed" is a composite of the database and table
 
 The function is also mandated to run as VPC attached and communicate with other 
 AWS services through VPC endpoints.  Communication to the glue service requires
-the boto3 client to be created with the DNS name of the endpoint.
+the boto3 client to be created with the DNS name of the endpoint, which the
+shared client registry (aws_clients) reads from GLUE_ENDPOINT_DNS.
 
 On successful execution the new partition with be created and a success 
 response is submitted back to DIH.  If the partition is already present in
@@ -32,114 +33,715 @@ retry logic for lambda will retry 3 times and then push the message to the
 dead letter queue.  The dead letter queue message then triggers the dead 
 letter lambda function to send a failure response to DIH.
 
+DIH often publishes several files into the same partition within seconds.  The
+notifications of a batch (see MaximumBatchingWindowInSeconds of the mapping)
+for the same feed, partition values and partition_prefix are coalesced into a
+single catalog operation, its outcome is notified for every source message.
+
+Only "dih_file_create_success" notifications create partitions.  The queue
+subscription the stack creates (subscribe_queue_to_topic) filters on the
+notify_type message attribute, and records of any
+other type that still arrive are skipped before their message is decoded,
+without affecting the other records of the batch.
+
+The event source mapping may deliver several records per invocation.  The
+records are grouped by "feed" and registered with batch_create_partition in
+chunks of up to 100 partitions per table.  The handler returns the message ids
+of the records that failed as batchItemFailures, so only those records are 
+returned to the queue (the mapping must be configured with 
+ReportBatchItemFailures).  With MAX_TABLE_CONCURRENCY above 1 the tables of a
+batch are registered concurrently, the records of a table stay in order.
+
+Tables configured with partition projection (see partition_projection.py) are
+not written to: their notifications are acknowledged once the partition_prefix
+is checked against the projection template.
+
+Failures a retry cannot fix (a feed that is not <DATABASE_NAME>#<TABLE_NAME>, a
+table that does not exist, partition values that do not match the partition
+keys of the table, a partition_prefix outside the projection template) are not
+retried: the failure notification is sent straight away and the record is
+acknowledged.  Partitions rejected by Glue as invalid are tried once more
+against a fresh table definition, one per request, before they are failed for
+good.  Every other error is reported in batchItemFailures and retried, and
+reaches the dead letter lambda once the retries are exhausted.
+
+With PARTITION_UPSERT set to true (a reprocessed feed notifies partitions that
+already exist with a new partition_prefix), the partitions of a batch that
+already exist are read with batch_get_partition and their location and storage
+descriptor compared with the notification.  The ones that differ are rewritten
+with batch_update_partition, the ones that match are acknowledged without a
+write.  Notifications of a batch for the same partition values with different
+partition_prefix are coalesced as well, the last one wins.
+
+With an idempotency ledger (see idempotency_ledger.py, a DynamoDB table named
+by IDEMPOTENCY_TABLE) every notification is claimed with a conditional write
+keyed by its SNS MessageId before it is processed, and completed once its
+outcome is published.  A redelivered notification is then acknowledged without
+any Glue or SNS call, so downstream receives one outcome per notification.
+Records whose outcome could not be published are returned to the queue, their
+claims released, so a redelivery sends it.
+
+On a FIFO queue (records with a MessageGroupId, the feed) the records of a
+group are registered one at a time, in order.  The first failure stops the
+group: the records after it are returned to the queue without any Glue write or
+notification, so a table's notifications are never published out of order.
+
+Glue calls go through a token bucket rate limiter (see rate_limiter.py) that
+halves its rate on ThrottlingException and retries the throttled call within
+the invocation, instead of leaving the backoff to the SQS redelivery.
+GLUE_MAX_REQUESTS_PER_SECOND caps the rate of each container.
+
 """
 
-import boto3
 import os
-import copy
-import logging
 import json
-import traceback
 
-log = logging.getLogger()
-log.setLevel('INFO')
+import aws_clients
+from idempotency_ledger import CLAIMED, COMPLETED, DynamoDbBackend, IdempotencyLedger, SqliteBackend
+from partition_index import PartitionIndex
+from partition_projection import ProjectionMismatch, check_location, is_projected
+from partition_template import PartitionTemplate, descriptor_digest
+from rate_limiter import AdaptiveRateLimiter
+from sns_notifier import SnsNotifier
+from structured_log import StructuredLogger
+from table_cache import TableDescriptorCache
+
+log = StructuredLogger()
 
 SNS_TOPIC_ARN = os.environ.get('SNS_TOPIC_ARN')
 
-GLUE_ENDPOINT_DNS = os.environ.get('GLUE_ENDPOINT_DNS')
-glue_url = f'https://{GLUE_ENDPOINT_DNS}'
-glue_client = boto3.client('glue', endpoint_url=glue_url)
+# The only notification type that creates partitions, every other one is skipped.
+CREATE_NOTIFY_TYPE = 'dih_file_create_success'
+
+# Number of tables registered concurrently within one invocation.  The client
+# connection pool is sized so that every worker has a connection of its own.
+MAX_TABLE_CONCURRENCY = int(os.environ.get('MAX_TABLE_CONCURRENCY', '1'))
+# Number of idempotency ledger claims, completions and releases in flight.
+IDEMPOTENCY_CONCURRENCY = int(os.environ.get('IDEMPOTENCY_CONCURRENCY', '8'))
+os.environ.setdefault('AWS_CLIENT_MAX_POOL_CONNECTIONS',
+                      str(max(10, MAX_TABLE_CONCURRENCY, IDEMPOTENCY_CONCURRENCY)))
+
+# Throttled Glue calls are retried by the rate limiter, botocore does not retry
+# them a second time (see rate_limiter.py).
+os.environ.setdefault('GLUE_CLIENT_RETRY_MODE', 'standard')
+os.environ.setdefault('GLUE_CLIENT_MAX_ATTEMPTS', '1')
+
+# Glue accepts at most 100 partitions per BatchCreatePartition request.
+BATCH_CREATE_PARTITION_LIMIT = 100
+
+# Glue accepts at most 1000 partitions per BatchGetPartition request.
+BATCH_GET_PARTITION_LIMIT = 1000
+
+# Glue accepts at most 100 entries per BatchUpdatePartition request.
+BATCH_UPDATE_PARTITION_LIMIT = 100
+
+# Upsert mode: a partition that already exists with another location or storage
+# descriptor than the notification would register is updated instead of left
+# as it is.
+PARTITION_UPSERT = os.environ.get('PARTITION_UPSERT', 'false').lower() == 'true'
+
+# Error codes that a retry of the same notification cannot fix.
+PERMANENT_ERROR_CODES = ('InvalidInputException', 'EntityNotFoundException', 'ValidationException')
+
+# The permanent errors that may come from a cached table definition that no
+# longer matches the catalog (partition keys changed, table dropped or
+# recreated), which invalidate the cached definition.  A ValidationException
+# is about the request itself.
+SCHEMA_ERROR_CODES = ('InvalidInputException', 'EntityNotFoundException')
+
+notifier = SnsNotifier()
+
+# Every Glue call of the container goes through one rate limiter, which slows
+# down when Glue throttles and speeds up again as calls succeed.
+glue_limiter = AdaptiveRateLimiter(
+    max_rate=float(os.environ.get('GLUE_MAX_REQUESTS_PER_SECOND', '20')),
+    min_rate=float(os.environ.get('GLUE_MIN_REQUESTS_PER_SECOND', '1')),
+    attempts=int(os.environ.get('GLUE_THROTTLE_ATTEMPTS', '4'))
+)
+
+def glue_client():
+    return glue_limiter.client(aws_clients.get_client('glue'))
+
+table_cache = TableDescriptorCache(
+    glue_client,
+    ttl_seconds=float(os.environ.get('TABLE_CACHE_TTL_SECONDS', '300')),
+    max_entries=int(os.environ.get('TABLE_CACHE_MAX_ENTRIES', '512'))
+)
+
+partition_index = PartitionIndex(
+    ttl_seconds=float(os.environ.get('PARTITION_INDEX_TTL_SECONDS', '900')),
+    max_entries=int(os.environ.get('PARTITION_INDEX_MAX_ENTRIES', '100000'))
+)
+
+def idempotency_ledger():
+    """Build the ledger of handled notifications: a DynamoDB table named by
+    IDEMPOTENCY_TABLE, a sqlite database at IDEMPOTENCY_SQLITE_PATH for local
+    runs, or none at all."""
+    if os.environ.get('IDEMPOTENCY_TABLE'):
+        backend = DynamoDbBackend(os.environ['IDEMPOTENCY_TABLE'], lambda: aws_clients.get_client('dynamodb'))
+    elif os.environ.get('IDEMPOTENCY_SQLITE_PATH'):
+        backend = SqliteBackend(os.environ['IDEMPOTENCY_SQLITE_PATH'])
+    else:
+        return None
+    return IdempotencyLedger(
+        backend,
+        ttl_seconds=float(os.environ.get('IDEMPOTENCY_TTL_SECONDS', '86400')),
+        lease_seconds=float(os.environ.get('IDEMPOTENCY_LEASE_SECONDS', '150'))
+    )
+
+ledger = idempotency_ledger()
+
+# Records coalesced into another record of the invocation, by id() of that
+# record.  Filled per feed by coalesce() and emptied as the outcomes are sent.
+coalesced = {}
 
-def sns_publish(topic_arn: str, subject: str, message: str, region: str):
-    """Function to publish SNS message with the DIH required attributes."""
+# id() of the records of the invocation whose outcome has been notified.
+notified = set()
+
+aws_clients.preload()
+
+def error_code(e: Exception) -> str:
+    """Return the AWS error code of a botocore exception, or the exception name."""
+    response = getattr(e, 'response', None) or {}
+    return response.get('Error', {}).get('Code') or type(e).__name__
+
+def partition_chunks(items: list, size: int):
+    """Split the (record, body) pairs of one table into batch_create_partition
+    sized chunks.  A partition value list only appears once per chunk, repeats
+    are pushed to a later chunk so they resolve as AlreadyExistsException."""
+    pending = list(items)
+    while pending:
+        chunk, seen, deferred = [], set(), []
+        for item in pending:
+            values = tuple(item[1].get('partition_value_list'))
+            if values in seen or len(chunk) >= size:
+                deferred.append(item)
+            else:
+                seen.add(values)
+                chunk.append(item)
+        yield chunk
+        pending = deferred
+
+def attribute_value(attribute) -> str:
+    """Return the value of a message attribute of the SNS envelope ('Value') or of
+    the SQS record ('stringValue'), without the json quotes some publishers add."""
+    if not isinstance(attribute, dict):
+        return None
+    value = attribute.get('Value', attribute.get('stringValue'))
+    if isinstance(value, str) and len(value) > 1 and value[0] == value[-1] == '"':
+        return value[1:-1]
+    return value
+
+def not_create_notification(record: dict) -> bool:
+    """Cheap checks, made before any json is decoded, that a record cannot be a
+    file create notification: the notify_type value is not in the body at all, or
+    the record carries (raw message delivery) another notify_type attribute."""
+    if CREATE_NOTIFY_TYPE not in (record.get('body') or ''):
+        return True
+    return attribute_value((record.get('messageAttributes') or {}).get('notify_type')) not in (None, CREATE_NOTIFY_TYPE)
+
+def ledger_key(message_id: str, body: dict) -> str:
+    """Key of a notification in the ledger: the SNS MessageId, or for a message
+    sent to the queue directly its feed, partition values and partition_prefix."""
+    if message_id:
+        return f'msg#{message_id}'
+    return 'ptn#' + json.dumps([body.get('feed'), body.get('partition_value_list'),
+                                str(body.get('partition_prefix') or '').rstrip('/')])
+
+def claim(key: str) -> str:
+    """Claim a notification in the ledger.  Without a ledger, or when it cannot
+    be reached, the notification is processed as if it was claimed, without an
+    entry to settle."""
+    if ledger is None:
+        return None
     try:
+        return ledger.claim(key)
+    except Exception as e:
+        log.warning('Idempotency ledger claim failed, processing the record without it.', key=key, error=repr(e))
+        return None
+
+def ledger_map(function, items: list) -> list:
+    """Apply function to every item, concurrently when the items need a ledger
+    round trip each, and return the results in order."""
+    if ledger is None or IDEMPOTENCY_CONCURRENCY < 2 or len(items) < 2:
+        return [function(item) for item in items]
+    from concurrent.futures import ThreadPoolExecutor
 
-        log.info(f"Publish to SNS {json.dumps({ 'topic_arn': topic_arn, 'subject': subject, 'message': message, 'region': region})}")
+    with ThreadPoolExecutor(max_workers=min(IDEMPOTENCY_CONCURRENCY, len(items))) as executor:
+        return list(executor.map(function, items))
 
-        sns_client= boto3.client('sns', region_name=region)
-        
-        message_attrib = {}
-        for key in message.keys():
-            if isinstance(message.get(key), list):
-                string_value = ','.join(message.get(key))
+def settle(claims: list, unsent=()):
+    """Complete the claims of the records whose outcome was published and release
+    the claims of the others: the records returned to the queue and those whose
+    notification could not be sent (id() in unsent), which a redelivery notifies."""
+    def update(claim):
+        record, key = claim
+        try:
+            if id(record) in notified and id(record) not in unsent:
+                ledger.complete(key)
             else:
-                string_value = message.get(key)
-            message_attrib[key] = { 'DataType': 'String','StringValue': json.dumps(string_value)}
-
-        sns_client.publish(
-            TargetArn=topic_arn,
-            Subject=subject,
-            Message=json.dumps(message),
-            MessageAttributes=message_attrib
+                ledger.release(key)
+        except Exception as e:
+            log.warning('Idempotency ledger update failed.', key=key, message_id=record.get('messageId'), error=repr(e))
+
+    ledger_map(update, claims)
+
+def message_group(record: dict) -> str:
+    """Return the MessageGroupId of a record of a FIFO queue, None on a standard queue."""
+    return (record.get('attributes') or {}).get('MessageGroupId')
+
+def coalesce(items: list) -> list:
+    """Keep the first record of every (partition values, partition_prefix) of a
+    feed, the records coalesced into it follow its outcome.  With PARTITION_UPSERT
+    the key is the partition values alone and the last record wins: the partition
+    is registered at its partition_prefix, and the earlier records follow it."""
+    representatives = {}
+    for record, body in items:
+        key = json.dumps(body.get('partition_value_list'))
+        if not PARTITION_UPSERT:
+            key = (key, str(body.get('partition_prefix') or '').rstrip('/'))
+        if key not in representatives:
+            representatives[key] = (record, body)
+        elif PARTITION_UPSERT:
+            previous = representatives[key]
+            coalesced.setdefault(id(record), []).extend([previous] + followers(previous[0]))
+            representatives[key] = (record, body)
+        else:
+            coalesced.setdefault(id(representatives[key][0]), []).append((record, body))
+    return list(representatives.values())
+
+def followers(record: dict) -> list:
+    """Return (once) the (record, body) pairs coalesced into the record."""
+    return coalesced.pop(id(record), [])
+
+def notify_success(record: dict, body: dict):
+    for record, body in [(record, body)] + followers(record):
+        notified.add(id(record))
+        sns_body = body
+        sns_body['notify_type'] = 'dih_glue_add_ptn_success'
+
+        notifier.queue(SNS_TOPIC_ARN, 'DIH Glue Catalog Partition Refresh message', sns_body, record.get('awsRegion'),
+                       key=id(record))
+
+def notify_failure(record: dict, body: dict, reason: str):
+    """Fail a record that can never succeed without a retry: send the failure
+    notification the dead letter lambda would send and acknowledge the record."""
+    for record, body in [(record, body)] + followers(record):
+        notified.add(id(record))
+        log.error('Partition notification failed permanently.', feed=body.get('feed'),
+                  values=body.get('partition_value_list'), message_id=record.get('messageId'), reason=reason)
+        sns_body = body
+        sns_body['notify_type'] = 'dih_glue_add_ptn_failure'
+
+        notifier.queue(SNS_TOPIC_ARN, 'DIH Glue Catalog Partition Refresh message', sns_body, record.get('awsRegion'),
+                       key=id(record))
+
+def fingerprint(location: str, digest: str) -> tuple:
+    """Fingerprint of a partition: its location and the digest of its storage descriptor."""
+    return (str(location or '').rstrip('/'), digest)
+
+def invalid_partition(table: dict, body: dict) -> str:
+    """Return why the partition of a notification can never be registered in
+    the table, or None when it is valid."""
+    values = body.get('partition_value_list')
+    partition_keys = table.get('PartitionKeys') or []
+    if not isinstance(values, list) or not all(isinstance(value, str) and value for value in values):
+        return 'partition_value_list is not a list of non empty strings.'
+    if len(values) != len(partition_keys):
+        return f'Expected {len(partition_keys)} partition values, got {len(values)}.'
+    if not isinstance(body.get('partition_prefix'), str) or not body.get('partition_prefix'):
+        return 'partition_prefix is missing.'
+    return None
+
+def existing_partitions(database_name: str, table_name: str, values_list: list) -> dict:
+    """Return the partitions that already exist in the catalog by value tuple."""
+    existing = {}
+    for start in range(0, len(values_list), BATCH_GET_PARTITION_LIMIT):
+        batch_get_partition_response = glue_client().batch_get_partition(
+            DatabaseName=database_name,
+            TableName=table_name,
+            PartitionsToGet=[{'Values': list(values)} for values in values_list[start:start + BATCH_GET_PARTITION_LIMIT]]
         )
+        existing.update((tuple(partition['Values']), partition)
+                        for partition in batch_get_partition_response.get('Partitions', []))
+    return existing
+
+def known_partitions(database_name: str, table_name: str, items: list, digest: str = None) -> tuple:
+    """Acknowledge the records for partitions that are known to exist and return
+    the rest, as (unknown, stale).  The partition index is consulted first.
+    Without a storage descriptor digest that is all: batch_create_partition
+    reports the partitions that already exist (AlreadyExistsException), which
+    then fill the index, so a check ahead of it would only cost another request.
+
+    With a digest (upsert mode) a partition only counts as known when its
+    location and storage descriptor match the notification.  The unknown
+    partitions are then read with batch_get_partition, the existing ones that
+    differ are returned as stale."""
+    pending = []
+    for record, body in items:
+        expected = fingerprint(body.get('partition_prefix'), digest) if digest else None
+        if partition_index.contains(database_name, table_name, body.get('partition_value_list'), expected):
+            log.debug('Glue partition already registered.', feed=body.get('feed'), values=body.get('partition_value_list'))
+            notify_success(record, body)
+        else:
+            pending.append((record, body))
+
+    values_list = list(dict.fromkeys(tuple(body.get('partition_value_list')) for record, body in pending))
+    if not values_list or not digest:
+        return pending, []
 
+    try:
+        existing = existing_partitions(database_name, table_name, values_list)
     except Exception as e:
-        log.info('Publish to SNS Failed.')
-        log.error(e)
-        log.error(traceback.format_exc())
+        log.warning('Glue batch get partition failed, continuing without the pre-check.',
+                    database=database_name, table=table_name, error=repr(e))
+        return pending, []
 
-def handler(event, context):
+    unknown, stale = [], []
+    for record, body in pending:
+        partition = existing.get(tuple(body.get('partition_value_list')))
+        if partition is None:
+            unknown.append((record, body))
+            continue
+        if digest:
+            storage_descriptor = partition.get('StorageDescriptor') or {}
+            current = fingerprint(storage_descriptor.get('Location'), descriptor_digest(storage_descriptor))
+            if current != fingerprint(body.get('partition_prefix'), digest):
+                stale.append((record, body))
+                continue
+            partition_index.add(database_name, table_name, body.get('partition_value_list'), current)
+        else:
+            partition_index.add(database_name, table_name, body.get('partition_value_list'))
+        notify_success(record, body)
+    log.info('Glue partitions pre-checked.', database=database_name, table=table_name,
+             checked=len(values_list), present=len(pending) - len(unknown) - len(stale), stale=len(stale))
+    return unknown, stale
 
-    log.info(f'event: {event}')
+def update_partitions(database_name: str, table_name: str, template: PartitionTemplate, items: list) -> tuple:
+    """Update the stale partitions with batch_update_partition, in chunks of up
+    to 100 entries, and return (failed records, missing items).  Partitions
+    dropped since they were read are returned as missing, to be created."""
+    failed, missing = [], []
+    for chunk in partition_chunks(items, BATCH_UPDATE_PARTITION_LIMIT):
+        entries = [
+            {
+                'PartitionValueList': body.get('partition_value_list'),
+                'PartitionInput': template.partition_input(body.get('partition_value_list'), body.get('partition_prefix'))
+            }
+            for record, body in chunk
+        ]
+        request = lambda: {'DatabaseName': database_name, 'TableName': table_name, 'Entries': entries}
+        log.payload('Batch Update Partition API Call', request, database=database_name, table=table_name,
+                    partitions=len(entries))
+        try:
+            batch_update_partition_response = glue_client().batch_update_partition(
+                DatabaseName=database_name,
+                TableName=table_name,
+                Entries=entries
+            )
+        except Exception as e:
+            if error_code(e) in SCHEMA_ERROR_CODES:
+                table_cache.invalidate(database_name, table_name)
+            log.error('Glue batch partition update failed.', exc=e, payload=request,
+                      database=database_name, table=table_name)
+            failed.extend(record for record, body in chunk)
+            continue
 
-    for record in event.get('Records'):
-    
-        body = json.loads(record.get('body'))
-        log.info(f'body: {body}')
+        errors = {
+            tuple(error.get('PartitionValueList', [])): error.get('ErrorDetail', {})
+            for error in batch_update_partition_response.get('Errors', [])
+        }
+        log.info('Glue partitions updated.', database=database_name, table=table_name,
+                 partitions=len(entries), errors=len(errors))
 
-        if body.get('Type') == 'Notification':
-            body = json.loads(body.get('Message'))
+        for record, body in chunk:
+            error = errors.get(tuple(body.get('partition_value_list')))
+            if error and error.get('ErrorCode') == 'EntityNotFoundException':
+                missing.append((record, body))
+                continue
+            if error:
+                if error.get('ErrorCode') in SCHEMA_ERROR_CODES:
+                    table_cache.invalidate(database_name, table_name)
+                log.error('Glue partition update failed.', database=database_name, table=table_name,
+                          values=body.get('partition_value_list'), code=error.get('ErrorCode'),
+                          reason=error.get('ErrorMessage'), message_id=record.get('messageId'))
+                failed.append(record)
+                continue
 
-        if body.get('notify_type') != "dih_file_create_success":
-            return
+            partition_index.add(database_name, table_name, body.get('partition_value_list'),
+                                fingerprint(body.get('partition_prefix'), template.digest))
+            notify_success(record, body)
+    return failed, missing
 
+def acknowledge_projected(table: dict, items: list) -> list:
+    """Acknowledge the records of a table that uses partition projection without
+    any catalog write, records that do not match its template are failed."""
+    for record, body in items:
         try:
-            region = record.get('awsRegion')            
-            source_key = body.get('partition_prefix')
-            database_name, table_name = body.get('feed').split('#')
+            check_location(table, body.get('partition_value_list'), body.get('partition_prefix'))
+        except ProjectionMismatch as e:
+            notify_failure(record, body, str(e))
+            continue
 
-            log.info(f'Database: {database_name} Table: {table_name}')
+        log.debug('Glue partition covered by partition projection.', feed=body.get('feed'))
+        notify_success(record, body)
+    return []
 
-            log.info('Getting Table Details.')
-            get_table_response = glue_client.get_table(
-                DatabaseName=database_name,
-                Name=table_name
-            )
+def register_partitions(database_name: str, table_name: str, items: list, final: bool = False) -> list:
+    """Create the partitions for one table and return the failed records.
+
+    Records rejected with a permanent error code are tried once more (final)
+    against a fresh table definition, one partition per request, so a stale
+    cached definition or a single bad partition in a request does not fail the
+    others.  Permanent errors in the final attempt are failed without retry."""
+    failed = []
+    retry = []
+
+    try:
+        table = table_cache.get_table(database_name, table_name)
+    except Exception as e:
+        if error_code(e) == 'EntityNotFoundException':
+            for record, body in items:
+                notify_failure(record, body, f'Table {database_name}.{table_name} does not exist.')
+            return failed
+        log.error('Glue get table failed.', exc=e, database=database_name, table=table_name)
+        return [record for record, body in items]
+
+    valid = []
+    for record, body in items:
+        reason = invalid_partition(table, body)
+        if reason:
+            notify_failure(record, body, reason)
+        else:
+            valid.append((record, body))
+    items = valid
 
-            storage_descriptor = get_table_response['Table']['StorageDescriptor']
+    if is_projected(table):
+        return acknowledge_projected(table, items)
 
-            custom_storage_descriptor = copy.deepcopy(storage_descriptor)
-            custom_storage_descriptor['Location'] = source_key
+    # Built once per table, the partition inputs share the table's descriptor.
+    template = PartitionTemplate(table['StorageDescriptor'])
+    digest = template.digest if PARTITION_UPSERT else None
 
-            log.info(f'custom_storage_descriptor {custom_storage_descriptor}') 
+    items, stale = known_partitions(database_name, table_name, items, digest)
+    if stale:
+        update_failed, missing = update_partitions(database_name, table_name, template, stale)
+        failed.extend(update_failed)
+        items.extend(missing)
+    if not items:
+        return failed
+
+    for chunk in partition_chunks(items, 1 if final else BATCH_CREATE_PARTITION_LIMIT):
+        partition_input_list = template.partition_inputs(
+            (body.get('partition_value_list'), body.get('partition_prefix')) for record, body in chunk
+        )
 
-            log.info(f"Create Partition API Call {json.dumps({ 'DatabaseName': database_name, 'TableName': table_name, 'PartitionKeys': body.get('partition_key'), 'PartitionInput': {'Values': body.get('partition_value_list'),'StorageDescriptor': custom_storage_descriptor}})}")
-            create_partition_response = glue_client.create_partition(
+        request = lambda: {'DatabaseName': database_name, 'TableName': table_name, 'PartitionInputList': partition_input_list}
+        log.payload('Batch Create Partition API Call', request, database=database_name, table=table_name,
+                    partitions=len(partition_input_list))
+        try:
+            batch_create_partition_response = glue_client().batch_create_partition(
                 DatabaseName=database_name,
                 TableName=table_name,
-                PartitionInput={
-                    'Values': body.get('partition_value_list'),
-                    'StorageDescriptor': custom_storage_descriptor
-                }
+                PartitionInputList=partition_input_list
             )
-            log.info(create_partition_response)
-            log.info('Glue partition created successfully.') 
-            sns_body = body
-            sns_body['notify_type'] = 'dih_glue_add_ptn_success'
-            
-            sns_publish(SNS_TOPIC_ARN, 'DIH Glue Catalog Partition Refresh message', sns_body, region)
+        except Exception as e:
+            if error_code(e) in SCHEMA_ERROR_CODES:
+                table_cache.invalidate(database_name, table_name)
+            if error_code(e) in PERMANENT_ERROR_CODES:
+                if final:
+                    for record, body in chunk:
+                        notify_failure(record, body, f'{error_code(e)}: {e}')
+                else:
+                    retry.extend(chunk)
+                continue
+            log.error('Glue batch partition creation failed.', exc=e, payload=request,
+                      database=database_name, table=table_name)
+            failed.extend(record for record, body in chunk)
+            continue
+
+        errors = {
+            tuple(error.get('PartitionValues', [])): error.get('ErrorDetail', {})
+            for error in batch_create_partition_response.get('Errors', [])
+        }
+        log.info('Glue partitions registered.', database=database_name, table=table_name,
+                 partitions=len(partition_input_list), errors=len(errors))
+
+        for record, body in chunk:
+            error = errors.get(tuple(body.get('partition_value_list')))
+            if error and error.get('ErrorCode') != 'AlreadyExistsException':
+                if error.get('ErrorCode') in SCHEMA_ERROR_CODES:
+                    table_cache.invalidate(database_name, table_name)
+                if error.get('ErrorCode') in PERMANENT_ERROR_CODES:
+                    if final:
+                        notify_failure(record, body, f"{error.get('ErrorCode')}: {error.get('ErrorMessage')}")
+                    else:
+                        retry.append((record, body))
+                    continue
+                log.error('Glue partition creation failed.', database=database_name, table=table_name,
+                          values=body.get('partition_value_list'), code=error.get('ErrorCode'),
+                          reason=error.get('ErrorMessage'), message_id=record.get('messageId'))
+                failed.append(record)
+                continue
+
+            partition_index.add(database_name, table_name, body.get('partition_value_list'),
+                                fingerprint(body.get('partition_prefix'), digest) if digest and not error else None)
+            notify_success(record, body)
+
+    if retry:
+        log.warning('Glue rejected partitions, trying them once more.', database=database_name,
+                    table=table_name, records=len(retry))
+        failed.extend(register_partitions(database_name, table_name, retry, final=True))
+
+    return failed
+
+def process_feed(feed: str, items: list) -> list:
+    """Register the records of one feed in order and return the failed records."""
+    database_name, _, table_name = (feed if isinstance(feed, str) else '').partition('#')
+    if not database_name or not table_name or '#' in table_name:
+        for record, body in items:
+            notify_failure(record, body, f'Invalid feed {feed}, expected <DATABASE_NAME>#<TABLE_NAME>.')
+        return []
+
+    log.debug('Registering partitions.', database=database_name, table=table_name, records=len(items))
+    return register_partitions(database_name, table_name, coalesce(items))
+
+def process_ordered(items: list) -> list:
+    """Register the records of a FIFO message group one at a time, in order, and
+    return the failed records.  At the first failure the rest of the group is
+    returned to the queue unprocessed, nothing is written or notified ahead of it."""
+    for position, (record, body) in enumerate(items):
+        failed = process_feed(body.get('feed'), [(record, body)])
+        if failed:
+            return failed + [record for record, body in items[position + 1:]]
+    return []
+
+def process_batch(key, items: list) -> list:
+    """Process the records of a feed, or of a FIFO message group (a tuple key)."""
+    if isinstance(key, tuple):
+        return process_ordered(items)
+    return process_feed(key, items)
+
+def handler(event, context):
+
+    log.payload('Received event.', lambda: event, records=len(event.get('Records')))
+
+    feeds = {}
+    failed = []
+    blocked = set()
+    claims = []
+    pending = []
+    skipped = 0
+    duplicates = 0
+
+    for record in event.get('Records'):
+        if not_create_notification(record):
+            skipped += 1
+            continue
+
+        try:
+            body = json.loads(record.get('body'))
+            message_id = None
+
+            if body.get('Type') == 'Notification':
+                if attribute_value((body.get('MessageAttributes') or {}).get('notify_type')) not in (None, CREATE_NOTIFY_TYPE):
+                    skipped += 1
+                    continue
+                message_id = body.get('MessageId')
+                body = json.loads(body.get('Message'))
+
+            if not isinstance(body, dict):
+                raise ValueError('The notification is not a json object.')
 
         except Exception as e:
+            # Without a body there is nothing to send a failure notification for.
+            # The record is returned to the queue, its redrive policy moves it to
+            # the dead letter queue once the retries are exhausted.
+            log.error('Unable to read message body, record returned to the queue.', exc=e,
+                      message_id=record.get('messageId'), payload=lambda: record.get('body'))
+            pending.append((record, None, None))
+            continue
 
-            if type(e).__name__ == 'AlreadyExistsException':
-                log.info('Glue partition already present.')
-                sns_body = body
-                sns_body['notify_type'] = 'dih_glue_add_ptn_success'
-            
-                sns_publish(SNS_TOPIC_ARN, 'DIH Glue Catalog Partition Refresh message', sns_body, region)
+        if body.get('notify_type') != CREATE_NOTIFY_TYPE:
+            skipped += 1
+            continue
 
-            else:
-                log.info('Glue partition creation failed.')
-                log.error(e)
-                log.error(traceback.format_exc())
-                raise e
+        pending.append((record, body, ledger_key(message_id, body)))
+
+    # The notifications of the batch are claimed concurrently, then handled in
+    # the order of the batch.
+    statuses = iter(ledger_map(claim, [key for record, body, key in pending if body is not None]))
+
+    for record, body, key in pending:
+        group = message_group(record)
+        if body is None:
+            # An unreadable record stops its FIFO group like any other failure.
+            failed.append(record)
+            if group is not None:
+                blocked.add(group)
+            continue
+
+        status = next(statuses)
+        if group is not None and group in blocked:
+            if status == CLAIMED:
+                # Released again with the other claims of the invocation.
+                claims.append((record, key))
+            failed.append(record)
+            continue
+
+        if status == COMPLETED:
+            log.debug('Notification already handled.', key=key, message_id=record.get('messageId'))
+            duplicates += 1
+            continue
+        if status == CLAIMED:
+            claims.append((record, key))
+        elif status is not None:
+            # Another invocation is handling the notification, this copy is
+            # retried once that one is done (or its lease has passed).
+            log.info('Notification in progress elsewhere, returned to the queue.', key=key,
+                     message_id=record.get('messageId'))
+            failed.append(record)
+            if group is not None:
+                blocked.add(group)
+            continue
+
+        # The records of a FIFO message group are kept together and in order.
+        feeds.setdefault(('group', group) if group is not None else body.get('feed'), []).append((record, body))
+
+    try:
+        if MAX_TABLE_CONCURRENCY > 1 and len(feeds) > 1:
+            # Tables are independent, so they are registered concurrently while
+            # the records of each table stay in order within a single worker.
+            from concurrent.futures import ThreadPoolExecutor
+
+            with ThreadPoolExecutor(max_workers=min(MAX_TABLE_CONCURRENCY, len(feeds))) as executor:
+                for feed_failed in executor.map(process_batch, feeds.keys(), feeds.values()):
+                    failed.extend(feed_failed)
+        else:
+            for feed, items in feeds.items():
+                failed.extend(process_batch(feed, items))
+
+        # The records coalesced into a failed record are retried with it.
+        failed = [r for record in failed for r in [record] + [f for f, body in followers(record)]]
+    finally:
+        unsent = set(notifier.flush())
+        followed = len(coalesced)
+        coalesced.clear()
+        settle(claims, unsent)
+        notified.clear()
+
+    # The records whose notification could not be sent are returned to the queue
+    # with their claims released, so a redelivery publishes their outcome.
+    if unsent:
+        returned = {id(record) for record in failed}
+        failed.extend(record for record in event.get('Records') if id(record) in unsent and id(record) not in returned)
+
+    log.info('Records processed.', records=len(event.get('Records')), skipped=skipped, duplicates=duplicates,
+             feeds=len(feeds), failed=len(failed), unsent=len(unsent), table_cache=table_cache.stats, partition_index=partition_index.stats,
+             glue_limiter=glue_limiter.stats)
+    if followed:
+        log.warning('Coalesced records left without an outcome.', records=followed)
+
+    return {
+        'batchItemFailures': [{'itemIdentifier': record.get('messageId')} for record in failed]
+    }
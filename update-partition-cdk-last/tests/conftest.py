@@ -0,0 +1,38 @@
+import importlib.util
+import os
+import sys
+
+import pytest
+
+# The lambda sources are deployed as separate assets rather than as a package,
+# so make their directories importable for the unit tests.
+LAMBDA_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'lambda')
+
+for path in ('update-partition', os.path.join('common', 'python')):
+    sys.path.insert(0, os.path.join(LAMBDA_DIR, path))
+
+
+def load_lambda(name):
+    """Import a handler module from its (hyphenated) source file."""
+    path = os.path.join(LAMBDA_DIR, name, f'{name}.py')
+    spec = importlib.util.spec_from_file_location(name.replace('-', '_'), path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+@pytest.fixture
+def clients():
+    import aws_clients
+    from tests.fakes import FakeGlue, FakeSns
+
+    glue, sns = FakeGlue(), FakeSns()
+    aws_clients.register_client('glue', glue)
+    aws_clients.register_client('sns', sns, 'eu-west-2')
+    yield glue, sns
+    aws_clients.reset()
+
+
+@pytest.fixture
+def update_partition(clients):
+    return load_lambda('update-partition')
@@ -0,0 +1,149 @@
+"""
+In-process stand-ins for the Glue and SNS clients used by the lambda handlers.
+They implement only the calls the handlers make and record every request.
+"""
+
+import json
+from types import SimpleNamespace
+
+
+class FakeGlue:
+
+    # The API operations, as botocore lists them in client.meta.
+    meta = SimpleNamespace(method_to_api_mapping={
+        'get_table': 'GetTable',
+        'batch_get_partition': 'BatchGetPartition',
+        'get_partitions': 'GetPartitions',
+        'batch_create_partition': 'BatchCreatePartition',
+        'batch_update_partition': 'BatchUpdatePartition',
+    })
+
+    def __init__(self, tables=None, partition_keys=('dw_bus_dt',)):
+        self.tables = tables or {}
+        self.partition_keys = partition_keys
+        self.partitions = {}
+        self.calls = []
+
+    def add_table(self, database_name, table_name, columns=10, location='s3://bucket/prefix'):
+        self.tables[(database_name, table_name)] = {
+            'Name': table_name,
+            'DatabaseName': database_name,
+            'VersionId': '1',
+            'PartitionKeys': [{'Name': key, 'Type': 'string'} for key in self.partition_keys],
+            'Parameters': {},
+            'StorageDescriptor': {
+                'Columns': [{'Name': f'col_{n}', 'Type': 'string'} for n in range(columns)],
+                'Location': f'{location}/{database_name}/{table_name}',
+                'InputFormat': 'org.apache.hadoop.hive.ql.io.parquet.MapredParquetInputFormat',
+                'OutputFormat': 'org.apache.hadoop.hive.ql.io.parquet.MapredParquetOutputFormat',
+                'SerdeInfo': {'SerializationLibrary': 'org.apache.hadoop.hive.ql.io.parquet.serde.ParquetHiveSerDe'},
+                'Parameters': {'classification': 'parquet'},
+            },
+        }
+
+    def _table(self, database_name, table_name):
+        table = self.tables.get((database_name, table_name))
+        if table is None:
+            raise EntityNotFoundException(f'Table {table_name} not found.')
+        return table
+
+    def get_table(self, DatabaseName, Name):
+        self.calls.append(('get_table', DatabaseName, Name))
+        return {'Table': self._table(DatabaseName, Name)}
+
+    def batch_get_partition(self, DatabaseName, TableName, PartitionsToGet):
+        self.calls.append(('batch_get_partition', DatabaseName, TableName, len(PartitionsToGet)))
+        self._table(DatabaseName, TableName)
+        found = [self.partitions[(DatabaseName, TableName, tuple(p['Values']))] for p in PartitionsToGet
+                 if (DatabaseName, TableName, tuple(p['Values'])) in self.partitions]
+        return {'Partitions': found, 'UnprocessedKeys': []}
+
+    def get_partitions(self, DatabaseName, TableName, ExcludeColumnSchema=False, NextToken=None, MaxResults=2):
+        self.calls.append(('get_partitions', DatabaseName, TableName))
+        self._table(DatabaseName, TableName)
+        partitions = [p for key, p in sorted(self.partitions.items()) if key[:2] == (DatabaseName, TableName)]
+        start = int(NextToken or 0)
+        response = {'Partitions': partitions[start:start + MaxResults]}
+        if start + MaxResults < len(partitions):
+            response['NextToken'] = str(start + MaxResults)
+        return response
+
+    def batch_create_partition(self, DatabaseName, TableName, PartitionInputList):
+        self.calls.append(('batch_create_partition', DatabaseName, TableName, len(PartitionInputList)))
+        self._table(DatabaseName, TableName)
+        # Round trip through json like botocore does when it serializes the request.
+        PartitionInputList = json.loads(json.dumps(PartitionInputList))
+        errors = []
+        for partition_input in PartitionInputList:
+            key = (DatabaseName, TableName, tuple(partition_input['Values']))
+            if key in self.partitions:
+                errors.append({'PartitionValues': partition_input['Values'],
+                               'ErrorDetail': {'ErrorCode': 'AlreadyExistsException', 'ErrorMessage': 'Partition already exists.'}})
+            else:
+                self.partitions[key] = dict(partition_input, DatabaseName=DatabaseName, TableName=TableName)
+        return {'Errors': errors}
+
+    def batch_update_partition(self, DatabaseName, TableName, Entries):
+        self.calls.append(('batch_update_partition', DatabaseName, TableName, len(Entries)))
+        self._table(DatabaseName, TableName)
+        Entries = json.loads(json.dumps(Entries))
+        errors = []
+        for entry in Entries:
+            key = (DatabaseName, TableName, tuple(entry['PartitionValueList']))
+            if key not in self.partitions:
+                errors.append({'PartitionValueList': entry['PartitionValueList'],
+                               'ErrorDetail': {'ErrorCode': 'EntityNotFoundException', 'ErrorMessage': 'Partition not found.'}})
+            else:
+                self.partitions[key] = dict(entry['PartitionInput'], DatabaseName=DatabaseName, TableName=TableName)
+        return {'Errors': errors}
+
+    def count(self, operation):
+        return len([call for call in self.calls if call[0] == operation])
+
+
+class FakeSns:
+
+    def __init__(self):
+        self.messages = []
+        self.entries = []
+        self.calls = []
+
+    def publish_batch(self, TopicArn, PublishBatchRequestEntries):
+        self.calls.append(('publish_batch', len(PublishBatchRequestEntries)))
+        self.entries.extend(PublishBatchRequestEntries)
+        self.messages.extend(json.loads(entry['Message']) for entry in PublishBatchRequestEntries)
+        return {'Successful': [{'Id': entry['Id']} for entry in PublishBatchRequestEntries], 'Failed': []}
+
+    def publish(self, TargetArn, Subject, Message, MessageAttributes):
+        self.calls.append(('publish', 1))
+        self.messages.append(json.loads(Message))
+        return {'MessageId': '1'}
+
+
+class EntityNotFoundException(Exception):
+    pass
+
+
+def dih_record(feed, partition_value, message_id=None, region='eu-west-2', notify_type='dih_file_create_success', sns_envelope=True):
+    """Build an SQS record carrying a DIH notification, wrapped in an SNS envelope
+    by default as it is when delivered through the topic subscription."""
+    database_name, table_name = feed.split('#') if '#' in feed else (feed, feed)
+    body = {
+        'notify_type': notify_type,
+        'feed': feed,
+        'publish_ts': '20211118 11:06:40',
+        'partition_value_list': [partition_value],
+        'rec_count': '1956678',
+        'success_flg': 'Y',
+        'partition_key': ['dw_bus_dt'],
+        'partition_prefix': f's3://bucket/prefix/{database_name}/{table_name}/dw_bus_dt={partition_value}',
+    }
+    if sns_envelope:
+        body = {'Type': 'Notification', 'MessageId': message_id or f'{feed}-{partition_value}', 'Message': json.dumps(body),
+                'MessageAttributes': {'notify_type': {'Type': 'String', 'Value': notify_type}}}
+    return {
+        'messageId': message_id or f'{feed}-{partition_value}',
+        'body': json.dumps(body),
+        'awsRegion': region,
+        'attributes': {},
+    }
@@ -0,0 +1,30 @@
+import aws_clients
+
+
+def test_endpoint_url_accepts_plain_and_dns_entry_forms(monkeypatch):
+    monkeypatch.setenv('AWS_REGION', 'eu-west-2')
+    monkeypatch.setenv('GLUE_ENDPOINT_DNS', 'vpce-0123-abcd.glue.eu-west-2.vpce.amazonaws.com')
+    assert aws_clients.endpoint_url('glue') == 'https://vpce-0123-abcd.glue.eu-west-2.vpce.amazonaws.com'
+
+    monkeypatch.setenv('GLUE_ENDPOINT_DNS', 'Z7HUB22UULQXV:vpce-0123-abcd.glue.eu-west-2.vpce.amazonaws.com')
+    assert aws_clients.endpoint_url('glue', 'eu-west-2') == 'https://vpce-0123-abcd.glue.eu-west-2.vpce.amazonaws.com'
+    assert aws_clients.endpoint_url('glue', 'eu-west-1') is None
+    assert aws_clients.endpoint_url('sns') is None
+
+
+def test_registered_clients_are_reused():
+    client = object()
+    aws_clients.register_client('glue', client)
+    try:
+        assert aws_clients.get_client('glue') is client
+    finally:
+        aws_clients.reset()
+
+
+def test_retry_settings_can_be_set_per_service(monkeypatch):
+    monkeypatch.setenv('AWS_CLIENT_MAX_ATTEMPTS', '5')
+    monkeypatch.setenv('GLUE_CLIENT_MAX_ATTEMPTS', '1')
+
+    assert aws_clients.retry_setting('glue', 'MAX_ATTEMPTS', '3') == '1'
+    assert aws_clients.retry_setting('sns', 'MAX_ATTEMPTS', '3') == '5'
+    assert aws_clients.retry_setting(None, 'RETRY_MODE', 'adaptive') == 'adaptive'
@@ -0,0 +1,39 @@
+import json
+
+from backfill import Checkpoint, backfill, partitions_from_keys
+from tests.fakes import FakeGlue
+
+
+def test_partitions_are_parsed_from_key_value_segments():
+    keys = ['region=eu/dw_bus_dt=2021-09-13/part-0.parquet', 'region=eu/dw_bus_dt=2021-09-13/part-1.parquet',
+            'dw_bus_dt=2021-09-14/part-0.parquet', '_SUCCESS']
+    partition_keys = [{'Name': 'dw_bus_dt'}, {'Name': 'region'}]
+
+    assert partitions_from_keys(keys, partition_keys) == {('2021-09-13', 'eu'): 'region=eu/dw_bus_dt=2021-09-13'}
+
+
+def test_backfill_registers_missing_partitions_and_resumes(tmp_path):
+    source = tmp_path / 'source'
+    for day in range(1, 251):
+        partition = source / f'dw_bus_dt=2021-{1 + day // 28:02}-{1 + day % 28:02}'
+        partition.mkdir(parents=True, exist_ok=True)
+        (partition / 'part-0.parquet').write_text('')
+    glue = FakeGlue()
+    glue.add_table('db', 'tbl', location='s3://bucket/sdw')
+    glue.partitions[('db', 'tbl', ('2021-01-02',))] = {'Values': ['2021-01-02']}
+    checkpoint_path = tmp_path / 'checkpoint.json'
+
+    summary = backfill(glue, 'db', 'tbl', source=str(source), checkpoint=Checkpoint(str(checkpoint_path)), workers=3)
+
+    assert summary['listed'] == 250
+    assert summary['existing'] == 1
+    assert summary['created'] == 249
+    assert summary['failed'] == []
+    assert glue.count('batch_create_partition') == 3
+    assert glue.partitions[('db', 'tbl', ('2021-01-03',))]['StorageDescriptor']['Location'] == 's3://bucket/sdw/db/tbl/dw_bus_dt=2021-01-03'
+    assert len(json.loads(checkpoint_path.read_text())['registered']) == 249
+
+    glue.partitions.clear()
+    resumed = backfill(glue, 'db', 'tbl', source=str(source), checkpoint=Checkpoint(str(checkpoint_path)))
+
+    assert resumed['checkpointed'] == 250 - 1 and resumed['missing'] == 1
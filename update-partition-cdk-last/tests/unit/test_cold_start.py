@@ -0,0 +1,11 @@
+import pytest
+
+from benchmarks.cold_start import HANDLERS, sample
+
+
+@pytest.mark.parametrize('handler', sorted(HANDLERS))
+def test_handler_import_does_not_load_the_aws_sdk(handler):
+    result = sample(handler, '')
+
+    assert not result['boto3']
+    assert not result['botocore']
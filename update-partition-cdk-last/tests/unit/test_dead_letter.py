@@ -0,0 +1,17 @@
+from tests.conftest import load_lambda
+from tests.fakes import dih_record
+
+
+def test_failure_notifications_keep_the_feed_of_the_enveloped_message(clients, monkeypatch):
+    glue, sns = clients
+    dead_letter = load_lambda('dead-letter')
+    monkeypatch.setattr(dead_letter, 'SNS_TOPIC_ARN', 'arn:aws:sns:eu-west-2:123456789012:dih.fifo')
+    records = [dih_record('db#a', '2021-09-01'), dih_record('db#b', '2021-09-01'),
+               dih_record('db#a', '2021-09-02', sns_envelope=False)]
+
+    dead_letter.handler({'Records': records}, None)
+
+    assert [message['feed'] for message in sns.messages] == ['db#a', 'db#b', 'db#a']
+    assert {message['notify_type'] for message in sns.messages} == {'dih_glue_add_ptn_failure'}
+    assert [entry['MessageGroupId'] for entry in sns.entries] == ['db#a', 'db#b', 'db#a']
+    assert len({entry['MessageDeduplicationId'] for entry in sns.entries}) == 3
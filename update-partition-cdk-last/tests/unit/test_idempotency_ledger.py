@@ -0,0 +1,73 @@
+import pytest
+
+from idempotency_ledger import (CLAIMED, COMPLETED, IN_PROGRESS, DynamoDbBackend, IdempotencyLedger, MemoryBackend,
+                                SqliteBackend)
+
+
+class ConditionalCheckFailedException(Exception):
+
+    def __init__(self):
+        super().__init__('The conditional request failed')
+        self.response = {'Error': {'Code': 'ConditionalCheckFailedException'}}
+
+
+class FakeDynamoDb:
+    """Evaluates only the condition the ledger sends."""
+
+    def __init__(self):
+        self.items = {}
+
+    def put_item(self, TableName, Item, ConditionExpression=None, ExpressionAttributeValues=None):
+        current = self.items.get(Item['pk']['S'])
+        if ConditionExpression and current is not None and \
+                int(current['expires_at']['N']) >= int(ExpressionAttributeValues[':now']['N']):
+            raise ConditionalCheckFailedException()
+        self.items[Item['pk']['S']] = Item
+        return {}
+
+    def get_item(self, TableName, Key, ConsistentRead=False):
+        item = self.items.get(Key['pk']['S'])
+        return {'Item': item} if item else {}
+
+    def delete_item(self, TableName, Key):
+        self.items.pop(Key['pk']['S'], None)
+        return {}
+
+
+@pytest.fixture(params=['memory', 'sqlite', 'dynamodb'])
+def backend(request):
+    if request.param == 'memory':
+        return MemoryBackend()
+    if request.param == 'sqlite':
+        return SqliteBackend()
+    dynamodb = FakeDynamoDb()
+    return DynamoDbBackend('ledger', lambda: dynamodb)
+
+
+def test_a_key_is_claimed_once_until_it_is_released(backend):
+    ledger = IdempotencyLedger(backend)
+
+    assert ledger.claim('msg#1') == CLAIMED
+    assert ledger.claim('msg#1') == IN_PROGRESS
+
+    ledger.release('msg#1')
+    assert ledger.claim('msg#1') == CLAIMED
+
+
+def test_a_completed_key_is_a_duplicate_until_it_expires(backend):
+    ledger = IdempotencyLedger(backend)
+    ledger.claim('msg#1')
+    ledger.complete('msg#1')
+
+    assert ledger.claim('msg#1') == COMPLETED
+
+    ledger.ttl_seconds = -10
+    ledger.complete('msg#1')
+    assert ledger.claim('msg#1') == CLAIMED
+
+
+def test_an_expired_lease_can_be_claimed_again(backend):
+    ledger = IdempotencyLedger(backend, lease_seconds=-10)
+
+    assert ledger.claim('msg#1') == CLAIMED
+    assert ledger.claim('msg#1') == CLAIMED
@@ -0,0 +1,51 @@
+import pytest
+
+from partition_projection import ProjectionMismatch, check_location, enable_projection, projection_parameters
+from tests.fakes import FakeGlue, dih_record
+
+
+def table(partition_keys=({'Name': 'dw_bus_dt', 'Type': 'string'},)):
+    return {
+        'Name': 'tbl',
+        'PartitionKeys': list(partition_keys),
+        'Parameters': {},
+        'StorageDescriptor': {'Location': 's3://bucket/sdw/db/tbl/'},
+    }
+
+
+def test_projection_parameters_are_derived_from_the_table():
+    parameters = projection_parameters(table([{'Name': 'dw_bus_dt', 'Type': 'string'}, {'Name': 'region', 'Type': 'string'}]))
+
+    assert parameters['projection.enabled'] == 'true'
+    assert parameters['projection.dw_bus_dt.type'] == 'date'
+    assert parameters['projection.dw_bus_dt.format'] == 'yyyy-MM-dd'
+    assert parameters['projection.region.type'] == 'injected'
+    assert parameters['storage.location.template'] == 's3://bucket/sdw/db/tbl/dw_bus_dt=${dw_bus_dt}/region=${region}'
+
+
+def test_check_location_flags_mismatches():
+    projected = table()
+    projected['Parameters'] = projection_parameters(projected)
+
+    check_location(projected, ['2021-09-13'], 's3://bucket/sdw/db/tbl/dw_bus_dt=2021-09-13/')
+    with pytest.raises(ProjectionMismatch):
+        check_location(projected, ['2021-09-13'], 's3://bucket/elsewhere/dw_bus_dt=2021-09-13')
+    with pytest.raises(ProjectionMismatch):
+        check_location(projected, ['2021-09-13', 'x'], 's3://bucket/sdw/db/tbl/dw_bus_dt=2021-09-13')
+
+
+def test_projected_tables_are_acknowledged_without_catalog_writes(clients, update_partition):
+    glue, sns = clients
+    glue.add_table('db', 'a', location='s3://bucket/prefix')
+    glue.update_table = lambda DatabaseName, TableInput: glue.tables[(DatabaseName, TableInput['Name'])].update(TableInput)
+    enable_projection(glue, 'db', 'a')
+    matching = dih_record('db#a', '2021-09-01')
+    mismatch = dih_record('db#a', '2021-09-02')
+    mismatch['body'] = mismatch['body'].replace('dw_bus_dt=2021-09-02', 'dt=2021-09-02')
+
+    response = update_partition.handler({'Records': [matching, mismatch]}, None)
+
+    assert response == {'batchItemFailures': []}
+    assert glue.count('batch_create_partition') == 0
+    assert glue.count('batch_get_partition') == 0
+    assert [message['notify_type'] for message in sns.messages] == ['dih_glue_add_ptn_success', 'dih_glue_add_ptn_failure']
@@ -0,0 +1,45 @@
+import json
+
+from partition_template import PartitionTemplate, descriptor_digest
+
+
+def storage_descriptor(columns=400):
+    return {
+        'Columns': [{'Name': f'col_{n}', 'Type': 'string'} for n in range(columns)],
+        'Location': 's3://bucket/prefix',
+        'InputFormat': 'org.apache.hadoop.hive.ql.io.parquet.MapredParquetInputFormat',
+        'SerdeInfo': {'SerializationLibrary': 'org.apache.hadoop.hive.ql.io.parquet.serde.ParquetHiveSerDe',
+                      'Parameters': {'serialization.format': '1'}},
+        'Parameters': {'classification': 'parquet'},
+    }
+
+
+def test_partition_inputs_share_the_table_descriptor():
+    table_descriptor = storage_descriptor()
+    template = PartitionTemplate(table_descriptor)
+
+    first, second = template.partition_inputs([(['2021-09-01'], 's3://bucket/prefix/dt=2021-09-01'),
+                                               (['2021-09-02'], 's3://bucket/prefix/dt=2021-09-02')])
+
+    assert first['Values'] == ['2021-09-01']
+    assert first['StorageDescriptor']['Location'] == 's3://bucket/prefix/dt=2021-09-01'
+    assert second['StorageDescriptor']['Location'] == 's3://bucket/prefix/dt=2021-09-02'
+    assert first['StorageDescriptor']['Columns'] is table_descriptor['Columns']
+    assert first['StorageDescriptor']['SerdeInfo'] is second['StorageDescriptor']['SerdeInfo']
+    assert table_descriptor['Location'] == 's3://bucket/prefix'
+
+
+def test_partition_inputs_serialize_like_a_deep_copy():
+    table_descriptor = storage_descriptor(columns=3)
+    partition_input = PartitionTemplate(table_descriptor).partition_input(['2021-09-01'], 's3://bucket/other')
+
+    expected = json.loads(json.dumps(table_descriptor))
+    expected['Location'] = 's3://bucket/other'
+    assert json.loads(json.dumps(partition_input)) == {'Values': ['2021-09-01'], 'StorageDescriptor': expected}
+
+
+def test_digest_ignores_the_location():
+    template = PartitionTemplate(storage_descriptor())
+
+    assert template.digest == descriptor_digest(template.storage_descriptor('s3://bucket/other'))
+    assert template.digest != descriptor_digest(storage_descriptor(columns=399))
@@ -0,0 +1,79 @@
+from types import SimpleNamespace
+
+import pytest
+
+from rate_limiter import AdaptiveRateLimiter
+
+
+class ThrottlingException(Exception):
+    pass
+
+
+def client(**methods):
+    """A client whose methods other than get_paginator are API operations."""
+    operations = {name: name for name in methods if name != 'get_paginator'}
+    return SimpleNamespace(meta=SimpleNamespace(method_to_api_mapping=operations), **methods)
+
+
+def test_throttled_calls_slow_down_and_are_retried(monkeypatch):
+    monkeypatch.setattr('time.sleep', lambda seconds: None)
+    limiter = AdaptiveRateLimiter(max_rate=16, min_rate=1)
+    outcomes = [ThrottlingException('Rate exceeded'), ThrottlingException('Rate exceeded'), 'ok']
+
+    def flaky():
+        outcome = outcomes.pop(0)
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome
+
+    assert limiter.call(flaky) == 'ok'
+    assert limiter.rate == 4.5
+    assert limiter.stats()['throttled'] == 2
+
+
+def test_calls_throttled_on_every_attempt_are_raised(monkeypatch):
+    monkeypatch.setattr('time.sleep', lambda seconds: None)
+    limiter = AdaptiveRateLimiter(max_rate=4, min_rate=1, attempts=3)
+
+    def throttled():
+        raise ThrottlingException('Rate exceeded')
+
+    with pytest.raises(ThrottlingException):
+        limiter.call(throttled)
+    assert limiter.rate == 1
+
+
+def test_other_errors_are_raised_without_retry():
+    limiter = AdaptiveRateLimiter()
+    calls = []
+
+    def invalid():
+        calls.append(1)
+        raise ValueError('Invalid input.')
+
+    with pytest.raises(ValueError):
+        limiter.client(client(get_table=invalid)).get_table()
+    assert calls == [1]
+    assert limiter.rate == limiter.max_rate
+
+
+def test_only_the_api_operations_take_a_token():
+    limiter = AdaptiveRateLimiter()
+    limited = limiter.client(client(get_table=lambda: 'table', get_paginator=lambda name: 'paginator'))
+
+    assert limited.get_paginator('get_partitions') == 'paginator'
+    assert limiter.stats()['calls'] == 0
+    assert limited.get_table() == 'table'
+    assert limiter.stats()['calls'] == 1
+
+
+def test_bucket_waits_once_the_burst_is_spent(monkeypatch):
+    waits = []
+    monkeypatch.setattr('time.sleep', waits.append)
+    limiter = AdaptiveRateLimiter(max_rate=10, burst=2)
+
+    for _ in range(4):
+        limiter.acquire()
+
+    assert len(waits) == 2
+    assert waits[-1] == pytest.approx(0.2, abs=0.01)
@@ -0,0 +1,71 @@
+from sns_notifier import SnsNotifier
+
+
+class FakeSns:
+
+    def __init__(self, fail_ids=(), down=False):
+        self.fail_ids = set(fail_ids)
+        self.down = down
+        self.batches = []
+        self.published = []
+
+    def publish_batch(self, TopicArn, PublishBatchRequestEntries):
+        self.batches.append(PublishBatchRequestEntries)
+        return {
+            'Successful': [{'Id': e['Id']} for e in PublishBatchRequestEntries if e['Id'] not in self.fail_ids],
+            'Failed': [{'Id': e['Id'], 'Code': 'InternalError'} for e in PublishBatchRequestEntries if e['Id'] in self.fail_ids],
+        }
+
+    def publish(self, TargetArn, Subject, Message, MessageAttributes, **fifo_ids):
+        if self.down:
+            raise ConnectionError('SNS unavailable')
+        self.published.append(Message)
+        self.fifo_ids = fifo_ids
+
+
+def test_flush_sends_batches_of_ten_and_retries_failed_entries():
+    clients = {}
+    notifier = SnsNotifier(lambda region: clients.setdefault(region, FakeSns(fail_ids={'3'})))
+
+    for n in range(23):
+        notifier.queue('arn:topic', 'subject', {'notify_type': 'dih_glue_add_ptn_success', 'n': n}, 'eu-west-2')
+    notifier.queue('arn:topic', 'subject', {'partition_value_list': ['2021-09-13']}, 'eu-west-1')
+
+    assert notifier.pending() == 24
+    assert notifier.flush() == []
+    assert notifier.pending() == 0
+
+    sns = clients['eu-west-2']
+    assert [len(batch) for batch in sns.batches] == [10, 10, 3]
+    assert len(sns.published) == 2
+    assert sns.batches[0][0]['MessageAttributes']['notify_type']['StringValue'] == '"dih_glue_add_ptn_success"'
+    assert len(clients['eu-west-1'].batches) == 1
+
+
+def test_flush_returns_the_keys_of_the_notifications_not_sent():
+    sns = FakeSns(fail_ids={'1', '2'}, down=True)
+    notifier = SnsNotifier(lambda region: sns)
+
+    for key in ('a', 'b', None):
+        notifier.queue('arn:topic', 'subject', {'notify_type': 'dih_glue_add_ptn_success', 'key': key}, 'eu-west-2',
+                       key=key)
+
+    assert notifier.flush() == ['b', None]
+    assert notifier.flush() == []
+
+
+def test_fifo_topic_entries_carry_group_and_deduplication_ids():
+    sns = FakeSns(fail_ids={'1'})
+    notifier = SnsNotifier(lambda region: sns)
+    message = {'notify_type': 'dih_glue_add_ptn_success', 'feed': 'db#a', 'partition_value_list': ['2021-09-13']}
+
+    notifier.queue('arn:topic.fifo', 'subject', message, 'eu-west-2')
+    notifier.queue('arn:topic.fifo', 'subject', dict(message, notify_type='dih_glue_add_ptn_failure'), 'eu-west-2')
+    notifier.queue('arn:topic', 'subject', message, 'eu-west-2')
+    assert notifier.flush() == []
+
+    fifo_batch, standard_batch = sns.batches
+    assert [entry['MessageGroupId'] for entry in fifo_batch] == ['db#a', 'db#a']
+    assert fifo_batch[0]['MessageDeduplicationId'] != fifo_batch[1]['MessageDeduplicationId']
+    assert sns.fifo_ids == {key: fifo_batch[1][key] for key in ('MessageGroupId', 'MessageDeduplicationId')}
+    assert 'MessageGroupId' not in standard_batch[0]
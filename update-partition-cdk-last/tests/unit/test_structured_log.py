@@ -0,0 +1,43 @@
+import json
+import logging
+
+from structured_log import StructuredLogger
+
+
+def test_fields_are_not_evaluated_when_the_level_is_disabled():
+    log = StructuredLogger('test.structured_log.disabled', level='WARNING')
+    calls = []
+
+    log.info('Skipped', payload=lambda: calls.append('info'))
+    log.payload('Skipped', lambda: calls.append('payload'), level=logging.INFO)
+
+    assert calls == []
+
+
+def test_payload_is_only_attached_when_sampled(caplog):
+    log = StructuredLogger('test.structured_log.sampled', level='INFO', sample_rate=0)
+
+    with caplog.at_level(logging.INFO, logger='test.structured_log.sampled'):
+        log.payload('Event', lambda: {'Records': []}, records=0)
+        log.sample_rate = 1
+        log.payload('Event', lambda: {'Records': []}, records=0)
+
+    lines = [json.loads(record.getMessage()) for record in caplog.records]
+    assert lines[0] == {'level': 'INFO', 'message': 'Event', 'records': 0}
+    assert lines[1]['payload'] == {'Records': []}
+
+
+def test_error_includes_the_payload_and_traceback(caplog):
+    log = StructuredLogger('test.structured_log.error', level='INFO')
+
+    with caplog.at_level(logging.INFO, logger='test.structured_log.error'):
+        try:
+            raise ValueError('bad partition')
+        except ValueError as e:
+            log.error('Failed', exc=e, payload=lambda: {'Values': ['x']}, table='t')
+
+    line = json.loads(caplog.records[0].getMessage())
+    assert line['table'] == 't'
+    assert line['payload'] == {'Values': ['x']}
+    assert "ValueError('bad partition')" in line['error']
+    assert 'Traceback' in line['traceback']
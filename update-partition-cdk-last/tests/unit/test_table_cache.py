@@ -0,0 +1,52 @@
+from table_cache import TableDescriptorCache
+
+
+class FakeGlue:
+
+    def __init__(self):
+        self.calls = 0
+        self.version = '1'
+
+    def get_table(self, DatabaseName, Name):
+        self.calls += 1
+        return {'Table': {'Name': Name, 'DatabaseName': DatabaseName, 'VersionId': self.version,
+                          'StorageDescriptor': {'Columns': []}}}
+
+
+def test_repeated_lookups_are_served_from_cache():
+    glue = FakeGlue()
+    cache = TableDescriptorCache(lambda: glue)
+
+    first = cache.get_table('db', 'tbl')
+    assert cache.get_table('db', 'tbl') is first
+    assert glue.calls == 1
+    assert cache.stats()['hits'] == 1
+    assert cache.stats()['misses'] == 1
+
+
+def test_expired_entry_is_kept_when_version_is_unchanged():
+    glue = FakeGlue()
+    cache = TableDescriptorCache(lambda: glue, ttl_seconds=0)
+
+    first = cache.get_table('db', 'tbl')
+    assert cache.get_table('db', 'tbl') is first
+    assert cache.stats()['revalidated'] == 1
+
+    glue.version = '2'
+    assert cache.get_table('db', 'tbl')['VersionId'] == '2'
+    assert cache.stats()['changed'] == 1
+
+
+def test_invalidate_and_eviction():
+    glue = FakeGlue()
+    cache = TableDescriptorCache(lambda: glue, max_entries=1)
+
+    cache.get_table('db', 'a')
+    cache.invalidate('db', 'a')
+    cache.get_table('db', 'a')
+    cache.get_table('db', 'b')
+
+    assert glue.calls == 3
+    assert cache.stats()['invalidated'] == 1
+    assert cache.stats()['evicted'] == 1
+    assert cache.stats()['size'] == 1
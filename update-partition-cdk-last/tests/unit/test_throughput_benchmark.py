@@ -0,0 +1,23 @@
+import json
+
+from benchmarks.throughput import run, synthetic_messages
+
+
+def test_synthetic_messages_repeat_partitions_at_the_duplicate_ratio():
+    records = synthetic_messages(200, tables=4, duplicates=0.5)
+    messages = [json.loads(json.loads(record['body'])['Message']) for record in records]
+
+    assert len({record['messageId'] for record in records}) == 200
+    assert 60 < len({(m['feed'], tuple(m['partition_value_list'])) for m in messages}) < 140
+    assert len({m['feed'] for m in messages}) == 4
+
+
+def test_run_reports_throughput_latency_and_allocations(clients):
+    for duplicates in (0, 0.5):
+        result = run(messages=60, batch_size=20, tables=3, duplicates=duplicates)
+
+        assert result['msgs_per_sec'] > 0
+        assert 0 < result['p50_ms'] <= result['p99_ms']
+        assert result['alloc_kb'] > 0
+        assert result['glue_calls'] > 0
+        assert result['sns_calls'] == 6
@@ -0,0 +1,85 @@
+import pytest
+
+from update_partition_cdk.throughput_profile import ThroughputProfile
+
+
+def test_default_load_is_sized_consistently():
+    profile = ThroughputProfile(target_notifications_per_second=20, peak_burst=2000)
+
+    assert profile.batch_size == 100
+    assert profile.batching_window_seconds == 5
+    assert profile.invocation_seconds == 2.5
+    assert profile.timeout_seconds == 60
+    assert profile.max_concurrency == 2
+    assert profile.reserved_concurrency is None
+    assert profile.memory_size == 1024
+    assert profile.visibility_timeout_seconds == 6 * 60 + 5
+    assert profile.idempotency_lease_seconds == 60 + 30
+    assert profile.capacity() == 80
+    assert profile.validate() == []
+
+
+def test_a_low_rate_gets_small_batches():
+    profile = ThroughputProfile(target_notifications_per_second=1, peak_burst=0)
+
+    assert profile.batch_size == 5
+    assert profile.batching_window_seconds == 5
+    assert profile.memory_size == 512
+    assert profile.validate() == []
+
+
+def test_the_peak_burst_drives_the_concurrency():
+    profile = ThroughputProfile(target_notifications_per_second=20, peak_burst=100000)
+
+    # 1000 batches of 2.5 seconds drained within 120 seconds.
+    assert profile.max_concurrency == 21
+    assert profile.validate() == []
+
+
+def test_fifo_batches_have_no_window():
+    profile = ThroughputProfile(target_notifications_per_second=20, peak_burst=2000, fifo=True)
+
+    assert profile.batch_size == 10
+    assert profile.batching_window_seconds == 0
+    assert profile.max_batch_size == 10
+    assert profile.max_batching_window_seconds == 0
+    assert profile.validate() == []
+
+
+def test_the_parameter_bounds_follow_the_timeouts():
+    profile = ThroughputProfile(target_notifications_per_second=2, peak_burst=0, timeout_seconds=4,
+                                visibility_timeout_seconds=40)
+
+    # A quarter of the 4 second timeout holds 25 records after the 500 ms overhead.
+    assert profile.max_batch_size == 25
+    assert profile.max_batching_window_seconds == 40 - 6 * 4
+    assert profile.batch_size <= profile.max_batch_size
+    assert profile.batching_window_seconds <= profile.max_batching_window_seconds
+
+
+def test_the_concurrency_is_only_bounded_by_a_reservation():
+    unreserved = ThroughputProfile(target_notifications_per_second=20, peak_burst=2000)
+    reserved = ThroughputProfile(target_notifications_per_second=20, peak_burst=2000, reserved_concurrency=50)
+
+    assert unreserved.concurrency_limit == 1000
+    assert reserved.reserved_concurrency == reserved.concurrency_limit == 50
+    assert reserved.validate() == []
+
+
+@pytest.mark.parametrize('overrides,error', [
+    ({'target_notifications_per_second': 0}, 'target_notifications_per_second must be positive'),
+    ({'batch_size': 101}, 'batch_size 101 must be between 1 and 100'),
+    ({'fifo': True, 'batching_window_seconds': 2}, 'A batching window is not supported on a FIFO queue'),
+    ({'max_concurrency': 1}, 'max_concurrency 1 must be between 2 and 1000'),
+    ({'max_concurrency': 10, 'reserved_concurrency': 5}, 'reserved_concurrency 5 is below max_concurrency 10'),
+    ({'memory_size': 64}, 'memory_size 64 must be between 128 and 10240 MB'),
+    ({'timeout_seconds': 2}, 'timeout_seconds 2 must exceed the expected duration of a batch'),
+    ({'visibility_timeout_seconds': 300}, 'visibility_timeout_seconds 300 must be at least 365'),
+    ({'target_notifications_per_second': 200, 'max_concurrency': 2}, 'sustains 80.0 notifications/s'),
+])
+def test_inconsistent_combinations_are_reported(overrides, error):
+    settings = dict({'target_notifications_per_second': 20, 'peak_burst': 2000}, **overrides)
+
+    errors = ThroughputProfile(**settings).validate()
+
+    assert any(error in e for e in errors), errors
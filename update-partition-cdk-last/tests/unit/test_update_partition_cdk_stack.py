@@ -1,19 +1,46 @@
-# from aws_cdk import (
-#         core,
-#         assertions
-#     )
+import os
 
-# from update_partition_cdk.update_partition_cdk_stack import UpdatePartitionCdkStack
+import pytest
 
+cdk = pytest.importorskip('aws_cdk.core')
+assertions = pytest.importorskip('aws_cdk.assertions')
 
-# example tests. To run these tests, uncomment this file along with the example
-# resource in update_partition_cdk/update_partition_cdk_stack.py
-def test_sqs_queue_created():
-#     app = core.App()
-#     stack = UpdatePartitionCdkStack(app, "update-partition-cdk")
-#     template = assertions.Template.from_stack(stack)
+from update_partition_cdk.update_partition_cdk_stack import UpdatePartitionCdkStack  # noqa: E402
 
-#     template.has_resource_properties("AWS::SQS::Queue", {
-#         "VisibilityTimeout": 300
-#     })
-  pass
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def synth(monkeypatch, **context):
+    # The lambda assets are given relative to the project directory.
+    monkeypatch.chdir(PROJECT_DIR)
+    app = cdk.App(context=context)
+    return assertions.Template.from_stack(UpdatePartitionCdkStack(app, 'update-partition-cdk'))
+
+
+def test_the_mapping_scales_to_the_max_concurrency_parameter(monkeypatch):
+    template = synth(monkeypatch)
+
+    template.has_resource_properties('AWS::Lambda::EventSourceMapping', {
+        'FunctionResponseTypes': ['ReportBatchItemFailures'],
+        'ScalingConfig': {'MaximumConcurrency': {'Ref': 'updatepartitionmaxconcurrency'}},
+    })
+    template.has_parameter('updatepartitionmaxconcurrency', {'Default': 2, 'MinValue': 2, 'MaxValue': 1000})
+
+
+def test_no_concurrency_is_reserved_by_default(monkeypatch):
+    template = synth(monkeypatch)
+
+    template.has_resource_properties('AWS::Lambda::Function', {
+        'FunctionName': {'Ref': 'updatepartitionlambdaname'},
+        'ReservedConcurrentExecutions': assertions.Match.absent(),
+    })
+
+
+def test_a_reserved_concurrency_bounds_the_max_concurrency_parameter(monkeypatch):
+    template = synth(monkeypatch, reserved_concurrency='50')
+
+    template.has_resource_properties('AWS::Lambda::Function', {
+        'FunctionName': {'Ref': 'updatepartitionlambdaname'},
+        'ReservedConcurrentExecutions': 50,
+    })
+    template.has_parameter('updatepartitionmaxconcurrency', {'MaxValue': 50})
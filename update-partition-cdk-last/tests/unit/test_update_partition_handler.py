@@ -0,0 +1,433 @@
+import json
+import threading
+
+import pytest
+
+from tests.fakes import dih_record
+
+
+def test_batch_is_grouped_by_feed(clients, update_partition):
+    glue, sns = clients
+    glue.add_table('db', 'a')
+    glue.add_table('db', 'b')
+    records = [dih_record('db#a', f'2021-09-{day:02}') for day in range(1, 11)] + [dih_record('db#b', '2021-09-01')]
+
+    response = update_partition.handler({'Records': records}, None)
+
+    assert response == {'batchItemFailures': []}
+    assert glue.count('get_table') == 2
+    assert glue.count('batch_create_partition') == 2
+    assert len(glue.partitions) == 11
+    assert [message['notify_type'] for message in sns.messages] == ['dih_glue_add_ptn_success'] * 11
+
+
+def test_only_failed_records_are_reported(clients, update_partition, monkeypatch):
+    glue, sns = clients
+    glue.add_table('db', 'a')
+    glue.add_table('db', 'b')
+
+    def unavailable(**kwargs):
+        raise ConnectionError('Connection reset by peer.')
+    table_cache_get = update_partition.table_cache.get_table
+    monkeypatch.setattr(update_partition.table_cache, 'get_table',
+                        lambda db, tbl: unavailable() if tbl == 'b' else table_cache_get(db, tbl))
+    records = [dih_record('db#a', '2021-09-01'), dih_record('db#b', '2021-09-01')]
+
+    response = update_partition.handler({'Records': records}, None)
+
+    assert response == {'batchItemFailures': [{'itemIdentifier': 'db#b-2021-09-01'}]}
+    assert [message['notify_type'] for message in sns.messages] == ['dih_glue_add_ptn_success']
+
+
+def test_permanent_failures_are_notified_without_retry(clients, update_partition):
+    glue, sns = clients
+    glue.add_table('db', 'a')
+    bad_values = dih_record('db#a', '2021-09-02')
+    body = json.loads(bad_values['body'])
+    body['Message'] = body['Message'].replace('["2021-09-02"]', '["2021-09-02", "extra"]')
+    bad_values['body'] = json.dumps(body)
+    records = [dih_record('db#a', '2021-09-01'), dih_record('db#missing', '2021-09-01'),
+               dih_record('no-separator', '2021-09-01'), bad_values, {'messageId': 'garbled', 'body': '{'}]
+
+    response = update_partition.handler({'Records': records}, None)
+
+    assert response == {'batchItemFailures': []}
+    assert sorted((message['feed'], message['notify_type']) for message in sns.messages) == [
+        ('db#a', 'dih_glue_add_ptn_failure'),
+        ('db#a', 'dih_glue_add_ptn_success'),
+        ('db#missing', 'dih_glue_add_ptn_failure'),
+        ('no-separator', 'dih_glue_add_ptn_failure'),
+    ]
+    assert glue.count('batch_create_partition') == 1
+
+
+def test_rejected_partitions_are_retried_once_one_per_request(clients, update_partition, monkeypatch):
+    glue, sns = clients
+    glue.add_table('db', 'a')
+    create = glue.batch_create_partition
+
+    def reject_bad(DatabaseName, TableName, PartitionInputList):
+        if any(p['Values'] == ['bad'] for p in PartitionInputList):
+            raise type('InvalidInputException', (Exception,), {})('Invalid partition value.')
+        return create(DatabaseName=DatabaseName, TableName=TableName, PartitionInputList=PartitionInputList)
+    monkeypatch.setattr(glue, 'batch_create_partition', reject_bad)
+    records = [dih_record('db#a', '2021-09-01'), dih_record('db#a', 'bad'), dih_record('db#a', '2021-09-02')]
+
+    response = update_partition.handler({'Records': records}, None)
+
+    assert response == {'batchItemFailures': []}
+    assert sorted(message['notify_type'] for message in sns.messages) == [
+        'dih_glue_add_ptn_failure', 'dih_glue_add_ptn_success', 'dih_glue_add_ptn_success']
+    assert len(glue.partitions) == 2
+    assert glue.count('get_table') == 2
+
+
+@pytest.mark.parametrize('code,get_table_calls', [('InvalidInputException', 2), ('ValidationException', 1)])
+def test_only_schema_errors_refresh_the_table_definition(clients, update_partition, monkeypatch, code, get_table_calls):
+    glue, sns = clients
+    glue.add_table('db', 'a')
+
+    def rejected(DatabaseName, TableName, PartitionInputList):
+        return {'Errors': [{'PartitionValues': p['Values'], 'ErrorDetail': {'ErrorCode': code}}
+                           for p in PartitionInputList]}
+    monkeypatch.setattr(glue, 'batch_create_partition', rejected)
+
+    response = update_partition.handler({'Records': [dih_record('db#a', '2021-09-01')]}, None)
+
+    assert response == {'batchItemFailures': []}
+    assert [message['notify_type'] for message in sns.messages] == ['dih_glue_add_ptn_failure']
+    assert glue.count('get_table') == get_table_calls
+
+
+def test_duplicates_skip_glue(clients, update_partition):
+    glue, sns = clients
+    glue.add_table('db', 'a')
+
+    update_partition.handler({'Records': [dih_record('db#a', '2021-09-01')]}, None)
+    calls = len(glue.calls)
+    update_partition.handler({'Records': [dih_record('db#a', '2021-09-01')]}, None)
+
+    assert len(glue.calls) == calls
+    assert len(sns.messages) == 2
+
+
+def test_a_fresh_batch_is_registered_with_one_glue_call(clients, update_partition):
+    glue, sns = clients
+    glue.add_table('db', 'a')
+    records = [dih_record('db#a', f'2021-09-0{day}') for day in (1, 2, 3)]
+    update_partition.table_cache.get_table('db', 'a')
+    calls = len(glue.calls)
+
+    response = update_partition.handler({'Records': records}, None)
+
+    assert response == {'batchItemFailures': []}
+    assert glue.calls[calls:] == [('batch_create_partition', 'db', 'a', 3)]
+    assert len(sns.messages) == 3
+
+
+def test_existing_partitions_are_found_by_the_create(clients, update_partition):
+    glue, sns = clients
+    glue.add_table('db', 'a')
+    glue.partitions[('db', 'a', ('2021-09-01',))] = {'Values': ['2021-09-01']}
+    records = [dih_record('db#a', '2021-09-01'), dih_record('db#a', '2021-09-02')]
+
+    update_partition.handler({'Records': records}, None)
+    calls = len(glue.calls)
+    update_partition.handler({'Records': records}, None)
+
+    assert glue.count('batch_get_partition') == 0
+    assert glue.calls[calls - 1] == ('batch_create_partition', 'db', 'a', 2)
+    # The AlreadyExistsException filled the partition index.
+    assert len(glue.calls) == calls
+    assert [message['notify_type'] for message in sns.messages] == ['dih_glue_add_ptn_success'] * 4
+
+
+def test_tables_are_registered_concurrently(clients, update_partition, monkeypatch):
+    glue, sns = clients
+    monkeypatch.setattr(update_partition, 'MAX_TABLE_CONCURRENCY', 4)
+    feeds = [f'db#t{n}' for n in range(8)]
+    for feed in feeds:
+        glue.add_table(*feed.split('#'))
+    records = [dih_record(feed, f'2021-09-{day:02}') for day in range(1, 4) for feed in feeds]
+
+    response = update_partition.handler({'Records': records}, None)
+
+    assert response == {'batchItemFailures': []}
+    assert len(glue.partitions) == 24
+    assert glue.count('batch_create_partition') == 8
+    assert len(sns.messages) == 24
+
+
+def test_other_notification_types_are_skipped_without_dropping_the_batch(clients, update_partition):
+    glue, sns = clients
+    glue.add_table('db', 'a')
+    quoted = dih_record('db#a', '2021-09-03', notify_type='dih_glue_add_ptn_success')
+    body = json.loads(quoted['body'])
+    body['MessageAttributes']['notify_type']['Value'] = '"dih_glue_add_ptn_success"'
+    # The inner message is never decoded for a record the envelope rules out.
+    body['Message'] = body['Message'].replace('dih_glue_add_ptn_success', 'dih_file_create_success')[:-1]
+    quoted['body'] = json.dumps(body)
+    records = [dih_record('db#a', '2021-09-01'), dih_record('db#a', '2021-09-02', notify_type='dih_file_delete_success'),
+               quoted, dih_record('db#a', '2021-09-04')]
+
+    response = update_partition.handler({'Records': records}, None)
+
+    assert response == {'batchItemFailures': []}
+    assert sorted(glue.partitions) == [('db', 'a', ('2021-09-01',)), ('db', 'a', ('2021-09-04',))]
+    assert len(sns.messages) == 2
+
+
+def test_notifications_for_the_same_partition_are_coalesced(clients, update_partition):
+    glue, sns = clients
+    glue.add_table('db', 'a')
+    records = [dih_record('db#a', '2021-09-01', message_id=f'm{n}') for n in range(3)]
+    records.append(dih_record('db#a', '2021-09-02', message_id='m3'))
+
+    response = update_partition.handler({'Records': records}, None)
+
+    assert response == {'batchItemFailures': []}
+    assert glue.calls[-1] == ('batch_create_partition', 'db', 'a', 2)
+    assert [message['notify_type'] for message in sns.messages] == ['dih_glue_add_ptn_success'] * 4
+    assert update_partition.coalesced == {}
+
+
+def test_coalesced_records_are_retried_with_their_partition(clients, update_partition, monkeypatch):
+    glue, sns = clients
+    glue.add_table('db', 'a')
+
+    def unavailable(database_name, table_name):
+        raise ConnectionError('Connection reset by peer.')
+    monkeypatch.setattr(update_partition.table_cache, 'get_table', unavailable)
+    records = [dih_record('db#a', '2021-09-01', message_id=f'm{n}') for n in range(3)]
+
+    response = update_partition.handler({'Records': records}, None)
+
+    assert response == {'batchItemFailures': [{'itemIdentifier': f'm{n}'} for n in range(3)]}
+    assert sns.messages == []
+
+
+def test_upsert_rewrites_stale_locations_and_skips_matching_partitions(clients, update_partition, monkeypatch):
+    glue, sns = clients
+    glue.add_table('db', 'a')
+    update_partition.handler({'Records': [dih_record('db#a', '2021-09-01'), dih_record('db#a', '2021-09-02')]}, None)
+    monkeypatch.setattr(update_partition, 'PARTITION_UPSERT', True)
+
+    reprocessed = dih_record('db#a', '2021-09-01', message_id='reprocessed')
+    body = json.loads(reprocessed['body'])
+    body['Message'] = body['Message'].replace('s3://bucket/prefix/', 's3://bucket/reprocessed/')
+    reprocessed['body'] = json.dumps(body)
+    calls = len(glue.calls)
+
+    response = update_partition.handler({'Records': [reprocessed, dih_record('db#a', '2021-09-02', message_id='same')]}, None)
+
+    assert response == {'batchItemFailures': []}
+    assert glue.calls[calls:] == [('batch_get_partition', 'db', 'a', 2), ('batch_update_partition', 'db', 'a', 1)]
+    assert glue.partitions[('db', 'a', ('2021-09-01',))]['StorageDescriptor']['Location'] == \
+        's3://bucket/reprocessed/db/a/dw_bus_dt=2021-09-01'
+    assert [message['notify_type'] for message in sns.messages[2:]] == ['dih_glue_add_ptn_success'] * 2
+
+    calls = len(glue.calls)
+    update_partition.handler({'Records': [reprocessed]}, None)
+    assert len(glue.calls) == calls
+
+
+def test_upsert_registers_the_last_prefix_notified_in_a_batch(clients, update_partition, monkeypatch):
+    glue, sns = clients
+    glue.add_table('db', 'a')
+    update_partition.handler({'Records': [dih_record('db#a', '2021-09-01')]}, None)
+    monkeypatch.setattr(update_partition, 'PARTITION_UPSERT', True)
+
+    def reprocessed(value, prefix, message_id):
+        record = dih_record('db#a', value, message_id=message_id)
+        body = json.loads(record['body'])
+        body['Message'] = body['Message'].replace('s3://bucket/prefix/', f's3://bucket/{prefix}/')
+        record['body'] = json.dumps(body)
+        return record
+    records = [reprocessed(value, prefix, f'{prefix}-{value}')
+               for prefix in ('first', 'second') for value in ('2021-09-01', '2021-09-02')]
+    calls = len(glue.calls)
+
+    response = update_partition.handler({'Records': records}, None)
+
+    assert response == {'batchItemFailures': []}
+    for value in ('2021-09-01', '2021-09-02'):
+        assert glue.partitions[('db', 'a', (value,))]['StorageDescriptor']['Location'] == \
+            f's3://bucket/second/db/a/dw_bus_dt={value}'
+    assert glue.calls[calls:] == [('batch_get_partition', 'db', 'a', 2), ('batch_update_partition', 'db', 'a', 1),
+                                  ('batch_create_partition', 'db', 'a', 1)]
+    assert [message['notify_type'] for message in sns.messages[1:]] == ['dih_glue_add_ptn_success'] * 4
+
+
+def test_redelivered_notifications_are_acknowledged_once_handled(clients, update_partition, monkeypatch):
+    from idempotency_ledger import IdempotencyLedger, SqliteBackend
+
+    glue, sns = clients
+    glue.add_table('db', 'a')
+    monkeypatch.setattr(update_partition, 'ledger', IdempotencyLedger(SqliteBackend()))
+    table_cache_get = update_partition.table_cache.get_table
+
+    def unavailable(database_name, table_name):
+        raise ConnectionError('Connection reset by peer.')
+    monkeypatch.setattr(update_partition.table_cache, 'get_table', unavailable)
+    records = [dih_record('db#a', '2021-09-01')]
+
+    assert update_partition.handler({'Records': records}, None)['batchItemFailures'] == [{'itemIdentifier': 'db#a-2021-09-01'}]
+
+    monkeypatch.setattr(update_partition.table_cache, 'get_table', table_cache_get)
+    assert update_partition.handler({'Records': records}, None) == {'batchItemFailures': []}
+    calls = len(glue.calls) + len(sns.calls)
+    assert update_partition.handler({'Records': records}, None) == {'batchItemFailures': []}
+
+    assert len(glue.calls) + len(sns.calls) == calls
+    assert [message['notify_type'] for message in sns.messages] == ['dih_glue_add_ptn_success']
+
+
+def test_the_ledger_is_written_concurrently(clients, update_partition, monkeypatch):
+    from idempotency_ledger import IdempotencyLedger, MemoryBackend
+
+    glue, sns = clients
+    glue.add_table('db', 'a')
+    backend = MemoryBackend()
+    # Every claim and every completion waits for the two others, which only
+    # completes when they are written at the same time.
+    barrier = threading.Barrier(3, timeout=5)
+    put_if_absent, put = backend.put_if_absent, backend.put
+
+    def waiting_put_if_absent(*args):
+        barrier.wait()
+        return put_if_absent(*args)
+
+    def waiting_put(*args):
+        barrier.wait()
+        return put(*args)
+    monkeypatch.setattr(backend, 'put_if_absent', waiting_put_if_absent)
+    monkeypatch.setattr(backend, 'put', waiting_put)
+    monkeypatch.setattr(update_partition, 'ledger', IdempotencyLedger(backend))
+    records = [dih_record('db#a', f'2021-09-0{day}') for day in (1, 2, 3)]
+
+    assert update_partition.handler({'Records': records}, None) == {'batchItemFailures': []}
+    assert sorted(status for status, expires_at in backend.entries.values()) == ['completed'] * 3
+
+
+def test_a_notification_not_sent_is_not_completed_in_the_ledger(clients, update_partition, monkeypatch):
+    from idempotency_ledger import IdempotencyLedger, MemoryBackend
+
+    glue, sns = clients
+    glue.add_table('db', 'a')
+    ledger = IdempotencyLedger(MemoryBackend())
+    monkeypatch.setattr(update_partition, 'ledger', ledger)
+    publish_batch, publish = sns.publish_batch, sns.publish
+
+    def unavailable(**kwargs):
+        raise ConnectionError('Connection reset by peer.')
+    monkeypatch.setattr(sns, 'publish_batch', unavailable)
+    monkeypatch.setattr(sns, 'publish', unavailable)
+    records = [dih_record('db#a', '2021-09-01'), dih_record('db#a', '2021-09-02')]
+
+    assert update_partition.handler({'Records': records}, None) == \
+        {'batchItemFailures': [{'itemIdentifier': 'db#a-2021-09-01'}, {'itemIdentifier': 'db#a-2021-09-02'}]}
+    assert ledger.backend.entries == {}
+
+    # A redelivery of the notification sends it.
+    monkeypatch.setattr(sns, 'publish_batch', publish_batch)
+    monkeypatch.setattr(sns, 'publish', publish)
+    assert update_partition.handler({'Records': records[:1]}, None) == {'batchItemFailures': []}
+    assert [(message['notify_type'], message['partition_value_list']) for message in sns.messages] == \
+        [('dih_glue_add_ptn_success', ['2021-09-01'])]
+    assert ledger.claim('msg#db#a-2021-09-01') == 'completed'
+
+
+def test_records_whose_notification_was_not_sent_are_returned_to_the_queue(clients, update_partition, monkeypatch):
+    glue, sns = clients
+    glue.add_table('db', 'a')
+    publish_batch = sns.publish_batch
+
+    def failing_first_day(TopicArn, PublishBatchRequestEntries):
+        response = publish_batch(TopicArn, [e for e in PublishBatchRequestEntries if '2021-09-01' not in e['Message']])
+        response['Failed'] = [{'Id': e['Id'], 'Code': 'InternalError', 'SenderFault': False}
+                              for e in PublishBatchRequestEntries if '2021-09-01' in e['Message']]
+        return response
+
+    def unavailable(**kwargs):
+        raise ConnectionError('Connection reset by peer.')
+    monkeypatch.setattr(sns, 'publish_batch', failing_first_day)
+    monkeypatch.setattr(sns, 'publish', unavailable)
+    # The second record is coalesced into the first one and follows its outcome.
+    records = [dih_record('db#a', '2021-09-01', 'm1'), dih_record('db#a', '2021-09-01', 'm2'),
+               dih_record('db#a', '2021-09-02', 'm3')]
+
+    response = update_partition.handler({'Records': records}, None)
+
+    assert response == {'batchItemFailures': [{'itemIdentifier': 'm1'}, {'itemIdentifier': 'm2'}]}
+    assert [message['partition_value_list'] for message in sns.messages] == [['2021-09-02']]
+
+
+def test_unreadable_records_are_returned_to_the_queue(clients, update_partition):
+    glue, sns = clients
+    glue.add_table('db', 'a')
+    truncated = dict(dih_record('db#a', '2021-09-01', 'truncated'))
+    truncated['body'] = truncated['body'][:-10]
+    not_an_object = dict(dih_record('db#a', '2021-09-02', 'list'), body='["dih_file_create_success"]')
+    records = [truncated, not_an_object, dih_record('db#a', '2021-09-03')]
+
+    response = update_partition.handler({'Records': records}, None)
+
+    assert response == {'batchItemFailures': [{'itemIdentifier': 'truncated'}, {'itemIdentifier': 'list'}]}
+    assert [message['partition_value_list'] for message in sns.messages] == [['2021-09-03']]
+
+
+def test_fifo_group_stops_at_an_unreadable_record(clients, update_partition):
+    glue, sns = clients
+    glue.add_table('db', 'a')
+    records = [dih_record('db#a', f'2021-09-0{day}') for day in (1, 2, 3)]
+    records[1]['body'] = records[1]['body'][:-10]
+    for record in records:
+        record['attributes']['MessageGroupId'] = 'db#a'
+
+    response = update_partition.handler({'Records': records}, None)
+
+    assert response == {'batchItemFailures': [{'itemIdentifier': 'db#a-2021-09-02'}, {'itemIdentifier': 'db#a-2021-09-03'}]}
+    assert [message['partition_value_list'] for message in sns.messages] == [['2021-09-01']]
+
+
+def test_fifo_group_stops_at_its_first_failed_record(clients, update_partition, monkeypatch):
+    glue, sns = clients
+    glue.add_table('db', 'a')
+    glue.add_table('db', 'b')
+    create = glue.batch_create_partition
+
+    def internal_error_on_first_day(DatabaseName, TableName, PartitionInputList):
+        response = create(DatabaseName, TableName, [p for p in PartitionInputList if p['Values'] != ['2021-09-01']])
+        response['Errors'] += [{'PartitionValues': p['Values'], 'ErrorDetail': {'ErrorCode': 'InternalServiceException'}}
+                               for p in PartitionInputList if p['Values'] == ['2021-09-01']]
+        return response
+    monkeypatch.setattr(glue, 'batch_create_partition', internal_error_on_first_day)
+    records = [dih_record('db#a', '2021-09-01'), dih_record('db#b', '2021-09-02'), dih_record('db#a', '2021-09-02')]
+    for record in records:
+        record['attributes']['MessageGroupId'] = json.loads(json.loads(record['body'])['Message'])['feed']
+
+    response = update_partition.handler({'Records': records}, None)
+
+    assert response == {'batchItemFailures': [{'itemIdentifier': 'db#a-2021-09-01'}, {'itemIdentifier': 'db#a-2021-09-02'}]}
+    # Nothing is written or published for the group after its first failure.
+    assert ('db', 'a', ('2021-09-02',)) not in glue.partitions
+    assert [(message['feed'], message['partition_value_list']) for message in sns.messages] == [('db#b', ['2021-09-02'])]
+
+
+def test_fifo_group_waits_for_a_record_in_progress_elsewhere(clients, update_partition, monkeypatch):
+    from idempotency_ledger import IdempotencyLedger, MemoryBackend
+
+    glue, sns = clients
+    glue.add_table('db', 'a')
+    ledger = IdempotencyLedger(MemoryBackend())
+    monkeypatch.setattr(update_partition, 'ledger', ledger)
+    records = [dih_record('db#a', '2021-09-01'), dih_record('db#a', '2021-09-02')]
+    for record in records:
+        record['attributes']['MessageGroupId'] = 'db#a'
+    ledger.claim('msg#db#a-2021-09-01')
+
+    response = update_partition.handler({'Records': records}, None)
+
+    assert response == {'batchItemFailures': [{'itemIdentifier': 'db#a-2021-09-01'}, {'itemIdentifier': 'db#a-2021-09-02'}]}
+    assert glue.partitions == {} and sns.messages == []
+    assert ledger.claim('msg#db#a-2021-09-02') == 'claimed'
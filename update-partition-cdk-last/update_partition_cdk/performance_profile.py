@@ -0,0 +1,84 @@
+from aws_cdk import (
+    core as cdk,
+    aws_lambda as aws_lambda,
+)
+
+from update_partition_cdk.throughput_profile import ThroughputProfile
+
+
+class PerformanceProfile(cdk.Construct):
+    """Consistent sizing of the partition lambdas and their queues, derived from
+    the notification rate they have to sustain by a ThroughputProfile (see
+    throughput_profile.py, which takes the same keyword arguments).
+
+    The construct adds the architecture and runtime of the functions, exposes the
+    durations as cdk.Duration and validates the combination when the app is
+    synthesized."""
+
+    def __init__(self, scope: cdk.Construct, construct_id: str, **kwargs) -> None:
+        super().__init__(scope, construct_id)
+
+        self.throughput = ThroughputProfile(**kwargs)
+
+        # arm64 runs the (pure python) handlers at a lower price per ms.
+        self.architecture = aws_lambda.Architecture.ARM_64
+        self.runtime = aws_lambda.Runtime.PYTHON_3_9
+
+    @property
+    def batch_size(self) -> int:
+        return self.throughput.batch_size
+
+    @property
+    def max_batch_size(self) -> int:
+        return self.throughput.max_batch_size
+
+    @property
+    def batching_window_seconds(self) -> int:
+        return self.throughput.batching_window_seconds
+
+    @property
+    def max_batching_window_seconds(self) -> int:
+        return self.throughput.max_batching_window_seconds
+
+    @property
+    def max_concurrency(self) -> int:
+        return self.throughput.max_concurrency
+
+    @property
+    def reserved_concurrency(self) -> int:
+        return self.throughput.reserved_concurrency
+
+    @property
+    def concurrency_limit(self) -> int:
+        return self.throughput.concurrency_limit
+
+    @property
+    def memory_size(self) -> int:
+        return self.throughput.memory_size
+
+    @property
+    def dead_letter_memory_size(self) -> int:
+        return self.throughput.dead_letter_memory_size
+
+    @property
+    def idempotency_lease_seconds(self) -> int:
+        return self.throughput.idempotency_lease_seconds
+
+    @property
+    def timeout(self) -> cdk.Duration:
+        return cdk.Duration.seconds(self.throughput.timeout_seconds)
+
+    @property
+    def visibility_timeout(self) -> cdk.Duration:
+        return cdk.Duration.seconds(self.throughput.visibility_timeout_seconds)
+
+    @property
+    def dead_letter_timeout(self) -> cdk.Duration:
+        return cdk.Duration.seconds(self.throughput.dead_letter_timeout_seconds)
+
+    @property
+    def dead_letter_visibility_timeout(self) -> cdk.Duration:
+        return cdk.Duration.seconds(self.throughput.dead_letter_visibility_timeout_seconds)
+
+    def validate(self) -> list:
+        return self.throughput.validate()
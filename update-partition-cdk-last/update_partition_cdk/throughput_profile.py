@@ -0,0 +1,162 @@
+import math
+
+# SQS and Lambda limits the derived settings must stay within.
+MAX_BATCH_SIZE = 100            # one BatchCreatePartition request per table and batch
+MAX_FIFO_BATCH_SIZE = 10        # Lambda reads at most 10 messages per batch from a FIFO queue
+MAX_BATCHING_WINDOW_SECONDS = 5
+MAX_MAPPING_BATCHING_WINDOW_SECONDS = 300
+MIN_MAXIMUM_CONCURRENCY = 2     # ScalingConfig.MaximumConcurrency range
+MAX_MAXIMUM_CONCURRENCY = 1000
+MIN_FUNCTION_TIMEOUT_SECONDS = 60
+MAX_FUNCTION_TIMEOUT_SECONDS = 900
+MAX_VISIBILITY_TIMEOUT_SECONDS = 43200
+# The function timeout is this many times the expected duration of a batch,
+# which leaves room for the Glue throttling backoff of the rate limiter.
+TIMEOUT_FACTOR = 4
+# AWS recommends a visibility timeout of at least six times the function
+# timeout (plus the batching window) for an SQS event source, so a batch is not
+# redelivered while the retries of a throttled invocation are still running.
+VISIBILITY_TIMEOUT_FACTOR = 6
+# An idempotency ledger claim outlives the invocation holding it by this much.
+LEASE_MARGIN_SECONDS = 30
+
+
+class ThroughputProfile:
+    """Consistent sizing of the partition lambdas and their queues, derived from
+    the notification rate they have to sustain.
+
+    target_notifications_per_second : steady rate of DIH notifications
+    peak_burst                      : notifications arriving at once (a feed
+                                      reprocessed, a backlog after an outage)
+    drain_seconds                   : time allowed to work through a peak burst
+    record_ms / invocation_ms       : handler time per record and per invocation,
+                                      as measured with benchmarks/throughput.py
+
+    From those it derives the memory and timeout of the functions, the batch size, batching window and maximum concurrency of the
+    event source mapping and the visibility timeout of the queues.  Any derived
+    value can be overridden, validate() lists the inconsistent combinations.
+
+    The batch size, batching window and maximum concurrency are also stack
+    parameters.  max_batch_size and max_batching_window_seconds are the largest
+    values the timeouts were sized for, and bound those parameters.  Reserved
+    concurrency is only set when asked for, it then bounds the maximum
+    concurrency parameter."""
+
+    def __init__(self, *, target_notifications_per_second: float, peak_burst: int, fifo: bool = False,
+                 drain_seconds: int = 120, record_ms: float = 20, invocation_ms: float = 500,
+                 batch_size: int = None, batching_window_seconds: int = None, max_concurrency: int = None,
+                 reserved_concurrency: int = None, memory_size: int = None, timeout_seconds: int = None,
+                 visibility_timeout_seconds: int = None) -> None:
+        self.target_notifications_per_second = target_notifications_per_second
+        self.peak_burst = peak_burst
+        self.fifo = fifo
+        self.drain_seconds = drain_seconds
+        self.record_ms = record_ms
+        self.invocation_ms = invocation_ms
+        rate = max(target_notifications_per_second, 0.001)
+
+        # Batches fill within the batching window at the target rate, larger
+        # batches coalesce more notifications per Glue request.
+        self.queue_batch_size = MAX_FIFO_BATCH_SIZE if fifo else MAX_BATCH_SIZE
+        self.batch_size = batch_size or min(self.queue_batch_size, max(1, math.ceil(rate * MAX_BATCHING_WINDOW_SECONDS)))
+        if batching_window_seconds is None:
+            batching_window_seconds = 0 if fifo else min(MAX_BATCHING_WINDOW_SECONDS, math.ceil(self.batch_size / rate))
+        self.batching_window_seconds = batching_window_seconds
+
+        self.invocation_seconds = self.batch_seconds(self.batch_size)
+        self.timeout_seconds = timeout_seconds or \
+            max(MIN_FUNCTION_TIMEOUT_SECONDS, math.ceil(self.invocation_seconds * TIMEOUT_FACTOR))
+
+        # Little's law: concurrent invocations needed for the steady rate, and to
+        # work through the peak burst within drain_seconds.
+        steady = math.ceil(rate / self.batch_size * self.invocation_seconds)
+        burst = math.ceil(peak_burst / self.batch_size * self.invocation_seconds / drain_seconds)
+        self.max_concurrency = max_concurrency or min(MAX_MAXIMUM_CONCURRENCY, max(MIN_MAXIMUM_CONCURRENCY, steady, burst))
+        # The mapping throttles itself at max_concurrency.  Reserving as much would
+        # cap the function at the derived value whatever the stack parameter is
+        # raised to, so the function draws on the unreserved account concurrency
+        # unless a reservation is asked for.
+        self.reserved_concurrency = reserved_concurrency
+
+        # Larger batches decode and serialize more json per invocation, memory
+        # also buys the CPU share.
+        self.memory_size = memory_size or (1024 if self.batch_size > MAX_FIFO_BATCH_SIZE else 512)
+
+        self.visibility_timeout_seconds = visibility_timeout_seconds or \
+            VISIBILITY_TIMEOUT_FACTOR * self.timeout_seconds + self.batching_window_seconds
+
+        # A claim in the idempotency ledger is held until the invocation settles
+        # it, or has timed out.  The copies SQS redelivers after the visibility
+        # timeout find the lease of a timed out invocation expired.
+        self.idempotency_lease_seconds = self.timeout_seconds + LEASE_MARGIN_SECONDS
+
+        # The dead letter lambda handles one message per invocation.
+        self.dead_letter_memory_size = 256
+        self.dead_letter_timeout_seconds = 30
+        self.dead_letter_visibility_timeout_seconds = VISIBILITY_TIMEOUT_FACTOR * self.dead_letter_timeout_seconds
+
+    def batch_seconds(self, batch_size: int) -> float:
+        """Expected duration of an invocation handling batch_size records."""
+        return (self.invocation_ms + batch_size * self.record_ms) / 1000
+
+    @property
+    def max_batch_size(self) -> int:
+        """Largest batch whose expected duration still fits the timeout."""
+        fitting = math.floor((self.timeout_seconds * 1000 / TIMEOUT_FACTOR - self.invocation_ms) / self.record_ms)
+        return max(1, min(self.queue_batch_size, fitting))
+
+    @property
+    def concurrency_limit(self) -> int:
+        """Largest maximum concurrency the function can reach, the reserved
+        concurrency when one is set."""
+        return min(MAX_MAXIMUM_CONCURRENCY, self.reserved_concurrency or MAX_MAXIMUM_CONCURRENCY)
+
+    @property
+    def max_batching_window_seconds(self) -> int:
+        """Longest batching window the visibility timeout leaves room for."""
+        if self.fifo:
+            return 0
+        room = self.visibility_timeout_seconds - VISIBILITY_TIMEOUT_FACTOR * self.timeout_seconds
+        return max(0, min(MAX_MAPPING_BATCHING_WINDOW_SECONDS, room))
+
+    def capacity(self) -> float:
+        """Notifications per second the mapping sustains at max_concurrency."""
+        return self.max_concurrency * self.batch_size / self.invocation_seconds
+
+    def validate(self) -> list:
+        errors = []
+        if self.target_notifications_per_second <= 0:
+            errors.append('target_notifications_per_second must be positive.')
+        if self.peak_burst < 0:
+            errors.append('peak_burst must not be negative.')
+        if not 1 <= self.batch_size <= self.queue_batch_size:
+            errors.append(f'batch_size {self.batch_size} must be between 1 and {self.queue_batch_size}.')
+        if self.fifo and self.batching_window_seconds:
+            errors.append('A batching window is not supported on a FIFO queue.')
+        if not 0 <= self.batching_window_seconds <= MAX_MAPPING_BATCHING_WINDOW_SECONDS:
+            errors.append(f'batching_window_seconds {self.batching_window_seconds} must be between 0 and '
+                          f'{MAX_MAPPING_BATCHING_WINDOW_SECONDS}.')
+        if not MIN_MAXIMUM_CONCURRENCY <= self.max_concurrency <= MAX_MAXIMUM_CONCURRENCY:
+            errors.append(f'max_concurrency {self.max_concurrency} must be between {MIN_MAXIMUM_CONCURRENCY} '
+                          f'and {MAX_MAXIMUM_CONCURRENCY}.')
+        if self.reserved_concurrency is not None and self.reserved_concurrency < self.max_concurrency:
+            errors.append(f'reserved_concurrency {self.reserved_concurrency} is below max_concurrency '
+                          f'{self.max_concurrency}, the function would be throttled before the mapping.')
+        if not 128 <= self.memory_size <= 10240:
+            errors.append(f'memory_size {self.memory_size} must be between 128 and 10240 MB.')
+        if not self.invocation_seconds < self.timeout_seconds <= MAX_FUNCTION_TIMEOUT_SECONDS:
+            errors.append(f'timeout_seconds {self.timeout_seconds} must exceed the expected duration of a batch '
+                          f'({self.invocation_seconds:.1f}s) and be at most {MAX_FUNCTION_TIMEOUT_SECONDS}.')
+        if self.idempotency_lease_seconds >= self.visibility_timeout_seconds:
+            errors.append(f'The idempotency lease of {self.idempotency_lease_seconds}s must be shorter than the '
+                          f'visibility timeout.')
+        minimum_visibility = VISIBILITY_TIMEOUT_FACTOR * self.timeout_seconds + self.batching_window_seconds
+        if not minimum_visibility <= self.visibility_timeout_seconds <= MAX_VISIBILITY_TIMEOUT_SECONDS:
+            errors.append(f'visibility_timeout_seconds {self.visibility_timeout_seconds} must be at least '
+                          f'{minimum_visibility} ({VISIBILITY_TIMEOUT_FACTOR} x timeout + batching window) and at most '
+                          f'{MAX_VISIBILITY_TIMEOUT_SECONDS}.')
+        if self.invocation_seconds > 0 and self.capacity() < self.target_notifications_per_second:
+            errors.append(f'max_concurrency {self.max_concurrency} x batch_size {self.batch_size} sustains '
+                          f'{self.capacity():.1f} notifications/s, below the target of '
+                          f'{self.target_notifications_per_second}.')
+        return errors
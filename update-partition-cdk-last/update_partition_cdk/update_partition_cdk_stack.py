@@ -5,9 +5,13 @@ from aws_cdk import (
     aws_ec2 as ec2,
     aws_iam as iam,
     aws_kms as kms,
+    aws_sns as sns,
+    aws_dynamodb as dynamodb,
     aws_lambda_event_sources as aws_lambda_event_sources,
 )
 
+from update_partition_cdk.performance_profile import PerformanceProfile
+
 #from aws_cdk import core
 
 
@@ -19,6 +23,25 @@ class UpdatePartitionCdkStack(cdk.Stack):
         #~~~~~~~~~~~~~~
         # PARAMETERS
         #~~~~~~~~~~~~~~
+        # FIFO deployment (cdk deploy -c fifo=true): the queues are FIFO, grouped by
+        # feed, so each table is processed in order while tables scale out in
+        # parallel, and deduplicated by feed and partition values (see
+        # lambda/common/python/fifo.py).  SNS only delivers to a FIFO queue from a
+        # FIFO topic, so sns_notification_topic must then be a FIFO topic whose
+        # publishers set those ids.
+        fifo = str(self.node.try_get_context('fifo') or 'false').lower() == 'true'
+
+        # Sizing of the lambdas and queues for the expected load, e.g.
+        # cdk deploy -c target_notifications_per_second=50 -c peak_burst=10000
+        # -c reserved_concurrency=50 also reserves concurrency for the function.
+        reserved_concurrency = self.node.try_get_context('reserved_concurrency')
+        profile = PerformanceProfile(self, 'PerformanceProfile',
+            target_notifications_per_second=float(self.node.try_get_context('target_notifications_per_second') or 20),
+            peak_burst=int(self.node.try_get_context('peak_burst') or 2000),
+            fifo=fifo,
+            reserved_concurrency=int(reserved_concurrency) if reserved_concurrency else None
+        )
+
 
         VpcId = cdk.CfnParameter(self, 'VpcId', type='String', 
             description='AWS VPC in which to place the Update-Partition Module infrastructure'
@@ -61,6 +84,60 @@ class UpdatePartitionCdkStack(cdk.Stack):
             default='MVP-Dead-Letter-Lambda'
         )
 
+        # The sizing parameters default to the profile and are bounded by the
+        # largest values its timeouts and reserved concurrency (if any) were sized for.
+        update_partition_batch_size = cdk.CfnParameter(self, 'update_partition_batch_size', type='Number',
+            description='(Optional) Maximum number of queue messages delivered to the Update Partition Lambda per invocation, at most the batch size the function timeout was sized for',
+            default=profile.batch_size,
+            min_value=1,
+            max_value=profile.max_batch_size
+        )
+
+        update_partition_batching_window = cdk.CfnParameter(self, 'update_partition_batching_window', type='Number',
+            description='(Optional) Maximum time in seconds to gather messages into a batch before invoking the Update Partition Lambda, at most the window the queue visibility timeout was sized for',
+            default=profile.batching_window_seconds,
+            min_value=0,
+            max_value=profile.max_batching_window_seconds
+        )
+
+        update_partition_table_concurrency = cdk.CfnParameter(self, 'update_partition_table_concurrency', type='Number',
+            description='(Optional) Number of tables the Update Partition Lambda registers concurrently within one invocation',
+            default=4,
+            min_value=1,
+            max_value=32
+        )
+
+        subscribe_queue_to_topic = cdk.CfnParameter(self, 'subscribe_queue_to_topic', type='String',
+            description='(Optional) Subscribe the Update Partition queue to the notification topic, filtered to the notifications that create partitions. Leave false when the queue is already subscribed, e.g. on an upgrade, or every notification is delivered twice',
+            default='false',
+            allowed_values=['true', 'false']
+        )
+
+        update_partition_max_concurrency = cdk.CfnParameter(self, 'update_partition_max_concurrency', type='Number',
+            description='(Optional) Maximum number of concurrent Update Partition Lambda invocations the queue scales out to, at most the reserved concurrency of the lambda when one is set',
+            default=profile.max_concurrency,
+            min_value=2,
+            max_value=profile.concurrency_limit
+        )
+
+        glue_max_requests_per_second = cdk.CfnParameter(self, 'glue_max_requests_per_second', type='Number',
+            description='(Optional) Maximum rate of Glue requests of each Update Partition Lambda container, lowered automatically while Glue throttles',
+            default=20,
+            min_value=1,
+            max_value=1000
+        )
+
+        update_partition_upsert = cdk.CfnParameter(self, 'update_partition_upsert', type='String',
+            description='(Optional) Update the partitions that already exist with another location or storage descriptor than the notification, e.g. when a feed is reprocessed',
+            default='false',
+            allowed_values=['true', 'false']
+        )
+
+        dynamodb_prefix_list_id = cdk.CfnParameter(self, 'dynamodb_prefix_list_id', type='String',
+            description='(Optional) Prefix list of the DynamoDB gateway endpoint of the VPC, e.g. pl-b3a742da. Enables the idempotency ledger of the Update Partition Lambda, leave empty to disable it',
+            default=''
+        )
+
         #~~~~~~~~~~~~~~
         # IMPORTS
         #~~~~~~~~~~~~~~
@@ -85,6 +162,13 @@ class UpdatePartitionCdkStack(cdk.Stack):
         # LAMBDA
         #~~~~~~~~~~~~~~
 
+        common_layer = aws_lambda.LayerVersion(self, 'CommonLayer',
+            code=aws_lambda.Code.from_asset('lambda/common'),
+            compatible_runtimes=[profile.runtime],
+            compatible_architectures=[profile.architecture],
+            description='Shared modules for the Update Partition Module Lambda Functions'
+        )
+
         update_partition_lambda_security_group = ec2.SecurityGroup(self, 'UpdatePartitionSG',
             vpc=VpcFromString,
             description='Security Group for the Update Partition Lambda Function',
@@ -103,15 +187,22 @@ class UpdatePartitionCdkStack(cdk.Stack):
         update_partition_lambda = aws_lambda.Function(
             self, 'UpdatePartitionLambda',
             function_name=update_partition_lambda_name.value_as_string,
-            runtime=aws_lambda.Runtime.PYTHON_3_8,
+            runtime=profile.runtime,
+            architectures=[profile.architecture],
             code=aws_lambda.Code.from_asset('lambda/update-partition'),
-            memory_size=1024,
-            timeout=cdk.Duration.seconds(60),
+            memory_size=profile.memory_size,
+            timeout=profile.timeout,
+            reserved_concurrent_executions=profile.reserved_concurrency,
             handler='update-partition.handler',
+            layers=[common_layer],
             security_groups=[update_partition_lambda_security_group],
             role=update_partition_lambda_execution_role,
             environment={
-                'SNS_TOPIC_ARN': sns_notification_topic.value_as_string
+                'SNS_TOPIC_ARN': sns_notification_topic.value_as_string,
+                'MAX_TABLE_CONCURRENCY': update_partition_table_concurrency.value_as_string,
+                'GLUE_MAX_REQUESTS_PER_SECOND': glue_max_requests_per_second.value_as_string,
+                'PARTITION_UPSERT': update_partition_upsert.value_as_string,
+                'PRELOAD_AWS_CLIENTS': 'glue,sns'
             },
             environment_encryption=lambda_kms_key,
             vpc=VpcFromString,
@@ -124,6 +215,9 @@ class UpdatePartitionCdkStack(cdk.Stack):
                 'glue:GetPartitions',
                 'glue:UpdatePartition',
                 'glue:CreatePartition',
+                'glue:BatchCreatePartition',
+                'glue:BatchGetPartition',
+                'glue:BatchUpdatePartition',
                 'sns:Publish'
             ],
             resources=['*']
@@ -147,15 +241,18 @@ class UpdatePartitionCdkStack(cdk.Stack):
         dead_letter_lambda = aws_lambda.Function(
             self, 'DeadLetterLambda',
             function_name=dead_letter_lambda_name.value_as_string,
-            runtime=aws_lambda.Runtime.PYTHON_3_8,
+            runtime=profile.runtime,
+            architectures=[profile.architecture],
             code=aws_lambda.Code.from_asset('lambda/dead-letter'),
-            memory_size=1024,
-            timeout=cdk.Duration.seconds(10),
+            memory_size=profile.dead_letter_memory_size,
+            timeout=profile.dead_letter_timeout,
             handler='dead-letter.handler',
+            layers=[common_layer],
             security_groups=[dead_letter_lambda_security_group],
             role=dead_letter_lambda_execution_role,
             environment={
-                'SNS_TOPIC_ARN': sns_notification_topic.value_as_string
+                'SNS_TOPIC_ARN': sns_notification_topic.value_as_string,
+                'PRELOAD_AWS_CLIENTS': 'sns'
             },
             environment_encryption=lambda_kms_key,
             vpc=VpcFromString,
@@ -187,6 +284,44 @@ class UpdatePartitionCdkStack(cdk.Stack):
 
         update_partition_lambda.add_environment('GLUE_ENDPOINT_DNS', glue_endpoint_dns.value_as_string)
 
+        #~~~~~~~~~~~~~~
+        # IDEMPOTENCY LEDGER
+        #~~~~~~~~~~~~~~
+
+        # Notifications handled by the Update Partition Lambda, so redelivered
+        # copies are acknowledged without another success notification.  The
+        # lambda reaches the table through the DynamoDB gateway endpoint, the
+        # ledger is only enabled when its prefix list is given.
+        idempotency_table = dynamodb.Table(self, 'IdempotencyTable',
+            partition_key=dynamodb.Attribute(name='pk', type=dynamodb.AttributeType.STRING),
+            billing_mode=dynamodb.BillingMode.PAY_PER_REQUEST,
+            time_to_live_attribute='expires_at',
+            encryption=dynamodb.TableEncryption.AWS_MANAGED,
+            removal_policy=cdk.RemovalPolicy.DESTROY
+        )
+        idempotency_table.grant(update_partition_lambda_execution_role,
+            'dynamodb:GetItem', 'dynamodb:PutItem', 'dynamodb:DeleteItem'
+        )
+
+        ledger_enabled = cdk.CfnCondition(self, 'IdempotencyLedgerEnabled',
+            expression=cdk.Fn.condition_not(cdk.Fn.condition_equals(dynamodb_prefix_list_id.value_as_string, ''))
+        )
+        dynamodb_egress = ec2.CfnSecurityGroupEgress(self, 'UpdatePartitionDynamoDbEgress',
+            group_id=update_partition_lambda_security_group.security_group_id,
+            ip_protocol='tcp',
+            from_port=443,
+            to_port=443,
+            destination_prefix_list_id=dynamodb_prefix_list_id.value_as_string,
+            description='Allow outbound 443 to the DynamoDB gateway endpoint'
+        )
+        dynamodb_egress.cfn_options.condition = ledger_enabled
+        update_partition_lambda.add_environment('IDEMPOTENCY_TABLE',
+            cdk.Token.as_string(cdk.Fn.condition_if(ledger_enabled.logical_id, idempotency_table.table_name, ''))
+        )
+        # A claim is held for the function timeout (and a margin), after which
+        # the invocation holding it is gone.
+        update_partition_lambda.add_environment('IDEMPOTENCY_LEASE_SECONDS', str(profile.idempotency_lease_seconds))
+
         #~~~~~~~~~~~~~~
         # SQS KMS
         #~~~~~~~~~~~~~~
@@ -205,24 +340,33 @@ class UpdatePartitionCdkStack(cdk.Stack):
         # SQS
         #~~~~~~~~~~~~~~
 
+        fifo_options = dict(
+            fifo=True,
+            content_based_deduplication=False,
+            deduplication_scope=sqs.DeduplicationScope.MESSAGE_GROUP,
+            fifo_throughput_limit=sqs.FifoThroughputLimit.PER_MESSAGE_GROUP_ID
+        ) if fifo else {}
+        queue_suffix = '.fifo' if fifo else ''
+
         dlqueue = sqs.Queue(self, 'UpdatePartitionDlQueue',
-            queue_name='MVP-Update-Partition-DLQueue',
-            visibility_timeout=cdk.Duration.seconds(120),
+            queue_name='MVP-Update-Partition-DLQueue' + queue_suffix,
+            visibility_timeout=profile.dead_letter_visibility_timeout,
             encryption=sqs.QueueEncryption.KMS,
-            encryption_master_key=sqs_kms_key
-
+            encryption_master_key=sqs_kms_key,
+            **fifo_options
         )
         dlqueue.grant_consume_messages(dead_letter_lambda_execution_role)
         
         queue = sqs.Queue(self, 'UpdatePartitionQueue',
-            queue_name='MVP-Update-Partition-Queue',
-            visibility_timeout=cdk.Duration.seconds(120),
+            queue_name='MVP-Update-Partition-Queue' + queue_suffix,
+            visibility_timeout=profile.visibility_timeout,
             dead_letter_queue=sqs.DeadLetterQueue(
                 max_receive_count=3,
                 queue=dlqueue
             ),
             encryption=sqs.QueueEncryption.KMS,
-            encryption_master_key=sqs_kms_key
+            encryption_master_key=sqs_kms_key,
+            **fifo_options
         )
         queue.grant_consume_messages(update_partition_lambda_execution_role) 
 
@@ -244,12 +388,40 @@ class UpdatePartitionCdkStack(cdk.Stack):
             ))
         )
 
+        # Only file create notifications reach the queue.  The lambda publishes its
+        # own success and failure notifications to the same topic, without the
+        # filter they would come back through the queue as well.  Publishers may
+        # json encode the attribute values, so both forms are allowed.  The
+        # subscription is opt in, deployments that subscribed the queue
+        # themselves would otherwise get a second one on upgrade.
+        subscription = sns.CfnSubscription(self, 'UpdatePartitionQueueSubscription',
+            topic_arn=sns_notification_topic.value_as_string,
+            protocol='sqs',
+            endpoint=queue.queue_arn,
+            filter_policy={
+                'notify_type': ['dih_file_create_success', '"dih_file_create_success"']
+            }
+        )
+        subscription.cfn_options.condition = cdk.CfnCondition(self, 'SubscribeQueueToTopic',
+            expression=cdk.Fn.condition_equals(subscribe_queue_to_topic.value_as_string, 'true')
+        )
+        subscription.add_depends_on(cfn_queue_policy)
+
         update_mapping = aws_lambda.EventSourceMapping(self, 'UpdatePartitionLambdaEvtSrc',
             target=update_partition_lambda,
-            batch_size=1,
+            batch_size=update_partition_batch_size.value_as_number,
+            # Batching windows are not supported on FIFO queues.
+            max_batching_window=None if fifo else cdk.Duration.seconds(update_partition_batching_window.value_as_number),
+            report_batch_item_failures=True,
             enabled=True,
             event_source_arn=queue.queue_arn
         )
+        # Caps the invocations the queue scales out to, so the Glue request rate
+        # stays at what Glue sustains instead of throttling on every backlog.
+        # Not exposed by EventSourceMapping in CDK v1.
+        update_mapping.node.default_child.add_property_override(
+            'ScalingConfig.MaximumConcurrency', update_partition_max_concurrency.value_as_number
+        )
 
         dead_letter_mapping = aws_lambda.EventSourceMapping(self, 'DeadLetterLambdaEvtSrc',
             target=dead_letter_lambda,
@@ -0,0 +1,125 @@
+# Copy of update-partition-cdk-last/lambda/common/python/aws_clients.py, the canonical
+# module: change that one and copy it here (tests/unit/test_common_modules.py
+# fails while the two differ).
+"""
+Registry of tuned AWS clients shared by the lambda handlers.
+
+Clients are created lazily, once per container, and reused by every
+invocation so the TLS session to the (VPC endpoint) service stays open.  When
+an endpoint DNS name is set for the service in the environment, e.g.
+GLUE_ENDPOINT_DNS, the client is pointed at it.  The value may be a plain DNS
+name or the "<hosted zone id>:<dns name>" form returned by the DnsEntries
+attribute of an AWS::EC2::VPCEndpoint.
+
+The botocore configuration is read from the environment:
+
+AWS_CLIENT_MAX_POOL_CONNECTIONS : size of the connection pool per client (10)
+AWS_CLIENT_CONNECT_TIMEOUT      : connect timeout in seconds (5)
+AWS_CLIENT_READ_TIMEOUT         : read timeout in seconds (30)
+AWS_CLIENT_TCP_KEEPALIVE        : enable TCP keep-alive on the sockets (true)
+AWS_CLIENT_RETRY_MODE           : botocore retry mode (adaptive)
+AWS_CLIENT_MAX_ATTEMPTS         : maximum attempts including the first call (5)
+
+The retry settings can be set for a single service as well, e.g.
+GLUE_CLIENT_RETRY_MODE and GLUE_CLIENT_MAX_ATTEMPTS for a service whose calls
+are retried by the caller.
+
+To keep cold starts short the clients are built from a single botocore session
+rather than through boto3, so boto3 (and its resource layer) is never imported,
+and botocore itself is only imported when the first client is requested.
+Setting PRELOAD_AWS_CLIENTS to a comma separated list of services, e.g.
+"glue,sns", creates those clients during the init phase instead of in the
+first invocation.
+"""
+
+import os
+import threading
+
+_clients = {}
+_clients_lock = threading.Lock()
+_session = None
+
+
+def retry_setting(service: str, name: str, default: str) -> str:
+    """Return the retry setting of the service, or the one shared by every client."""
+    value = os.environ.get(f'{service.upper()}_CLIENT_{name}') if service else None
+    return value or os.environ.get(f'AWS_CLIENT_{name}', default)
+
+
+def client_config(service: str = None):
+    """Build the botocore Config used for the clients of the service."""
+    from botocore.config import Config
+
+    options = {
+        'max_pool_connections': int(os.environ.get('AWS_CLIENT_MAX_POOL_CONNECTIONS', '10')),
+        'connect_timeout': float(os.environ.get('AWS_CLIENT_CONNECT_TIMEOUT', '5')),
+        'read_timeout': float(os.environ.get('AWS_CLIENT_READ_TIMEOUT', '30')),
+        'retries': {
+            'mode': retry_setting(service, 'RETRY_MODE', 'adaptive'),
+            'max_attempts': int(retry_setting(service, 'MAX_ATTEMPTS', '5'))
+        }
+    }
+    try:
+        return Config(
+            tcp_keepalive=os.environ.get('AWS_CLIENT_TCP_KEEPALIVE', 'true').lower() == 'true',
+            **options
+        )
+    except TypeError:
+        # botocore bundled with older runtimes predates the tcp_keepalive option
+        return Config(**options)
+
+
+def endpoint_url(service: str, region: str = None):
+    """Return the VPC endpoint url configured for the service, if any.  The
+    endpoint is regional, so it is only used for clients in the lambda's own
+    region."""
+    if region and region != os.environ.get('AWS_REGION', region):
+        return None
+    endpoint_dns = os.environ.get(f'{service.upper()}_ENDPOINT_DNS')
+    if not endpoint_dns:
+        return None
+    return f"https://{endpoint_dns.split(':')[-1]}"
+
+
+def _key(service: str, region: str = None) -> tuple:
+    return (service, region or os.environ.get('AWS_REGION'))
+
+
+def get_client(service: str, region: str = None):
+    """Return the client for the service and region, creating it on first use."""
+    global _session
+
+    key = _key(service, region)
+    with _clients_lock:
+        client = _clients.get(key)
+        if client is None:
+            if _session is None:
+                import botocore.session
+                _session = botocore.session.get_session()
+
+            client = _clients[key] = _session.create_client(
+                service,
+                region_name=key[1],
+                endpoint_url=endpoint_url(service, key[1]),
+                config=client_config(service)
+            )
+        return client
+
+
+def preload(services: str = None):
+    """Create the clients named in PRELOAD_AWS_CLIENTS (or services) up front."""
+    services = os.environ.get('PRELOAD_AWS_CLIENTS', '') if services is None else services
+    for service in filter(None, (name.strip() for name in services.split(','))):
+        get_client(service)
+
+
+def register_client(service: str, client, region: str = None):
+    """Install a client for the service, e.g. a stubbed client in tests."""
+    with _clients_lock:
+        _clients[_key(service, region)] = client
+
+
+def reset():
+    """Forget every client, the next get_client call creates a new one."""
+    with _clients_lock:
+        _clients.clear()
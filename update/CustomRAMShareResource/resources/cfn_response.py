@@ -0,0 +1,144 @@
+"""
+CloudFormation custom resource response sender.
+
+The response is PUT to the presigned ResponseURL of the request with connect
+and read timeouts, and retried with exponential backoff on connection errors,
+throttling and server errors, for as long as the function has time left.  A
+response that never arrives leaves the stack waiting for the custom resource
+timeout (one hour), so the sender tries hard but never blocks past the
+function deadline.
+
+CloudFormation rejects responses larger than 4096 bytes.  Data is compacted
+until the response fits: long lists are cut to a few items next to a
+<key>Count with their length, then replaced by the count alone, and in the
+last resort the numbers of the nested objects are summed into totals.
+
+CFN_RESPONSE_CONNECT_TIMEOUT : seconds (5)
+CFN_RESPONSE_READ_TIMEOUT    : seconds (10)
+CFN_RESPONSE_ATTEMPTS        : attempts before giving up (6)
+"""
+
+import json
+import os
+import time
+
+import urllib3
+
+from structured_log import StructuredLogger
+
+log = StructuredLogger('deploy.cf.response')
+
+SUCCESS = "SUCCESS"
+FAILED = "FAILED"
+
+# CloudFormation rejects responses over 4096 bytes.
+RESPONSE_LIMIT_BYTES = 4096
+
+CONNECT_TIMEOUT = float(os.environ.get('CFN_RESPONSE_CONNECT_TIMEOUT', '5'))
+READ_TIMEOUT = float(os.environ.get('CFN_RESPONSE_READ_TIMEOUT', '10'))
+ATTEMPTS = int(os.environ.get('CFN_RESPONSE_ATTEMPTS', '6'))
+BACKOFF_SECONDS = 1
+MAX_BACKOFF_SECONDS = 20
+MAX_REASON_LENGTH = 1024
+
+http = urllib3.PoolManager(timeout=urllib3.Timeout(connect=CONNECT_TIMEOUT, read=READ_TIMEOUT), retries=False)
+
+
+def _shrink(value, max_items):
+    """Copy the value with the lists cut to max_items (None keeps them whole)
+    and the long strings cut short."""
+    if isinstance(value, dict):
+        shrunk = {}
+        for key, item in value.items():
+            if isinstance(item, list) and max_items is not None and len(item) > max_items:
+                if max_items:
+                    shrunk[key] = [_shrink(i, max_items) for i in item[:max_items]]
+                shrunk['{}Count'.format(key)] = len(item)
+            else:
+                shrunk[key] = _shrink(item, max_items)
+        return shrunk
+    if isinstance(value, list):
+        return [_shrink(item, max_items) for item in value]
+    if isinstance(value, str) and max_items is not None and len(value) > 256:
+        return value[:253] + '...'
+    return value
+
+
+def _totals(value, totals: dict) -> dict:
+    """Sum the numbers, and the lengths of the lists, of the nested objects by key."""
+    if isinstance(value, dict):
+        for key, item in value.items():
+            if isinstance(item, bool):
+                continue
+            if isinstance(item, (int, float)):
+                totals[key] = totals.get(key, 0) + item
+            elif isinstance(item, list):
+                count_key = '{}Count'.format(key)
+                totals[count_key] = totals.get(count_key, 0) + len(item)
+            else:
+                _totals(item, totals)
+    return totals
+
+
+def compact(data: dict, size) -> dict:
+    """Return the largest form of data for which size(data) fits the response limit."""
+    for max_items in (None, 10, 3, 0):
+        candidate = _shrink(data or {}, max_items)
+        if size(candidate) <= RESPONSE_LIMIT_BYTES:
+            return candidate
+    candidate = dict(_totals(data or {}, {}), Compacted=True)
+    if size(candidate) <= RESPONSE_LIMIT_BYTES:
+        return candidate
+    return {'Compacted': True}
+
+
+def response_body(event: dict, context, status: str, data: dict, physical_resource_id: str = None,
+                  no_echo: bool = False, reason: str = None) -> str:
+    body = {
+        'Status': status,
+        'Reason': (reason or "See the details in CloudWatch Log Stream: {}".format(context.log_stream_name))[:MAX_REASON_LENGTH],
+        'PhysicalResourceId': physical_resource_id or context.log_stream_name,
+        'StackId': event['StackId'],
+        'RequestId': event['RequestId'],
+        'LogicalResourceId': event['LogicalResourceId'],
+        'NoEcho': no_echo,
+        'Data': {},
+    }
+    body['Data'] = compact(data, lambda candidate: len(json.dumps(dict(body, Data=candidate))))
+    if body['Data'] != data:
+        log.warning("Response data compacted to fit the CloudFormation limit.", size=len(json.dumps(data)))
+    return json.dumps(body)
+
+
+def send(event: dict, context, status: str, data: dict, physical_resource_id: str = None,
+         no_echo: bool = False, reason: str = None) -> bool:
+    """PUT the response to the ResponseURL of the event, return True once CloudFormation accepted it."""
+    body = response_body(event, context, status, data, physical_resource_id, no_echo, reason)
+    log.payload("Response body", lambda: body, status=status, size=len(body))
+    headers = {'content-type': '', 'content-length': str(len(body))}
+
+    remaining = getattr(context, 'get_remaining_time_in_millis', None)
+    deadline = time.monotonic() + remaining() / 1000 - 1 if remaining else None
+
+    for attempt in range(1, ATTEMPTS + 1):
+        try:
+            response = http.request('PUT', event['ResponseURL'], headers=headers, body=body)
+        except Exception as e:
+            log.warning("Response not sent.", attempt=attempt, error=repr(e))
+        else:
+            if response.status < 300:
+                log.info("Response sent", status_code=response.status, attempt=attempt)
+                return True
+            log.warning("Response rejected.", attempt=attempt, status_code=response.status)
+            # The presigned url does not get any better, only throttling and
+            # server errors are retried.
+            if response.status < 500 and response.status != 429:
+                break
+
+        delay = min(MAX_BACKOFF_SECONDS, BACKOFF_SECONDS * 2 ** (attempt - 1))
+        if attempt == ATTEMPTS or (deadline is not None and time.monotonic() + delay + CONNECT_TIMEOUT > deadline):
+            break
+        time.sleep(delay)
+
+    log.error("Unable to send the response to CloudFormation.", status=status)
+    return False
@@ -1,15 +1,20 @@
 from __future__ import print_function
+import os
 import json
-import boto3
-import botocore
-import sys
-import uuid
-import logging
-import urllib3
+import time
 
-http = urllib3.PoolManager()
-SUCCESS = "SUCCESS"
-FAILED = "FAILED"
+import cfn_response
+import lf_permissions
+import table_selectors
+from structured_log import StructuredLogger
+
+# Every grant worker gets a connection of its own from the client pool.
+os.environ.setdefault('AWS_CLIENT_MAX_POOL_CONNECTIONS', str(max(10, lf_permissions.MAX_WORKERS)))
+
+import aws_clients
+
+SUCCESS = cfn_response.SUCCESS
+FAILED = cfn_response.FAILED
 
 
 """
@@ -25,13 +30,16 @@ event:
 This lambda function takes the following parameter as input and then grants
 the lakeformation read access on the database and table list which is passed
 as the input parameters as mentioned below. 
-1. database_name       : (Mandatory) Glue Database name, which needs to be shared with
-                         the consumer AWS account. This lambda will grant the DESCRIBE
-                         access through lakeformation to the consumer AWS account.
+1. database_name       : (Mandatory) Glue Database name, or list of names, which needs
+                         to be shared with the consumer AWS account. This lambda will
+                         grant the DESCRIBE access through lakeformation to the consumer
+                         AWS account.
 2. table_name_list     : (Mandatory) List of the tables which needs to be shared with
-                         the consumer AWS account. This lambda will grant the ALL
-                         access through lakeformation to the consumer AWS account.
-3. external_account    : (Mandatory) AWS account number for the producer or consumer.
+                         the consumer AWS account from every database, or a map of
+                         database name to its list of tables. This lambda will grant
+                         the ALL access through lakeformation to the consumer AWS account.
+3. external_account    : (Mandatory) AWS account number, or list of account numbers, for
+                         the producer or consumer.
 4. RequestType         : (Mandatory) This parameter specifies what type of LF grant 
                          operation needs to be performed on the passed database and
                          table list. If its value is passed as Delete then the LF will
@@ -39,10 +47,32 @@ as the input parameters as mentioned below.
                          passed database and tables. When this lambda is invoked from
                          the CF stack as custom resource, then CF will pass this paramter 
                          in its input event with the CF stack activity type (Create/Delete)
+5. incremental         : (Optional) Defaults to true. The permissions the external account
+                         already holds are read with list_permissions and only the missing
+                         grants are sent. Pass false to grant (or revoke) every table on
+                         each invocation.
+6. allow_partial       : (Optional) Defaults to false. A CF request whose table grants
+                         still fail after the retries is answered FAILED, with the number
+                         of failed tables in the reason. Pass true to answer SUCCESS and
+                         only report them in the Failed lists of the summary.
+
+The entries of table_name_list can also be glob patterns ("sales_*"), regular
+expressions ("re:^sales_[0-9]+$") resolved against the tables of the database,
+or "*" for all the tables of the database with a single wildcard grant that
+also covers the tables created later (see table_selectors.py).
+
+On a CF Update the tables removed from table_name_list are revoked, as are the
+accounts and databases removed from the input.
+
+The account x database x table matrix is granted concurrently in a single
+invocation and the result is summarized per account:
+{"12345678900": {"Granted": 2, "Revoked": 0, "Unchanged": 0, "Failed": []}}
 
 Based on the input event parameters, This lambda will grant the DESCRIBE access 
 on the Glue database to consumer AWS account. Then it will grant the ALL access
-to the tables passed as list to the consumer AWS account. 
+to the tables passed as list to the consumer AWS account. The table grants are
+sent in chunks of 20 entries by a bounded number of concurrent workers, failed
+entries are retried on their own (see lf_permissions.py).
 
 Below example shows a sample test event input for this lambda function:
 {
@@ -85,72 +115,92 @@ and resource link needs to be created for the shared tables.
 """
 
 
-log = logging.getLogger('deploy.cf.create_or_update')
+log = StructuredLogger('deploy.cf.create_or_update')
 
-def lambda_handler(event, context):
-    
-    batch_grant_permissions=""
-    Table_Bulk_Entries=[]
-    print("starting custom LF grants")
-    try:
-        if "StackId" in event:
-            
-            input_event=event['ResourceProperties']['Input']
-            log.info("Cloudformation custom resource inovcation")
-        else:
-            input_event=event
-            log.info("Custom resource direct lambda inovcation")
-    
-        log.info(input_event)
+# Time kept back from the function timeout to send the response to CloudFormation.
+RESPONSE_MARGIN_SECONDS = 30
 
-        if "external_account" in input_event and input_event["external_account"]:
-            external_account=input_event['external_account']
-        
-        if "database_name" in input_event and input_event['database_name']:
-            database_name=input_event['database_name']
-    
-        if "table_name_list" in input_event and input_event['table_name_list']:
-            table_name_list=input_event['table_name_list']
-            
-        database_details={
-            'Name' : database_name
-        }
-        
-        for table_name in table_name_list:
-            table_entry={
-                'Id': str(uuid.uuid4()),
-                'Principal': {
-                        'DataLakePrincipalIdentifier': external_account
-                    },
-                'Resource': {
-                    'Table': {
-                        'Name' : table_name,
-                        'DatabaseName' : database_name
-                        }
-                },
-                'Permissions': ['ALL'],
-                'PermissionsWithGrantOption': ['ALL']
-                }
-            Table_Bulk_Entries.append(table_entry)
-        
-        
-        client = boto3.client('lakeformation')
-    
-        log.info("Starting custom lakeformation access grants to account:" + external_account
-        + " for database:" + database_name + " and the tables:" + str(table_name_list))
-        
-    
-        if event["RequestType"] == "Delete":
-            
-            #batch_grant_permissions={"Status":"Skipping for Delete request"}
-            log.info("Revoking the existing access grnats on tables:"+ str(table_name_list) + " to account:" + external_account)
-            batch_grant_permissions = client.batch_revoke_permissions(
-                Entries=Table_Bulk_Entries
-                )
-            log.info(batch_grant_permissions)
-            log.info("Tables access grant reovked successfully.")
-            
-            log.info("Revoking the existing access grnats on database:"+ database_name + " to account:" + external_account)
+# Table names of the databases, used to resolve the table patterns.
+table_names = table_selectors.TableNameCache(
+    lambda: aws_clients.get_client('glue'),
+    ttl_seconds=float(os.environ.get('TABLE_NAME_CACHE_TTL_SECONDS', '300'))
+)
+
+def retry_deadline(context):
+    """Return the time.monotonic() value after which failed entries are no longer retried."""
+    if context is None or not hasattr(context, 'get_remaining_time_in_millis'):
+        return None
+    return time.monotonic() + context.get_remaining_time_in_millis() / 1000 - RESPONSE_MARGIN_SECONDS
+
+def as_list(value) -> list:
+    if not value:
+        return []
+    return [value] if isinstance(value, str) else list(value)
+
+def share_matrix(input_event: dict) -> dict:
+    """Expand the input into {(account, database): [tables]}.  external_account and
+    database_name take a single value or a list, table_name_list is either the
+    list of tables shared from every database or a map of database to tables."""
+    table_name_list = input_event.get('table_name_list') or []
+    matrix = {}
+    for external_account in as_list(input_event.get('external_account')):
+        for database_name in as_list(input_event.get('database_name')):
+            if isinstance(table_name_list, dict):
+                matrix[(external_account, database_name)] = as_list(table_name_list.get(database_name))
+            else:
+                matrix[(external_account, database_name)] = as_list(table_name_list)
+    return matrix
+
+def apply_share(client, request_type, external_account, database_name, table_name_list, old_table_name_list=None,
+                incremental=True, workers=None, deadline=None) -> dict:
+    """Grant (Create/Update) or revoke (Delete) the database and tables of one
+    account and database, return the counts and the tables that failed.  On an
+    Update the tables of old_table_name_list that are no longer listed are revoked."""
+    database_details={
+        'Name' : database_name
+    }
+
+    current = None
+    if incremental:
+        try:
+            current = lf_permissions.current_permissions(client, external_account, database_name)
+        except Exception as ex:
+            log.warning("Unable to list the current lakeformation permissions, granting everything.",
+                account=external_account, database=database_name, error=repr(ex))
+
+    # Patterns match the tables of the catalog and, for revokes, the tables
+    # the account holds grants on that may no longer be in the catalog.
+    names = lambda: table_names.table_names(database_name) + (list(current['tables']) if current else [])
+    table_name_list = table_selectors.resolve(table_name_list, names)
+    old_table_name_list = table_selectors.resolve(old_table_name_list, names)
+
+    log.info("Starting custom lakeformation access grants", request_type=request_type, account=external_account,
+        database=database_name, tables=len(table_name_list), incremental=current is not None)
+
+    if request_type == "Delete":
+        revoke_tables = [t for t in table_name_list if current is None or t in current['tables']]
+        grant_tables = []
+    else:
+        removed = [t for t in old_table_name_list or [] if t not in table_name_list]
+        revoke_tables = [t for t in removed if current is None or t in current['tables']]
+        grant_tables = [t for t in table_name_list
+                        if current is None or not lf_permissions.holds(current['tables'].get(t, (set(), set())), 'ALL')]
+
+    failures = []
+
+    def revoke():
+        revoked = lf_permissions.batch_permissions(
+            client, 'revoke', lf_permissions.table_entries(external_account, database_name, revoke_tables),
+            workers=workers, deadline=deadline
+            )
+        failures.extend(revoked['Failures'])
+        log.payload("Tables access grant revoked", lambda: revoked, account=external_account,
+            database=database_name, tables=len(revoke_tables), failures=len(revoked['Failures']))
+
+    if request_type == "Delete":
+        if revoke_tables:
+            revoke()
+        if current is None or current['database'][0]:
             database_grant_response = client.revoke_permissions(Principal={
                 'DataLakePrincipalIdentifier': external_account
                 },
@@ -160,11 +210,11 @@ def lambda_handler(event, context):
                 Permissions=['DESCRIBE'],
                 PermissionsWithGrantOption=['DESCRIBE',]
                 )
-            log.info(database_grant_response)
-            log.info("Database access grant reovked successfully.")
-            
-        else:
-            log.info("Granting access on database:"+ database_name + " to account:" + external_account)
+            log.payload("Database access grant revoked", lambda: database_grant_response,
+                account=external_account, database=database_name)
+
+    else:
+        if current is None or not lf_permissions.holds(current['database'], 'DESCRIBE'):
             database_grant_response = client.grant_permissions(Principal={
                 'DataLakePrincipalIdentifier': external_account
                 },
@@ -174,27 +224,121 @@ def lambda_handler(event, context):
                 Permissions=['DESCRIBE'],
                 PermissionsWithGrantOption=['DESCRIBE',]
                 )
-            log.info(database_grant_response)
-            log.info("Database grant completed successfully.")
+            log.payload("Database grant completed", lambda: database_grant_response,
+                account=external_account, database=database_name)
 
-            log.info("Granting access on Tables:"+ str(table_name) + " to account:" + external_account)
-            batch_grant_permissions = client.batch_grant_permissions(
-                Entries=Table_Bulk_Entries
+        if grant_tables:
+            granted = lf_permissions.batch_permissions(
+                client, 'grant', lf_permissions.table_entries(external_account, database_name, grant_tables),
+                workers=workers, deadline=deadline
                 )
+            failures.extend(granted['Failures'])
+            log.payload("Tables access granted", lambda: granted, account=external_account,
+                database=database_name, tables=len(grant_tables), failures=len(granted['Failures']))
+
+        # Tables are revoked after the grants, so replacing table names by a
+        # pattern or by all tables does not leave a gap in the access.
+        if revoke_tables:
+            revoke()
+
+    return {
+        'Granted': len(grant_tables),
+        'Revoked': len(revoke_tables),
+        'Unchanged': len(table_name_list) - len(grant_tables) if request_type != "Delete" else 0,
+        'Failed': ['{}.{}'.format(database_name, lf_permissions.table_name(f['RequestEntry']['Resource'])) for f in failures],
+    }
+
+def lambda_handler(event, context):
+    
+    batch_grant_permissions=""
+    physical_resource_id=event.get("PhysicalResourceId")
+    try:
+        if "StackId" in event:
+            
+            input_event=event['ResourceProperties']['Input']
+            log.info("Cloudformation custom resource invocation", request_type=event.get("RequestType"))
+        else:
+            input_event=event
+            log.info("Custom resource direct lambda invocation", request_type=event.get("RequestType"))
     
-            log.info(batch_grant_permissions)
+        log.payload("Input event", lambda: input_event)
+
+        matrix = share_matrix(input_event)
+        if not matrix or not all(matrix.values()):
+            raise ValueError("external_account, database_name and table_name_list are mandatory.")
+
+        # CloudFormation passes every property as a string.
+        incremental = str(input_event.get('incremental', True)).lower() != 'false'
+        allow_partial = str(input_event.get('allow_partial', False)).lower() == 'true'
+
+        # Updates keep the physical id and are applied as a diff over the
+        # (account, database) pairs: the tables no longer listed for a pair are
+        # revoked, and so are the pairs no longer in the input.
+        old_matrix = share_matrix((event.get('OldResourceProperties') or {}).get('Input') or {})
+        shares = [(event["RequestType"], key, tables, old_matrix.get(key)) for key, tables in matrix.items()]
+        if event["RequestType"] == "Update":
+            shares.extend(("Delete", key, tables, None) for key, tables in old_matrix.items() if key not in matrix)
+
+        if event["RequestType"] in ("Update", "Delete") and event.get('PhysicalResourceId'):
+            physical_resource_id = event['PhysicalResourceId']
+        else:
+            accounts = sorted({account for account, database in matrix})
+            databases = sorted({database for account, database in matrix})
+            physical_resource_id = '{}:{}'.format(','.join(accounts), ','.join(databases))
+
+        client = aws_clients.get_client('lakeformation')
+
+        # The shares run concurrently and split the grant workers between them.
+        share_workers = max(1, min(lf_permissions.MAX_WORKERS, len(shares)))
+        entry_workers = max(1, lf_permissions.MAX_WORKERS // share_workers)
+        deadline = retry_deadline(context)
+
+        def run(share):
+            request_type, (external_account, database_name), tables, old_tables = share
+            return apply_share(client, request_type, external_account, database_name, tables, old_tables,
+                               incremental=incremental, workers=entry_workers, deadline=deadline)
+
+        from concurrent.futures import ThreadPoolExecutor
+
+        with ThreadPoolExecutor(max_workers=share_workers) as executor:
+            futures = [(share, executor.submit(run, share)) for share in shares]
+
+        batch_grant_permissions = {}
+        errors = []
+        for (request_type, (external_account, database_name), tables, old_tables), future in futures:
+            summary = batch_grant_permissions.setdefault(
+                external_account, {'Granted': 0, 'Revoked': 0, 'Unchanged': 0, 'Failed': []})
+            try:
+                result = future.result()
+            except Exception as ex:
+                log.error("Lakeformation grants failed.", exc=ex, account=external_account, database=database_name)
+                errors.append('{} {}: {}'.format(external_account, database_name, ex))
+                continue
+            for key in ('Granted', 'Revoked', 'Unchanged'):
+                summary[key] += result[key]
+            summary['Failed'].extend(result['Failed'])
+
+        log.payload("Lakeformation access grants completed", lambda: batch_grant_permissions,
+            accounts=len(batch_grant_permissions), shares=len(shares), errors=len(errors))
+        if errors:
+            raise RuntimeError('; '.join(errors))
     except Exception as ex:
-        log.error("Glue database and table lakeformation grants failed.")
+        log.error("Glue database and table lakeformation grants failed.", exc=ex)
         if "StackId" in event:
-            print(ex)
-            send(event, context, FAILED, {"ERROR" : str(ex) } )
+            send(event, context, FAILED, {"ERROR" : str(ex) }, physical_resource_id,
+                reason="{} See the details in CloudWatch Log Stream: {}".format(ex, context.log_stream_name))
             return;
-        log.info("Exiting with excpetion.")
-        log.error(ex)
         raise ex
     
     if "StackId" in event:
-        send(event, context, SUCCESS, batch_grant_permissions)
+        failed = [table for summary in batch_grant_permissions.values() for table in summary['Failed']]
+        if failed and not allow_partial:
+            # The stack must not report a share it only partly applied.
+            send(event, context, FAILED, batch_grant_permissions, physical_resource_id,
+                reason="{} table permissions failed ({}{}). See the details in CloudWatch Log Stream: {}".format(
+                    len(failed), ', '.join(failed[:5]), ', ...' if len(failed) > 5 else '', context.log_stream_name))
+            return;
+        send(event, context, SUCCESS, batch_grant_permissions, physical_resource_id)
         return;
     else:
         return {
@@ -203,36 +347,4 @@ def lambda_handler(event, context):
         }
 
 def send(event, context, responseStatus, responseData, physicalResourceId=None, noEcho=False, reason=None):
-    responseUrl = event['ResponseURL']
-
-    print(responseUrl)
-
-    responseBody = {
-        'Status' : responseStatus,
-        'Reason' : reason or "See the details in CloudWatch Log Stream: {}".format(context.log_stream_name),
-        'PhysicalResourceId' : physicalResourceId or context.log_stream_name,
-        'StackId' : event['StackId'],
-        'RequestId' : event['RequestId'],
-        'LogicalResourceId' : event['LogicalResourceId'],
-        'NoEcho' : noEcho,
-        'Data' : responseData
-    }
-
-    json_responseBody = json.dumps(responseBody)
-
-    print("Response body:")
-    print(json_responseBody)
-
-    headers = {
-        'content-type' : '',
-        'content-length' : str(len(json_responseBody))
-    }
-
-    try:
-        response = http.request('PUT', responseUrl, headers=headers, body=json_responseBody)
-        print("Status code:", response.status)
-
-
-    except Exception as e:
-
-        print("send(..) failed executing http.request(..):", e)
\ No newline at end of file
+    return cfn_response.send(event, context, responseStatus, responseData, physicalResourceId, noEcho, reason)
@@ -0,0 +1,175 @@
+"""
+Chunked, concurrent Lake Formation batch grants and revokes.
+
+BatchGrantPermissions and BatchRevokePermissions accept at most 20 entries per
+request, so the table entries of a share are split into chunks of 20 that are
+sent by a bounded pool of workers.  Entries reported in the Failures of a
+response (or every entry of a request that raised) are retried on their own,
+with exponential backoff, until they succeed, fail with an error a retry
+cannot fix or the deadline passes.
+
+current_permissions() reads what a principal already holds on a database and
+its tables with paginated list_permissions, so the grants can be limited to
+what is missing.
+
+LF_MAX_WORKERS      : batch requests in flight (8)
+LF_MAX_ATTEMPTS     : attempts per failed entry (5)
+LF_BACKOFF_SECONDS  : base of the exponential backoff between attempts (0.5)
+"""
+
+import os
+import random
+import time
+import uuid
+
+from structured_log import StructuredLogger
+
+log = StructuredLogger('deploy.cf.lf_permissions')
+
+# Table name standing for all the tables of a database (TableWildcard).
+ALL_TABLES = '*'
+
+# Lake Formation accepts at most 20 entries per batch grant/revoke request.
+BATCH_ENTRIES_LIMIT = 20
+
+MAX_WORKERS = int(os.environ.get('LF_MAX_WORKERS', '8'))
+MAX_ATTEMPTS = int(os.environ.get('LF_MAX_ATTEMPTS', '5'))
+BACKOFF_SECONDS = float(os.environ.get('LF_BACKOFF_SECONDS', '0.5'))
+
+# Error codes that a retry of the same entry cannot fix.
+PERMANENT_ERROR_CODES = ('InvalidInputException', 'EntityNotFoundException', 'AccessDeniedException')
+
+
+def error_code(e: Exception) -> str:
+    """Return the AWS error code of a botocore exception, or the exception name."""
+    response = getattr(e, 'response', None) or {}
+    return response.get('Error', {}).get('Code') or type(e).__name__
+
+
+def chunks(entries: list, size: int = BATCH_ENTRIES_LIMIT):
+    for start in range(0, len(entries), size):
+        yield entries[start:start + size]
+
+
+def send_chunk(client, action: str, chunk: list) -> list:
+    """Send one batch request and return its Failures."""
+    try:
+        response = getattr(client, 'batch_{}_permissions'.format(action))(Entries=chunk)
+    except Exception as e:
+        log.warning('Lake Formation batch request failed.', action=action, entries=len(chunk), error=repr(e))
+        return [{'RequestEntry': entry, 'Error': {'ErrorCode': error_code(e), 'ErrorMessage': str(e)}} for entry in chunk]
+    return response.get('Failures', [])
+
+
+def retry_entry(client, action: str, failure: dict, deadline: float = None) -> dict:
+    """Retry a failed entry on its own with backoff, return None once it succeeds
+    or the last failure."""
+    entry = failure['RequestEntry']
+    for attempt in range(1, MAX_ATTEMPTS):
+        if failure['Error'].get('ErrorCode') in PERMANENT_ERROR_CODES:
+            break
+        delay = BACKOFF_SECONDS * 2 ** (attempt - 1) * (0.5 + random.random() / 2)
+        if deadline is not None and time.monotonic() + delay > deadline:
+            break
+        time.sleep(delay)
+        try:
+            getattr(client, '{}_permissions'.format(action))(
+                **{key: value for key, value in entry.items() if key != 'Id'}
+            )
+            return None
+        except Exception as e:
+            failure = {'RequestEntry': entry, 'Error': {'ErrorCode': error_code(e), 'ErrorMessage': str(e)}}
+    log.error('Lake Formation entry failed.', action=action, entry=entry.get('Id'), resource=entry.get('Resource'),
+              code=failure['Error'].get('ErrorCode'), reason=failure['Error'].get('ErrorMessage'))
+    return failure
+
+
+def batch_permissions(client, action: str, entries: list, workers: int = None, deadline: float = None) -> dict:
+    """Grant or revoke (action) the entries in chunks, retry the failed entries
+    and return a response shaped like the batch API response, with the entries
+    that still failed in Failures.  The deadline is a time.monotonic() value
+    after which failed entries are no longer retried."""
+    workers = max(1, min(workers or MAX_WORKERS, (len(entries) + BATCH_ENTRIES_LIMIT - 1) // BATCH_ENTRIES_LIMIT))
+    if workers > 1:
+        from concurrent.futures import ThreadPoolExecutor
+
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            failures = [f for chunk_failures in executor.map(lambda chunk: send_chunk(client, action, chunk), chunks(entries))
+                        for f in chunk_failures]
+            if failures:
+                log.info('Retrying failed Lake Formation entries.', action=action, entries=len(failures))
+            failures = [f for f in executor.map(lambda f: retry_entry(client, action, f, deadline), failures) if f]
+    else:
+        failures = [f for chunk in chunks(entries) for f in send_chunk(client, action, chunk)]
+        failures = [f for f in (retry_entry(client, action, f, deadline) for f in failures) if f]
+
+    log.info('Lake Formation batch {} completed.'.format(action), entries=len(entries), failed=len(failures))
+    return {'Failures': failures}
+
+
+def table_resource(database_name: str, table_name: str) -> dict:
+    """Return the Table resource of a table, or of all the tables (TableWildcard) for '*'."""
+    if table_name == ALL_TABLES:
+        return {'Table': {'DatabaseName': database_name, 'TableWildcard': {}}}
+    return {'Table': {'Name': table_name, 'DatabaseName': database_name}}
+
+
+def table_name(resource: dict) -> str:
+    """Return the table name of a Table resource, '*' for a TableWildcard."""
+    table = resource.get('Table', {})
+    return ALL_TABLES if 'TableWildcard' in table else table.get('Name')
+
+
+def table_entries(principal: str, database_name: str, table_names) -> list:
+    """Build the batch entries granting (or revoking) ALL, with grant option, on the tables."""
+    return [
+        {
+            'Id': str(uuid.uuid4()),
+            'Principal': {'DataLakePrincipalIdentifier': principal},
+            'Resource': table_resource(database_name, table_name),
+            'Permissions': ['ALL'],
+            'PermissionsWithGrantOption': ['ALL'],
+        }
+        for table_name in table_names
+    ]
+
+
+def list_permissions(client, principal: str, resource_type: str, resource: dict = None) -> list:
+    """Return the permissions the principal holds on resources of the type, using
+    paginated list_permissions, only those on the resource when one is given."""
+    kwargs = {'Principal': {'DataLakePrincipalIdentifier': principal}, 'ResourceType': resource_type}
+    if resource is not None:
+        kwargs['Resource'] = resource
+    permissions = []
+    while True:
+        response = client.list_permissions(**kwargs)
+        permissions.extend(response.get('PrincipalResourcePermissions', []))
+        if not response.get('NextToken'):
+            return permissions
+        kwargs['NextToken'] = response['NextToken']
+
+
+def current_permissions(client, principal: str, database_name: str) -> dict:
+    """Return the permissions the principal holds on the database and its tables as
+    {'database': (permissions, grantable), 'tables': {name: (permissions, grantable)}}."""
+    current = {'database': (set(), set()), 'tables': {}}
+    # Scoped to the database, the principal may hold grants on many others.
+    scopes = (('DATABASE', {'Database': {'Name': database_name}}), ('TABLE', table_resource(database_name, ALL_TABLES)))
+    for resource_type, resource in scopes:
+        for permission in list_permissions(client, principal, resource_type, resource):
+            resource = permission.get('Resource', {})
+            held = (set(permission.get('Permissions', [])), set(permission.get('PermissionsWithGrantOption', [])))
+            if resource_type == 'DATABASE' and resource.get('Database', {}).get('Name') == database_name:
+                current['database'][0].update(held[0])
+                current['database'][1].update(held[1])
+            elif resource_type == 'TABLE' and resource.get('Table', {}).get('DatabaseName') == database_name \
+                    and table_name(resource):
+                permissions, grantable = current['tables'].setdefault(table_name(resource), (set(), set()))
+                permissions.update(held[0])
+                grantable.update(held[1])
+    return current
+
+
+def holds(held: tuple, permission: str) -> bool:
+    """True when the (permissions, grantable) pair includes the permission with grant option."""
+    return permission in held[0] and permission in held[1]
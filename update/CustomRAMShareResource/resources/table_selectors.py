@@ -0,0 +1,89 @@
+"""
+Table selectors for the Lake Formation grants.
+
+An entry of table_name_list is one of:
+
+"*"             all the tables of the database, granted with a single
+                TableWildcard entry that also covers tables created later
+"sales_*"       a glob pattern (*, ? and [...]) matched against the table names
+"re:^sales_\\d+$" a regular expression matched against the whole table name
+"sales_2021"    a table name
+
+Patterns are resolved against the table names of the database, read with
+paginated Glue get_tables and cached in the container for
+TABLE_NAME_CACHE_TTL_SECONDS (300).
+"""
+
+import fnmatch
+import re
+import threading
+import time
+
+ALL_TABLES = '*'
+REGEX_PREFIX = 're:'
+GLOB_CHARACTERS = '*?['
+
+
+def is_pattern(selector: str) -> bool:
+    return selector.startswith(REGEX_PREFIX) or any(character in selector for character in GLOB_CHARACTERS)
+
+
+def matcher(selector: str):
+    if selector.startswith(REGEX_PREFIX):
+        return re.compile(selector[len(REGEX_PREFIX):]).fullmatch
+    return re.compile(fnmatch.translate(selector)).match
+
+
+def resolve(selectors: list, table_names) -> list:
+    """Expand the selectors into table names, in order and without repeats.
+    table_names is called, once, only when a selector is a pattern.  The all
+    tables selector resolves to itself and makes every other selector redundant."""
+    selectors = list(selectors or [])
+    if ALL_TABLES in selectors:
+        return [ALL_TABLES]
+
+    names = None
+    resolved = []
+    for selector in selectors:
+        if not is_pattern(selector):
+            resolved.append(selector)
+            continue
+        if names is None:
+            names = sorted(set(table_names()))
+        match = matcher(selector)
+        resolved.extend(name for name in names if match(name))
+    return list(dict.fromkeys(resolved))
+
+
+class TableNameCache:
+    """Table names per database, read with paginated get_tables and kept for a ttl."""
+
+    def __init__(self, glue_client_factory, ttl_seconds: float = 300):
+        self.glue_client_factory = glue_client_factory
+        self.ttl_seconds = ttl_seconds
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def table_names(self, database_name: str) -> list:
+        with self._lock:
+            entry = self._entries.get(database_name)
+            if entry is not None and time.monotonic() - entry[0] < self.ttl_seconds:
+                return entry[1]
+
+        glue_client = self.glue_client_factory()
+        names = []
+        kwargs = {'DatabaseName': database_name}
+        while True:
+            response = glue_client.get_tables(**kwargs)
+            names.extend(table['Name'] for table in response.get('TableList', []))
+            if not response.get('NextToken'):
+                break
+            kwargs['NextToken'] = response['NextToken']
+
+        with self._lock:
+            self._entries[database_name] = (time.monotonic(), names)
+        return names
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
@@ -0,0 +1,34 @@
+import os
+import sys
+
+import pytest
+
+# The lambda sources are deployed as an asset rather than as a package, so make
+# their directory importable for the unit tests.
+RESOURCES_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'resources')
+
+sys.path.insert(0, RESOURCES_DIR)
+
+# The CDK app package next to the tests has the name of the handler module,
+# import the handler before pytest puts the project directory on the path.
+import custom_ram_share_resource  # noqa: E402,F401
+
+
+@pytest.fixture(autouse=True)
+def no_backoff(monkeypatch):
+    import lf_permissions
+
+    monkeypatch.setattr(lf_permissions, 'BACKOFF_SECONDS', 0)
+
+
+@pytest.fixture
+def clients():
+    import aws_clients
+    from tests.fakes import FakeGlue, FakeLakeFormation
+
+    lakeformation, glue = FakeLakeFormation(), FakeGlue()
+    aws_clients.register_client('lakeformation', lakeformation)
+    aws_clients.register_client('glue', glue)
+    custom_ram_share_resource.table_names.clear()
+    yield lakeformation, glue
+    aws_clients.reset()
@@ -0,0 +1,145 @@
+"""
+In-process stand-ins for the Lake Formation and Glue clients used by the custom
+resource.  They implement only the calls the custom resource makes and record
+every request.
+"""
+
+import threading
+
+
+class ClientError(Exception):
+    """Shaped like a botocore ClientError: the code is in response['Error']."""
+
+    def __init__(self, code, message='Failed.'):
+        super().__init__(f'{code}: {message}')
+        self.response = {'Error': {'Code': code, 'Message': message}}
+
+
+def resource_key(resource):
+    if 'Database' in resource:
+        return ('DATABASE', resource['Database']['Name'])
+    table = resource['Table']
+    return ('TABLE', table['DatabaseName'], '*' if 'TableWildcard' in table else table['Name'])
+
+
+class FakeLakeFormation:
+
+    def __init__(self, page_size=2):
+        self.page_size = page_size
+        # (principal, resource key) -> (permissions, grantable)
+        self.held = {}
+        # table name -> error codes returned for it, one per attempt
+        self.failures = {}
+        self.calls = []
+        self._lock = threading.Lock()
+
+    def fail(self, table_name, *codes):
+        self.failures[table_name] = list(codes)
+
+    def hold(self, principal, database_name, table_name=None, permissions=('ALL',)):
+        if table_name is None:
+            key = ('DATABASE', database_name)
+        else:
+            key = ('TABLE', database_name, table_name)
+        self.held[(principal, key)] = (set(permissions), set(permissions))
+
+    def tables(self, principal, database_name):
+        return sorted(key[2] for (holder, key) in self.held
+                      if holder == principal and key[0] == 'TABLE' and key[1] == database_name)
+
+    def databases(self, principal):
+        return sorted(key[1] for (holder, key) in self.held if holder == principal and key[0] == 'DATABASE')
+
+    def _failure(self, resource):
+        codes = self.failures.get(resource.get('Table', {}).get('Name'))
+        return codes.pop(0) if codes else None
+
+    def _apply(self, action, Principal, Resource, Permissions, PermissionsWithGrantOption):
+        key = (Principal['DataLakePrincipalIdentifier'], resource_key(Resource))
+        if action == 'grant':
+            permissions, grantable = self.held.setdefault(key, (set(), set()))
+            permissions.update(Permissions)
+            grantable.update(PermissionsWithGrantOption)
+        else:
+            self.held.pop(key, None)
+
+    def _batch(self, action, Entries):
+        with self._lock:
+            self.calls.append((f'batch_{action}_permissions', len(Entries)))
+            if len(Entries) > 20:
+                raise ClientError('InvalidInputException', 'At most 20 entries per request.')
+            failures = []
+            for entry in Entries:
+                code = self._failure(entry['Resource'])
+                if code:
+                    failures.append({'RequestEntry': entry, 'Error': {'ErrorCode': code, 'ErrorMessage': 'Failed.'}})
+                else:
+                    self._apply(action, **{key: value for key, value in entry.items() if key != 'Id'})
+            return {'Failures': failures}
+
+    def _single(self, action, **kwargs):
+        with self._lock:
+            self.calls.append((f'{action}_permissions', resource_key(kwargs['Resource'])))
+            code = self._failure(kwargs['Resource'])
+            if code:
+                raise ClientError(code)
+            self._apply(action, **kwargs)
+            return {}
+
+    def batch_grant_permissions(self, Entries):
+        return self._batch('grant', Entries)
+
+    def batch_revoke_permissions(self, Entries):
+        return self._batch('revoke', Entries)
+
+    def grant_permissions(self, **kwargs):
+        return self._single('grant', **kwargs)
+
+    def revoke_permissions(self, **kwargs):
+        return self._single('revoke', **kwargs)
+
+    def list_permissions(self, Principal, ResourceType, Resource=None, NextToken=None):
+        with self._lock:
+            self.calls.append(('list_permissions', ResourceType))
+            # A Database resource, or a TableWildcard for the tables of a database.
+            database_name = resource_key(Resource)[1] if Resource else None
+            permissions = []
+            for (principal, key), (held, grantable) in sorted(self.held.items()):
+                if principal != Principal['DataLakePrincipalIdentifier'] or key[0] != ResourceType:
+                    continue
+                if database_name is not None and key[1] != database_name:
+                    continue
+                if ResourceType == 'DATABASE':
+                    resource = {'Database': {'Name': key[1]}}
+                elif key[2] == '*':
+                    resource = {'Table': {'DatabaseName': key[1], 'TableWildcard': {}}}
+                else:
+                    resource = {'Table': {'DatabaseName': key[1], 'Name': key[2]}}
+                permissions.append({'Principal': Principal, 'Resource': resource,
+                                    'Permissions': sorted(held), 'PermissionsWithGrantOption': sorted(grantable)})
+        start = int(NextToken or 0)
+        response = {'PrincipalResourcePermissions': permissions[start:start + self.page_size]}
+        if start + self.page_size < len(permissions):
+            response['NextToken'] = str(start + self.page_size)
+        return response
+
+
+class FakeGlue:
+
+    def __init__(self, page_size=2):
+        self.page_size = page_size
+        self.databases = {}
+        self.calls = []
+
+    def add_tables(self, database_name, *table_names):
+        self.databases.setdefault(database_name, []).extend(table_names)
+
+    def get_tables(self, DatabaseName, NextToken=None):
+        self.calls.append(('get_tables', DatabaseName, NextToken))
+        names = self.databases.get(DatabaseName, [])
+        start = int(NextToken or 0)
+        response = {'TableList': [{'Name': name, 'DatabaseName': DatabaseName}
+                                  for name in names[start:start + self.page_size]]}
+        if start + self.page_size < len(names):
+            response['NextToken'] = str(start + self.page_size)
+        return response
@@ -0,0 +1,106 @@
+import json
+
+import pytest
+
+import cfn_response
+
+EVENT = {
+    'StackId': 'arn:aws:cloudformation:eu-west-2:123456789012:stack/share/1',
+    'RequestId': 'request-1',
+    'LogicalResourceId': 'Share',
+    'ResponseURL': 'https://cloudformation-custom-resource-response.example/presigned',
+}
+
+
+class FakeContext:
+    log_stream_name = '2021/11/01/[$LATEST]stream'
+
+    def get_remaining_time_in_millis(self):
+        return 300000
+
+
+class FakeResponse:
+
+    def __init__(self, status):
+        self.status = status
+
+
+class FakeHttp:
+    """Answers the PUT requests with the given statuses, the last one repeated."""
+
+    def __init__(self, *statuses):
+        self.statuses = list(statuses)
+        self.requests = []
+
+    def request(self, method, url, headers=None, body=None):
+        self.requests.append((method, url, body))
+        status = self.statuses.pop(0) if len(self.statuses) > 1 else self.statuses[0]
+        if isinstance(status, Exception):
+            raise status
+        return FakeResponse(status)
+
+
+@pytest.fixture
+def http(monkeypatch):
+    monkeypatch.setattr(cfn_response, 'BACKOFF_SECONDS', 0)
+
+    def install(*statuses):
+        fake = FakeHttp(*statuses)
+        monkeypatch.setattr(cfn_response, 'http', fake)
+        return fake
+    return install
+
+
+def large_summary(accounts=40, failed=30):
+    return {
+        str(100000000000 + n): {'Granted': 25, 'Revoked': 1, 'Unchanged': 3,
+                                'Failed': [f'database_{n}.table_with_a_long_name_{m}' for m in range(failed)]}
+        for n in range(accounts)
+    }
+
+
+def test_small_data_is_sent_as_is():
+    data = {'111111111111': {'Granted': 2, 'Revoked': 0, 'Unchanged': 0, 'Failed': []}}
+
+    body = json.loads(cfn_response.response_body(EVENT, FakeContext(), cfn_response.SUCCESS, data, 'share-1'))
+
+    assert body['Data'] == data
+    assert body['PhysicalResourceId'] == 'share-1'
+
+
+@pytest.mark.parametrize('accounts,failed', [(5, 40), (40, 30), (400, 0)])
+def test_large_data_is_compacted_to_the_response_limit(accounts, failed):
+    body = cfn_response.response_body(EVENT, FakeContext(), cfn_response.SUCCESS, large_summary(accounts, failed))
+
+    assert len(body) <= cfn_response.RESPONSE_LIMIT_BYTES
+    assert json.loads(body)['Data']
+
+
+def test_lists_are_cut_next_to_their_count():
+    data = cfn_response.compact(large_summary(5, 40), lambda candidate: len(json.dumps(candidate)))
+
+    account = data['100000000000']
+    assert account['FailedCount'] == 40
+    assert len(account['Failed']) < 40
+    assert account['Granted'] == 25
+
+
+def test_the_totals_are_sent_when_nothing_else_fits():
+    data = cfn_response.compact(large_summary(400, 0), lambda candidate: len(json.dumps(candidate)))
+
+    assert data == {'Granted': 10000, 'Revoked': 400, 'Unchanged': 1200, 'FailedCount': 0, 'Compacted': True}
+
+
+def test_server_errors_are_retried(http):
+    fake = http(503, ConnectionError('reset'), 200)
+
+    assert cfn_response.send(EVENT, FakeContext(), cfn_response.SUCCESS, {})
+    assert len(fake.requests) == 3
+    assert fake.requests[0][:2] == ('PUT', EVENT['ResponseURL'])
+
+
+def test_a_rejected_response_is_not_retried(http):
+    fake = http(403)
+
+    assert not cfn_response.send(EVENT, FakeContext(), cfn_response.SUCCESS, {})
+    assert len(fake.requests) == 1
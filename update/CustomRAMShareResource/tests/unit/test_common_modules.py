@@ -0,0 +1,30 @@
+import os
+
+import pytest
+
+from tests.conftest import RESOURCES_DIR
+
+# The lambda layer modules of the update partition module that are copied into
+# the resources of the custom resource.
+COMMON_DIR = os.path.normpath(os.path.join(RESOURCES_DIR, os.pardir, os.pardir, os.pardir, 'update-partition-cdk-last',
+                                           'lambda', 'common', 'python'))
+
+
+def source(path):
+    """The lines of a module with the line endings normalized and the header
+    comment of a copy left out."""
+    with open(path, newline='') as module:
+        lines = module.read().replace('\r\n', '\n').split('\n')
+    while lines and lines[0].startswith('#'):
+        lines.pop(0)
+    return lines
+
+
+@pytest.mark.parametrize('module', ['aws_clients.py', 'structured_log.py'])
+def test_the_copies_match_the_common_modules(module):
+    canonical = os.path.join(COMMON_DIR, module)
+    if not os.path.exists(canonical):
+        pytest.skip('The update partition module is not checked out next to the custom resource.')
+
+    assert source(os.path.join(RESOURCES_DIR, module)) == source(canonical), \
+        f'resources/{module} differs from {canonical}, copy the canonical module.'
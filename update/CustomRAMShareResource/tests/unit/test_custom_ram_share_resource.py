@@ -0,0 +1,247 @@
+import json
+import threading
+
+import pytest
+
+import cfn_response
+import custom_ram_share_resource
+from tests.fakes import FakeLakeFormation
+from tests.unit.test_cfn_response import FakeContext, FakeHttp
+
+ACCOUNT = '111111111111'
+OTHER_ACCOUNT = '222222222222'
+
+
+@pytest.fixture
+def http(monkeypatch):
+    fake = FakeHttp(200)
+    monkeypatch.setattr(cfn_response, 'http', fake)
+    return fake
+
+
+def cfn_event(request_type, share, old_share=None, physical_resource_id=None):
+    event = {
+        'RequestType': request_type,
+        'StackId': 'arn:aws:cloudformation:eu-west-2:123456789012:stack/share/1',
+        'RequestId': 'request-1',
+        'LogicalResourceId': 'Share',
+        'ResponseURL': 'https://cloudformation-custom-resource-response.example/presigned',
+        'ResourceProperties': {'Input': share},
+    }
+    if old_share is not None:
+        event['OldResourceProperties'] = {'Input': old_share}
+    if physical_resource_id:
+        event['PhysicalResourceId'] = physical_resource_id
+    return event
+
+
+def invoke(event):
+    """Invoke the handler directly and return the summary per account."""
+    response = custom_ram_share_resource.lambda_handler(dict(event), FakeContext())
+    assert response['statusCode'] == 200
+    return json.loads(response['body'])
+
+
+def sent(http):
+    """The bodies of the responses sent to CloudFormation."""
+    return [json.loads(body) for method, url, body in http.requests]
+
+
+def test_create_grants_the_database_and_the_tables(clients):
+    lakeformation, glue = clients
+
+    summary = invoke({'RequestType': 'Create', 'external_account': ACCOUNT, 'database_name': 'db',
+                      'table_name_list': ['t1', 't2']})
+
+    assert summary == {ACCOUNT: {'Granted': 2, 'Revoked': 0, 'Unchanged': 0, 'Failed': []}}
+    assert lakeformation.databases(ACCOUNT) == ['db']
+    assert lakeformation.tables(ACCOUNT, 'db') == ['t1', 't2']
+
+
+def test_create_only_grants_what_is_missing(clients):
+    lakeformation, glue = clients
+    lakeformation.hold(ACCOUNT, 'db', permissions=('DESCRIBE',))
+    lakeformation.hold(ACCOUNT, 'db', 't1')
+
+    summary = invoke({'RequestType': 'Create', 'external_account': ACCOUNT, 'database_name': 'db',
+                      'table_name_list': ['t1', 't2']})
+
+    assert summary[ACCOUNT]['Granted'] == 1
+    assert summary[ACCOUNT]['Unchanged'] == 1
+    assert ('grant_permissions', ('DATABASE', 'db')) not in lakeformation.calls
+
+
+def test_cfn_create_sends_the_summary(clients, http):
+    event = cfn_event('Create', {'external_account': ACCOUNT, 'database_name': 'db', 'table_name_list': ['t1']})
+
+    custom_ram_share_resource.lambda_handler(event, FakeContext())
+
+    [body] = sent(http)
+    assert body['Status'] == cfn_response.SUCCESS
+    assert body['PhysicalResourceId'] == f'{ACCOUNT}:db'
+    assert body['Data'] == {ACCOUNT: {'Granted': 1, 'Revoked': 0, 'Unchanged': 0, 'Failed': []}}
+
+
+def test_update_grants_the_added_tables(clients, http):
+    lakeformation, glue = clients
+    old_share = {'external_account': ACCOUNT, 'database_name': 'db', 'table_name_list': ['t1']}
+    custom_ram_share_resource.lambda_handler(cfn_event('Create', old_share), FakeContext())
+
+    share = dict(old_share, table_name_list=['t1', 't2', 't3'])
+    custom_ram_share_resource.lambda_handler(cfn_event('Update', share, old_share, f'{ACCOUNT}:db'), FakeContext())
+
+    body = sent(http)[-1]
+    assert body['PhysicalResourceId'] == f'{ACCOUNT}:db'
+    assert body['Data'] == {ACCOUNT: {'Granted': 2, 'Revoked': 0, 'Unchanged': 1, 'Failed': []}}
+    assert lakeformation.tables(ACCOUNT, 'db') == ['t1', 't2', 't3']
+
+
+def test_update_revokes_the_removed_tables(clients, http):
+    lakeformation, glue = clients
+    old_share = {'external_account': ACCOUNT, 'database_name': 'db', 'table_name_list': ['t1', 't2']}
+    custom_ram_share_resource.lambda_handler(cfn_event('Create', old_share), FakeContext())
+
+    share = dict(old_share, table_name_list=['t1'])
+    custom_ram_share_resource.lambda_handler(cfn_event('Update', share, old_share, f'{ACCOUNT}:db'), FakeContext())
+
+    assert sent(http)[-1]['Data'] == {ACCOUNT: {'Granted': 0, 'Revoked': 1, 'Unchanged': 1, 'Failed': []}}
+    assert lakeformation.tables(ACCOUNT, 'db') == ['t1']
+
+
+def test_update_revokes_the_removed_databases_and_accounts(clients, http):
+    lakeformation, glue = clients
+    old_share = {'external_account': [ACCOUNT, OTHER_ACCOUNT], 'database_name': ['db', 'db2'],
+                 'table_name_list': ['t1']}
+    custom_ram_share_resource.lambda_handler(cfn_event('Create', old_share), FakeContext())
+
+    share = dict(old_share, external_account=ACCOUNT, database_name='db')
+    custom_ram_share_resource.lambda_handler(cfn_event('Update', share, old_share, 'share-1'), FakeContext())
+
+    assert sent(http)[-1]['Data'] == {
+        ACCOUNT: {'Granted': 0, 'Revoked': 1, 'Unchanged': 1, 'Failed': []},
+        OTHER_ACCOUNT: {'Granted': 0, 'Revoked': 2, 'Unchanged': 0, 'Failed': []},
+    }
+    assert lakeformation.databases(ACCOUNT) == ['db']
+    assert lakeformation.tables(ACCOUNT, 'db2') == []
+    assert lakeformation.databases(OTHER_ACCOUNT) == []
+
+
+def test_update_replacing_tables_by_a_pattern_keeps_the_matching_grants(clients, http):
+    lakeformation, glue = clients
+    glue.add_tables('db', 'sales_2020', 'sales_2021', 'stock')
+    old_share = {'external_account': ACCOUNT, 'database_name': 'db', 'table_name_list': ['sales_2020', 'stock']}
+    custom_ram_share_resource.lambda_handler(cfn_event('Create', old_share), FakeContext())
+
+    share = dict(old_share, table_name_list=['sales_*'])
+    custom_ram_share_resource.lambda_handler(cfn_event('Update', share, old_share, f'{ACCOUNT}:db'), FakeContext())
+
+    assert sent(http)[-1]['Data'] == {ACCOUNT: {'Granted': 1, 'Revoked': 1, 'Unchanged': 1, 'Failed': []}}
+    assert lakeformation.tables(ACCOUNT, 'db') == ['sales_2020', 'sales_2021']
+
+
+def test_delete_revokes_the_tables_and_the_database(clients, http):
+    lakeformation, glue = clients
+    share = {'external_account': ACCOUNT, 'database_name': 'db', 'table_name_list': ['t1', 't2']}
+    custom_ram_share_resource.lambda_handler(cfn_event('Create', share), FakeContext())
+
+    custom_ram_share_resource.lambda_handler(cfn_event('Delete', share, physical_resource_id=f'{ACCOUNT}:db'),
+                                             FakeContext())
+
+    body = sent(http)[-1]
+    assert body['Status'] == cfn_response.SUCCESS
+    assert body['Data'] == {ACCOUNT: {'Granted': 0, 'Revoked': 2, 'Unchanged': 0, 'Failed': []}}
+    assert lakeformation.held == {}
+
+
+def test_all_tables_is_granted_with_a_single_wildcard_entry(clients):
+    lakeformation, glue = clients
+
+    summary = invoke({'RequestType': 'Create', 'external_account': ACCOUNT, 'database_name': 'db',
+                      'table_name_list': ['t1', '*']})
+
+    assert summary[ACCOUNT]['Granted'] == 1
+    assert lakeformation.tables(ACCOUNT, 'db') == ['*']
+    assert glue.calls == []
+
+
+def test_patterns_are_resolved_against_the_catalog(clients):
+    lakeformation, glue = clients
+    glue.add_tables('db', 'sales_2020', 'sales_2021', 'sales_eu', 'stock')
+
+    summary = invoke({'RequestType': 'Create', 'external_account': ACCOUNT, 'database_name': 'db',
+                      'table_name_list': ['re:sales_\\d+', 'st*']})
+
+    assert summary[ACCOUNT]['Granted'] == 3
+    assert lakeformation.tables(ACCOUNT, 'db') == ['sales_2020', 'sales_2021', 'stock']
+
+
+def test_failed_entries_are_reported_per_account(clients, http):
+    lakeformation, glue = clients
+    lakeformation.fail('t25', 'ConcurrentModificationException')
+    lakeformation.fail('t30', 'EntityNotFoundException')
+    share = {'external_account': ACCOUNT, 'database_name': 'db', 'table_name_list': [f't{n}' for n in range(45)]}
+
+    custom_ram_share_resource.lambda_handler(cfn_event('Create', share), FakeContext())
+
+    body = sent(http)[-1]
+    assert body['Status'] == cfn_response.FAILED
+    assert body['Reason'].startswith('1 table permissions failed (db.t30).')
+    assert body['Data'][ACCOUNT]['Granted'] == 45
+    assert body['Data'][ACCOUNT]['Failed'] == ['db.t30']
+    assert sorted(size for call, size in lakeformation.calls if call == 'batch_grant_permissions') == [5, 20, 20]
+    assert len(lakeformation.tables(ACCOUNT, 'db')) == 44
+
+
+def test_failed_entries_are_allowed_with_allow_partial(clients, http):
+    lakeformation, glue = clients
+    lakeformation.fail('t1', 'EntityNotFoundException')
+    share = {'external_account': ACCOUNT, 'database_name': 'db', 'table_name_list': ['t0', 't1'],
+             'allow_partial': 'true'}
+
+    custom_ram_share_resource.lambda_handler(cfn_event('Create', share), FakeContext())
+
+    body = sent(http)[-1]
+    assert body['Status'] == cfn_response.SUCCESS
+    assert body['Data'][ACCOUNT]['Failed'] == ['db.t1']
+
+
+def test_the_share_matrix_is_applied_concurrently(clients):
+    lakeformation, glue = clients
+    # Every share waits for the others on its first call, which only
+    # completes when the shares run at the same time.
+    barrier = threading.Barrier(4, timeout=5)
+    list_permissions = lakeformation.list_permissions
+
+    def waiting_list_permissions(Principal, ResourceType, **kwargs):
+        if ResourceType == 'DATABASE':
+            barrier.wait()
+        return list_permissions(Principal, ResourceType, **kwargs)
+
+    lakeformation.list_permissions = waiting_list_permissions
+
+    summary = invoke({'RequestType': 'Create', 'external_account': [ACCOUNT, OTHER_ACCOUNT],
+                      'database_name': ['db', 'db2'], 'table_name_list': {'db': ['t1', 't2'], 'db2': ['t3']}})
+
+    assert summary == {
+        ACCOUNT: {'Granted': 3, 'Revoked': 0, 'Unchanged': 0, 'Failed': []},
+        OTHER_ACCOUNT: {'Granted': 3, 'Revoked': 0, 'Unchanged': 0, 'Failed': []},
+    }
+    assert lakeformation.tables(OTHER_ACCOUNT, 'db2') == ['t3']
+
+
+def test_a_missing_input_fails_the_cfn_request(clients, http):
+    event = cfn_event('Create', {'external_account': ACCOUNT, 'database_name': 'db'})
+
+    custom_ram_share_resource.lambda_handler(event, FakeContext())
+
+    [body] = sent(http)
+    assert body['Status'] == cfn_response.FAILED
+    assert 'mandatory' in body['Reason']
+
+
+def test_a_failed_direct_invocation_raises(clients):
+    lakeformation, glue = clients
+    lakeformation.grant_permissions = lambda **kwargs: 1 / 0
+
+    with pytest.raises(RuntimeError):
+        invoke({'RequestType': 'Create', 'external_account': ACCOUNT, 'database_name': 'db', 'table_name_list': ['t1']})
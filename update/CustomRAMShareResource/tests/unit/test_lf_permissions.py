@@ -0,0 +1,80 @@
+import lf_permissions
+from tests.fakes import FakeLakeFormation
+
+
+def entries(count, database_name='db'):
+    return lf_permissions.table_entries('111111111111', database_name, [f't{n}' for n in range(count)])
+
+
+def test_entries_are_sent_in_chunks_of_twenty():
+    lakeformation = FakeLakeFormation()
+
+    response = lf_permissions.batch_permissions(lakeformation, 'grant', entries(45), workers=3)
+
+    assert response == {'Failures': []}
+    assert sorted(size for call, size in lakeformation.calls) == [5, 20, 20]
+    assert lakeformation.tables('111111111111', 'db') == sorted(f't{n}' for n in range(45))
+
+
+def test_failed_entries_are_retried_on_their_own():
+    lakeformation = FakeLakeFormation()
+    lakeformation.fail('t3', 'ConcurrentModificationException', 'ThrottlingException')
+
+    response = lf_permissions.batch_permissions(lakeformation, 'grant', entries(25))
+
+    assert response == {'Failures': []}
+    assert 't3' in lakeformation.tables('111111111111', 'db')
+    assert [call for call in lakeformation.calls if call[0] == 'grant_permissions'] == \
+        [('grant_permissions', ('TABLE', 'db', 't3'))] * 2
+
+
+def test_an_entry_still_failing_after_the_last_attempt_is_reported(monkeypatch):
+    monkeypatch.setattr(lf_permissions, 'MAX_ATTEMPTS', 3)
+    lakeformation = FakeLakeFormation()
+    lakeformation.fail('t1', *['ThrottlingException'] * 3)
+
+    response = lf_permissions.batch_permissions(lakeformation, 'grant', entries(2))
+
+    assert [lf_permissions.table_name(f['RequestEntry']['Resource']) for f in response['Failures']] == ['t1']
+    assert response['Failures'][0]['Error']['ErrorCode'] == 'ThrottlingException'
+    assert lakeformation.tables('111111111111', 'db') == ['t0']
+
+
+def test_permanent_errors_are_not_retried():
+    lakeformation = FakeLakeFormation()
+    lakeformation.fail('t1', 'EntityNotFoundException')
+
+    response = lf_permissions.batch_permissions(lakeformation, 'grant', entries(2))
+
+    assert len(response['Failures']) == 1
+    assert lakeformation.calls == [('batch_grant_permissions', 2)]
+
+
+def test_current_permissions_reads_every_page():
+    lakeformation = FakeLakeFormation(page_size=2)
+    lakeformation.hold('111111111111', 'db', permissions=('DESCRIBE',))
+    for name in ('a', 'b', 'c', '*'):
+        lakeformation.hold('111111111111', 'db', name)
+    lakeformation.hold('111111111111', 'other', 'd')
+
+    current = lf_permissions.current_permissions(lakeformation, '111111111111', 'db')
+
+    assert lf_permissions.holds(current['database'], 'DESCRIBE')
+    assert sorted(current['tables']) == ['*', 'a', 'b', 'c']
+    assert all(lf_permissions.holds(held, 'ALL') for held in current['tables'].values())
+
+
+def test_current_permissions_only_lists_the_database(monkeypatch):
+    lakeformation = FakeLakeFormation()
+    requests = []
+    list_permissions = lakeformation.list_permissions
+
+    def recording_list_permissions(**kwargs):
+        requests.append((kwargs['ResourceType'], kwargs.get('Resource')))
+        return list_permissions(**kwargs)
+    monkeypatch.setattr(lakeformation, 'list_permissions', recording_list_permissions)
+
+    lf_permissions.current_permissions(lakeformation, '111111111111', 'db')
+
+    assert requests == [('DATABASE', {'Database': {'Name': 'db'}}),
+                        ('TABLE', {'Table': {'DatabaseName': 'db', 'TableWildcard': {}}})]
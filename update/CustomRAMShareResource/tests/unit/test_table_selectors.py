@@ -0,0 +1,45 @@
+from table_selectors import TableNameCache, resolve
+from tests.fakes import FakeGlue
+
+NAMES = ['sales_2020', 'sales_2021', 'sales_eu', 'stock']
+
+
+def test_names_are_kept_in_order_without_repeats():
+    assert resolve(['stock', 'sales_eu', 'stock'], lambda: 1 / 0) == ['stock', 'sales_eu']
+
+
+def test_all_tables_makes_every_other_selector_redundant():
+    assert resolve(['stock', '*', 'sales_*'], lambda: 1 / 0) == ['*']
+
+
+def test_glob_patterns_match_the_table_names():
+    assert resolve(['sales_20?[01]', 'st*'], lambda: NAMES) == ['sales_2020', 'sales_2021', 'stock']
+
+
+def test_regular_expressions_match_the_whole_name():
+    assert resolve(['re:sales_\\d+', 're:sales'], lambda: NAMES) == ['sales_2020', 'sales_2021']
+
+
+def test_the_table_names_are_read_once():
+    calls = []
+
+    def table_names():
+        calls.append(1)
+        return NAMES
+
+    assert resolve(['sales_*', 're:st.*'], table_names) == ['sales_2020', 'sales_2021', 'sales_eu', 'stock']
+    assert len(calls) == 1
+
+
+def test_the_cache_reads_every_page_once_per_ttl():
+    glue = FakeGlue(page_size=2)
+    glue.add_tables('db', *NAMES, 'extra')
+    cache = TableNameCache(lambda: glue)
+
+    assert cache.table_names('db') == NAMES + ['extra']
+    assert cache.table_names('db') == NAMES + ['extra']
+    assert [call[2] for call in glue.calls] == [None, '2', '4']
+
+    cache.ttl_seconds = 0
+    cache.table_names('db')
+    assert len(glue.calls) == 6